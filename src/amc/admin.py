@@ -66,6 +66,7 @@ from .models import (
 from amc_finance.services import send_fund_to_player
 from amc_finance.admin import AccountInlineAdmin
 from amc.dashboard_services import get_ministry_dashboard_stats
+from amc.personal_bests import refresh_game_event_personal_bests, refresh_scheduled_event_personal_bests
 from .widgets import AMCOpenLayersWidget
 from django.urls import path
 from django.http import HttpResponse
@@ -261,6 +262,14 @@ class GameEventAdmin(admin.ModelAdmin):
   list_display = ['guid', 'name', 'start_time', 'scheduled_event', 'owner']
   inlines = [GameEventCharacterInlineAdmin]
 
+  def save_related(self, request, form, formsets, change):
+    super().save_related(request, form, formsets, change)
+    previous_scheduled_event_id = form.initial.get('scheduled_event')
+    if previous_scheduled_event_id and 'scheduled_event' in form.changed_data:
+      previous_scheduled_event = ScheduledEvent.objects.select_related('race_setup').get(pk=previous_scheduled_event_id)
+      async_to_sync(refresh_scheduled_event_personal_bests)(previous_scheduled_event)
+    async_to_sync(refresh_game_event_personal_bests)(form.instance)
+
 @admin.register(GameEventCharacter)
 class GameEventCharacterAdmin(admin.ModelAdmin):
   list_display = ['id', 'rank', 'character', 'finished', 'net_time', 'game_event', 'game_event__scheduled_event', 'game_event__last_updated']
@@ -271,6 +280,10 @@ class GameEventCharacterAdmin(admin.ModelAdmin):
   list_filter = ['finished', 'game_event__scheduled_event']
   ordering = ['-game_event__last_updated', 'net_time']
 
+  def save_model(self, request, obj, form, change):
+    super().save_model(request, obj, form, change)
+    async_to_sync(refresh_game_event_personal_bests)(obj.game_event, [obj.character_id])
+
 
 class GameEventInlineAdmin(admin.TabularInline):
   model = GameEvent
@@ -344,6 +357,11 @@ class ScheduledEventAdmin(admin.ModelAdmin):
       ).update(
         scheduled_event=scheduled_event
       )
+      async_to_sync(refresh_scheduled_event_personal_bests)(scheduled_event)
+
+  def save_related(self, request, form, formsets, change):
+    super().save_related(request, form, formsets, change)
+    async_to_sync(refresh_scheduled_event_personal_bests)(form.instance)
 
 
   @admin.action(description="Award points")
@@ -387,7 +405,7 @@ class ScheduledEventAdmin(admin.ModelAdmin):
         )
         for i, participant in enumerate(participants)
       ]
-      ChampionshipPoint.objects.bulk_create(cps)
+      ChampionshipPoint.objects.award(cps)
       for i, participant in enumerate(participants):
         async_to_sync(send_fund_to_player)(
           ChampionshipPoint.get_event_prize_for_position(i, time_trial=scheduled_event.time_trial),
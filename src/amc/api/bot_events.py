@@ -5,8 +5,8 @@ import json
 from datetime import datetime
 from ninja import Router
 from django.http import StreamingHttpResponse
-from django.conf import settings
 import redis.asyncio as aioredis
+from amc.redis_utils import get_redis_url
 
 router = Router()
 
@@ -14,17 +14,9 @@ router = Router()
 BOT_EVENTS_CHANNEL = "bot_events"
 
 
-def _get_redis_url() -> str:
-    """Build Redis URL from settings, falling back to localhost."""
-    redis_settings = getattr(settings, 'REDIS_SETTINGS', {})
-    host = redis_settings.get('host', 'localhost')
-    port = redis_settings.get('port', 6379)
-    return f"redis://{host}:{port}"
-
-
 async def emit_bot_event(event: dict):
     """Called from tasks.py to emit events to the bot via Redis pub/sub."""
-    redis_client = aioredis.from_url(_get_redis_url())
+    redis_client = aioredis.from_url(get_redis_url())
     try:
         await redis_client.publish(BOT_EVENTS_CHANNEL, json.dumps(event))
     finally:
@@ -41,7 +33,7 @@ async def bot_events_stream(request):
     """
     
     async def event_stream():
-        redis_client = aioredis.from_url(_get_redis_url())
+        redis_client = aioredis.from_url(get_redis_url())
         pubsub = redis_client.pubsub()
         await pubsub.subscribe(BOT_EVENTS_CHANNEL)
         
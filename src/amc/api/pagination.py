@@ -0,0 +1,68 @@
+import json
+import operator
+import base64
+import binascii
+from functools import reduce
+from django.db.models import Q
+from ninja.errors import HttpError
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values) -> str:
+  # str() keeps the microseconds of datetimes, DjangoJSONEncoder drops them
+  return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+  except (binascii.Error, ValueError):
+    raise HttpError(400, "Invalid cursor")
+  if not isinstance(values, list) or len(values) != size:
+    raise HttpError(400, "Invalid cursor")
+  return values
+
+
+def _after(ordering, values) -> Q:
+  """Rows that come after `values` in `ordering`, e.g. (a > x) | (a = x & b > y)"""
+  conditions = []
+  for i, field in enumerate(ordering):
+    lookup = 'lt' if field.startswith('-') else 'gt'
+    equal = {previous.lstrip('-'): value for previous, value in zip(ordering[:i], values[:i])}
+    conditions.append(Q(**equal, **{f"{field.lstrip('-')}__{lookup}": values[i]}))
+  return reduce(operator.or_, conditions)
+
+
+async def akeyset_page(queryset, ordering: tuple[str, ...], cursor=None, limit=50, offset=0):
+  """
+  A page of `queryset` in `ordering`, starting after `cursor`, and the
+  cursor of the next page (None on the last page).
+
+  Unlike offset slicing, every page costs the same however deep it is, as
+  long as `ordering` is backed by an index. The ordering's fields must be
+  non-null fields of the model, and unique together (end it with the pk).
+  `offset` is for clients from before cursors; it's ignored with a cursor.
+  """
+  limit = max(1, min(limit, MAX_PAGE_SIZE))
+  queryset = queryset.order_by(*ordering)
+  if cursor:
+    queryset = queryset.filter(_after(ordering, decode_cursor(cursor, len(ordering))))
+  else:
+    queryset = queryset[offset:]
+  items = [item async for item in queryset[:limit + 1]]
+  if len(items) <= limit:
+    return items, None
+  items = items[:limit]
+  last = items[-1]
+  return items, encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+
+
+def set_next_link(request, response, next_cursor):
+  """Points the Link header of the response to the next page"""
+  if next_cursor is None:
+    return
+  query = request.GET.copy()
+  query.pop('offset', None)
+  query['cursor'] = next_cursor
+  response['Link'] = f'<{request.path}?{query.urlencode()}>; rel="next"'
@@ -0,0 +1,167 @@
+import re
+import gzip
+import json
+import hashlib
+from functools import wraps
+from typing import Any, Awaitable, Callable, overload
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.http import parse_etags
+from ninja.responses import NinjaJSONEncoder
+
+try:
+  # pyrefly: ignore [missing-import]
+  import brotli
+except ImportError: # optional, responses are gzipped without it
+  brotli = None
+
+# Smaller bodies aren't worth the compression time and headers
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_CONTENT_TYPES = ('application/json',)
+ENCODING_SUFFIX = re.compile(r'-(br|gzip)"$')
+
+
+def make_etag(*parts) -> str:
+  digest = hashlib.sha256('|'.join(str(part) for part in parts).encode())
+  return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request, etag) -> bool:
+  """If-None-Match has `etag`, in any of the encodings we compress to"""
+  client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+  return '*' in client_etags or etag in [ENCODING_SUFFIX.sub('"', tag) for tag in client_etags]
+
+
+def not_modified(etag):
+  response = HttpResponseNotModified()
+  response['ETag'] = etag
+  patch_vary_headers(response, ('Accept-Encoding',))
+  return response
+
+
+def _finish(request, response, etag):
+  if response.status_code != 200 or response.streaming:
+    return response
+  if etag is None:
+    etag = make_etag(hashlib.sha256(response.content).hexdigest())
+  if etag_matches(request, etag):
+    return not_modified(etag)
+  response['ETag'] = etag
+  return response
+
+
+def conditional(version=None):
+  """
+  Adds strong ETags and If-None-Match revalidation to a django-ninja
+  operation; apply it with `ninja.decorators.decorate_view`.
+
+  `version(request, **path_params)`, sync or async, returns a cheap
+  fingerprint of what the response depends on (a file's mtime, a counter),
+  or None when there is none. With a version, a matching If-None-Match is
+  answered with 304 without running the view; otherwise the ETag is a hash
+  of the serialized body, which only saves sending it.
+  """
+  def get_etag(request, fingerprint):
+    if fingerprint is None:
+      return None
+    return make_etag(request.path, request.GET.urlencode(), fingerprint)
+
+  @overload
+  def decorator(run: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]: ...
+  @overload
+  def decorator(run: Callable[..., Any]) -> Callable[..., Any]: ...
+  def decorator(run):
+    if iscoroutinefunction(run):
+      @wraps(run)
+      async def async_wrapper(request, **kwargs):
+        etag = None
+        if version is not None:
+          fingerprint = version(request, **kwargs)
+          if iscoroutinefunction(version):
+            fingerprint = await fingerprint
+          etag = get_etag(request, fingerprint)
+          if etag is not None and etag_matches(request, etag):
+            return not_modified(etag)
+        return _finish(request, await run(request, **kwargs), etag)
+      return async_wrapper
+
+    @wraps(run)
+    def wrapper(request, **kwargs):
+      etag = get_etag(request, version(request, **kwargs)) if version is not None else None
+      if etag is not None and etag_matches(request, etag):
+        return not_modified(etag)
+      return _finish(request, run(request, **kwargs), etag)
+    return wrapper
+  return decorator
+
+
+def stream_json_list(queryset, serialize, chunk_size=500):
+  """
+  Streams `queryset` as a JSON array, `serialize` turning each row into
+  something json.dumps takes. Rows are fetched `chunk_size` at a time with
+  a server-side cursor, so memory stays flat however many there are.
+  """
+  async def content():
+    yield '['
+    separator = ''
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+      yield separator + json.dumps(serialize(obj), cls=NinjaJSONEncoder)
+      separator = ','
+    yield ']'
+  return StreamingHttpResponse(content(), content_type='application/json')
+
+
+def _accepted_encodings(request):
+  accepted = set()
+  for part in request.headers.get('Accept-Encoding', '').split(','):
+    coding, _, params = part.strip().partition(';')
+    q = params.strip().removeprefix('q=')
+    try:
+      if params and float(q) == 0:
+        continue
+    except ValueError:
+      continue
+    accepted.add(coding.strip().lower())
+  return accepted
+
+
+def compress_response(request, response):
+  """Compresses large JSON bodies with brotli or gzip, as the client accepts"""
+  if response.streaming or response.status_code != 200 or response.has_header('Content-Encoding'):
+    return response
+  if not response.get('Content-Type', '').startswith(COMPRESSIBLE_CONTENT_TYPES):
+    return response
+  patch_vary_headers(response, ('Accept-Encoding',))
+  if len(response.content) < COMPRESS_MIN_BYTES:
+    return response
+
+  accepted = _accepted_encodings(request)
+  if brotli is not None and 'br' in accepted:
+    encoding, content = 'br', brotli.compress(response.content, quality=5)
+  elif 'gzip' in accepted:
+    encoding, content = 'gzip', gzip.compress(response.content, compresslevel=6, mtime=0)
+  else:
+    return response
+  if len(content) >= len(response.content):
+    return response
+
+  response.content = content
+  response['Content-Length'] = str(len(content))
+  response['Content-Encoding'] = encoding
+  # A strong ETag names one representation, so each encoding gets its own
+  if (etag := response.get('ETag')) and not etag.startswith('W/'):
+    response['ETag'] = f'{etag[:-1]}-{encoding}"'
+  return response
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+  if iscoroutinefunction(get_response):
+    async def middleware(request):
+      return compress_response(request, await get_response(request))
+  else:
+    def middleware(request):
+      return compress_response(request, get_response(request))
+  return middleware
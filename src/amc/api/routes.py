@@ -5,13 +5,15 @@ from typing import Optional, Any, cast
 from pydantic import AwareDatetime
 from datetime import datetime, timedelta
 from ninja_extra.security.session import AsyncSessionAuth
-from django.core.cache import cache
 from django.db.models import Count, Q, F, Window, Prefetch, Max
 from django.db.models.functions import Ntile
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.shortcuts import aget_object_or_404
 from django.utils import timezone
 from ninja import Router
-from django.http import StreamingHttpResponse
+from ninja.decorators import decorate_view
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from .schema import (
   ActivePlayerSchema,
   PlayerSchema,
@@ -24,8 +26,11 @@ from .schema import (
   PersonalStandingSchema,
   TeamStandingSchema,
   DeliveryPointSchema,
+  StorageLevelSchema,
+  StorageHourlyLevelSchema,
   DeliveryJobSchema,
   LapSectionTimeSchema,
+  ParticipantSplitsSchema,
   # Phase 1
   CargoSchema,
   SubsidyRulePublicSchema,
@@ -53,34 +58,64 @@ from amc.models import (
   Team,
   ScheduledEvent,
   GameEventCharacter,
-  ChampionshipPoint,
+  ChampionshipPersonalStanding,
+  ChampionshipTeamStanding,
   Championship,
   Delivery,
   DeliveryPoint,
+  DeliveryPointStorageLevel,
+  DeliveryPointStorageHourlyLevel,
   LapSectionTime,
   DeliveryJob,
   # Phase 1
   Cargo,
-  SubsidyRule,
   MinistryTerm,
   # Phase 2
   Company,
   MinistryElection,
+  MinistryCandidacy,
   SubsidyArea,
   ServerPassengerArrivedLog,
   VehicleDecal,
   VehicleDealership,
 )
 from amc.utils import lowercase_first_char_in_keys
-from amc.save_file import get_world, get_character as get_save_character, get_housings, DATA_PATH
+from amc.save_file import (
+  get_world,
+  get_character as get_save_character,
+  get_housings,
+  get_save_version,
+  DATA_PATH,
+  WORLD_SAVE_PATH,
+  CHARACTER_SAVE_PATH,
+)
+from amc.api.responses import conditional, etag_matches, not_modified, stream_json_list
+from amc.api.pagination import akeyset_page, set_next_link
+from amc.subsidy_catalogue import aget_catalogue
+from amc.shared_cache import (
+  shared_cache,
+  DELIVERYPOINTS_CACHE_KEY,
+  CARGOS_CACHE_KEY,
+  RACE_SETUPS_CACHE_KEY,
+)
 import os
 
 POSITION_UPDATE_RATE = 1
 POSITION_UPDATE_SLEEP = 1.0 / POSITION_UPDATE_RATE
+LOCATIONS_SETTLED_AFTER = timedelta(minutes=5)
+
+
+def catalogue_not_modified(request, response, catalogue):
+  """Tags the response with the catalogue's ETag; a 304 when the client has it already"""
+  response['ETag'] = catalogue.etag
+  if etag_matches(request, catalogue.etag):
+    return not_modified(catalogue.etag)
+  return None
 
 app_router = Router()
 
 @app_router.get('/world/', response=dict)
+@decorate_view(conditional(lambda request: get_save_version(WORLD_SAVE_PATH, CHARACTER_SAVE_PATH)))
 def world(request):
     return {
       **get_world(),
@@ -88,17 +123,19 @@ def world(request):
     }
 
 @app_router.get('/housing/', response=dict)
+@decorate_view(conditional(lambda request: get_save_version(WORLD_SAVE_PATH)))
 def housing(request):
     return {
       **get_housings(get_world()),
     }
 
 @app_router.get('/subsidies/', response=dict)
-async def list_subsidies(request):
+async def list_subsidies(request, response: HttpResponse):
     """Returns current active subsidy rules as formatted text."""
-    from amc.subsidies import get_subsidies_text
-    text = await get_subsidies_text()
-    return {'subsidies_text': text}
+    catalogue = await aget_catalogue()
+    if not_modified := catalogue_not_modified(request, response, catalogue):
+        return not_modified
+    return {'subsidies_text': catalogue.text}
 
 @app_router.get('/active_events', response=dict)
 def list_active_events(request):
@@ -176,30 +213,22 @@ players_router = Router()
 async def get_players_mod(
   session,
   cache_key: str = "mod_online_players_list",
-  cache_ttl: int = int(POSITION_UPDATE_SLEEP / 2)
+  cache_ttl: float = POSITION_UPDATE_SLEEP / 2
 ):
-  cached_data = cache.get(cache_key)
-  if cached_data:
-    return cached_data
-
-  async with session.get('/players') as resp:
-    players = (await resp.json()).get('data', [])
-  cache.set(cache_key, players, timeout=cache_ttl)
-  return players
+  async def fetch_players():
+    async with session.get('/players') as resp:
+      return (await resp.json()).get('data', [])
+  return await shared_cache.get_or_set(cache_key, fetch_players, ttl=cache_ttl, stale_ttl=cache_ttl)
 
 async def get_players(
   session,
   cache_key: str = "online_players_list",
-  cache_ttl: int = 1
+  cache_ttl: float = 1
 ):
-  cached_data = cache.get(cache_key)
-  if cached_data:
-    return cached_data
-
-  async with session.get('/player/list', params={'password': ''}) as resp:
-    players = list((await resp.json()).get('data', {}).values())
-  cache.set(cache_key, players, timeout=cache_ttl)
-  return players
+  async def fetch_players():
+    async with session.get('/player/list', params={'password': ''}) as resp:
+      return list((await resp.json()).get('data', {}).values())
+  return await shared_cache.get_or_set(cache_key, fetch_players, ttl=cache_ttl, stale_ttl=cache_ttl)
 
 
 @players_router.get('/', response=list[ActivePlayerSchema])
@@ -260,7 +289,20 @@ async def get_character(request, id):
 
 player_locations_router = Router()
 
+def player_locations_version(request):
+  """Ranges that ended a while ago don't get new locations"""
+  try:
+    end_time = parse_datetime(request.GET.get('end_time', ''))
+  except ValueError:
+    return None # The view rejects it
+  if end_time is None or timezone.is_naive(end_time):
+    return None
+  if end_time > timezone.now() - LOCATIONS_SETTLED_AFTER:
+    return None
+  return 'settled'
+
 @player_locations_router.get('/', response=list[CharacterLocationSchema])
+@decorate_view(conditional(player_locations_version))
 async def player_locations(
   request,
   start_time: AwareDatetime,
@@ -290,7 +332,7 @@ async def player_locations(
     .order_by('character', 'bucket')
     .distinct('character', 'bucket')
   )
-  return [cl async for cl in qs]
+  return stream_json_list(qs, lambda cl: CharacterLocationSchema.from_orm(cl).model_dump())
 
 
 player_positions_router = Router()
@@ -410,6 +452,7 @@ async def get_scheduled_event(request, id):
   return await ScheduledEvent.objects.select_related('race_setup').aget(id=id)
 
 @scheduled_events_router.get('/{id}/results/', response=list[ParticipantSchema])
+@decorate_view(conditional())
 async def list_scheduled_event_results(request, id):
   scheduled_event = await ScheduledEvent.objects.select_related('race_setup').aget(id=id)
 
@@ -421,6 +464,7 @@ async def list_scheduled_event_results(request, id):
 
 tracks_router = Router()
 @tracks_router.get('/{hash}/results/', response=list[ParticipantSchema])
+@decorate_view(conditional())
 async def list_track_results(request, hash):
   track = await aget_object_or_404(RaceSetup, hash__startswith=hash)
 
@@ -431,6 +475,7 @@ async def list_track_results(request, hash):
   ]
 
 @players_router.get('/{player_id}/results/', response=list[ParticipantSchema])
+@decorate_view(conditional())
 async def list_player_results(request, player_id, route_hash: Optional[str]=None, scheduled_event_id: Optional[int]=None):
   qs = GameEventCharacter.objects.select_related(
     'character',
@@ -457,8 +502,6 @@ results_router = Router()
 @results_router.get('/{participant_id}/lap_section_times/', response=list[LapSectionTimeSchema])
 async def list_player_results_times(request, participant_id):
   qs = (LapSectionTime.objects
-    .select_related( 'game_event_character')
-    .annotate_deltas()
     .annotate_net_time()
     .filter(
       game_event_character=int(participant_id),
@@ -471,34 +514,101 @@ async def list_player_results_times(request, participant_id):
     async for participant in qs
   ]
 
+@results_router.get('/splits/', response=list[ParticipantSplitsSchema])
+async def list_game_event_splits(request, game_event_id: int):
+  """Lap section times of every participant in a game event, as one set of columns per participant"""
+  order_by = ('lap_section_times__lap', 'lap_section_times__section_index')
+  recorded = Q(lap_section_times__isnull=False)
+  qs = (GameEventCharacter.objects
+    .filter(game_event=game_event_id)
+    .values(
+      'id',
+      'rank',
+      'best_lap_time',
+      'theoretical_best_lap_time',
+      'first_section_total_time_seconds',
+      character_name=F('character__name'),
+    )
+    .annotate(
+      lap_numbers=ArrayAgg('lap_section_times__lap', filter=recorded, order_by=order_by, default=[]),
+      section_indexes=ArrayAgg('lap_section_times__section_index', filter=recorded, order_by=order_by, default=[]),
+      total_times=ArrayAgg('lap_section_times__total_time_seconds', filter=recorded, order_by=order_by, default=[]),
+      section_durations=ArrayAgg('lap_section_times__section_duration', filter=recorded, order_by=order_by, default=[]),
+    )
+    .order_by('rank')
+  )
+  return [
+    participant
+    async for participant in qs
+  ]
+
 championships_router = Router()
 
 @championships_router.get('/{id}/personal_standings/', response=list[PersonalStandingSchema])
 async def list_championship_personal_standings(request, id):
   return [
     standing
-    async for standing in ChampionshipPoint.objects.personal_standings(id)
+    async for standing in ChampionshipPersonalStanding.objects.for_championship(id)
   ]
 
 @championships_router.get('/{id}/team_standings/', response=list[TeamStandingSchema])
 async def list_championship_team_standings(request, id):
   return [
     standing
-    async for standing in ChampionshipPoint.objects.team_standings(id)
+    async for standing in ChampionshipTeamStanding.objects.for_championship(id)
   ]
 
 deliverypoints_router = Router()
 
 @deliverypoints_router.get('/', response=list[DeliveryPointSchema])
+@decorate_view(conditional())
 async def list_deliverypoints(request):
-  return [
-    dp async for dp in DeliveryPoint.objects.all()
-  ]
+  async def fetch_deliverypoints():
+    return [
+      DeliveryPointSchema.from_orm(dp).model_dump()
+      async for dp in DeliveryPoint.objects.all()
+    ]
+  # Inventories are refreshed in bulk, without signals, so they can be this old
+  return await shared_cache.get_or_set(DELIVERYPOINTS_CACHE_KEY, fetch_deliverypoints, ttl=10, stale_ttl=20)
 
 @deliverypoints_router.get('/{guid}/', response=DeliveryPointSchema)
 async def get_deliverypoint(request, guid):
   return await DeliveryPoint.objects.aget(guid=guid)
 
+@deliverypoints_router.get('/{guid}/storages/{cargo_key}/levels/', response=list[StorageLevelSchema])
+async def list_deliverypoint_storage_levels(
+  request,
+  guid: str,
+  cargo_key: str,
+  start_time: AwareDatetime,
+  end_time: AwareDatetime,
+  kind: Optional[str] = None,
+):
+  """Storage amounts recorded whenever they changed between the specified times"""
+  qs = (DeliveryPointStorageLevel.objects
+    .filter_series(guid, cargo_key, start_time, end_time, kind=kind)
+    .order_by('timestamp')
+    .values('timestamp', 'amount', kind=F('storage__kind'))
+  )
+  return [level async for level in qs]
+
+@deliverypoints_router.get('/{guid}/storages/{cargo_key}/levels/hourly/', response=list[StorageHourlyLevelSchema])
+async def list_deliverypoint_storage_hourly_levels(
+  request,
+  guid: str,
+  cargo_key: str,
+  start_time: AwareDatetime,
+  end_time: AwareDatetime,
+  kind: Optional[str] = None,
+):
+  """Hourly min/max/last storage amounts. Hours without changes are omitted"""
+  qs = (DeliveryPointStorageHourlyLevel.objects
+    .filter_series(guid, cargo_key, start_time, end_time, kind=kind)
+    .order_by('hour')
+    .values('hour', 'min_amount', 'max_amount', 'last_amount', kind=F('storage__kind'))
+  )
+  return [level async for level in qs]
+
 
 deliveryjobs_router = Router()
 
@@ -524,38 +634,20 @@ cargos_router = Router()
 @cargos_router.get('/', response=list[CargoSchema])
 async def list_cargos(request):
   """List all cargo types"""
-  return [cargo async for cargo in Cargo.objects.all()]
+  async def fetch_cargos():
+    return [cargo async for cargo in Cargo.objects.values('key', 'label')]
+  return await shared_cache.get_or_set(CARGOS_CACHE_KEY, fetch_cargos, ttl=300, stale_ttl=60)
 
 
 subsidies_rules_router = Router()
 
 @subsidies_rules_router.get('/', response=list[SubsidyRulePublicSchema])
-async def list_subsidy_rules(request):
+async def list_subsidy_rules(request, response: HttpResponse):
   """List all active subsidy rules (public information only)"""
-  
-  rules = SubsidyRule.objects.filter(active=True).prefetch_related(
-    'cargos',
-    'source_areas',
-    'destination_areas',
-    'source_delivery_points',
-    'destination_delivery_points',
-  )
-  
-  return [
-    {
-      'id': rule.id,
-      'name': rule.name,
-      'active': rule.active,
-      'priority': rule.priority,
-      'reward_type': rule.reward_type,
-      'reward_value': float(rule.reward_value),
-      'cargo_keys': [c.key async for c in rule.cargos.all()],
-      'source_area_names': [a.name async for a in rule.source_areas.all()],
-      'destination_area_names': [a.name async for a in rule.destination_areas.all()],
-      'requires_on_time': rule.requires_on_time,
-    }
-    async for rule in rules
-  ]
+  catalogue = await aget_catalogue()
+  if not_modified := catalogue_not_modified(request, response, catalogue):
+    return not_modified
+  return catalogue.rules
 
 
 ministry_router = Router()
@@ -563,6 +655,10 @@ ministry_router = Router()
 @ministry_router.get('/current/', response=Optional[MinistryTermPublicSchema])
 async def get_current_ministry_term(request):
   """Get current active ministry term"""
+  # The budget moves with every subsidy, so only briefly
+  return await shared_cache.get_or_set('ministry_current_term', fetch_current_ministry_term, ttl=5, stale_ttl=10)
+
+async def fetch_current_ministry_term():
   try:
     term = await (MinistryTerm.objects
       .select_related('minister')
@@ -588,9 +684,19 @@ async def get_current_ministry_term(request):
 championships_list_router = Router()
 
 @championships_list_router.get('/', response=list[ChampionshipSchema])
-async def list_championships(request, offset: int = 0, limit: int = 50):
+async def list_championships(
+  request,
+  response: HttpResponse,
+  cursor: Optional[str] = None,
+  offset: int = 0,
+  limit: int = 50,
+):
   """List all championships with pagination"""
-  return [champ async for champ in Championship.objects.all()[offset:offset + limit]]
+  championships, next_cursor = await akeyset_page(
+    Championship.objects.all(), ('id',), cursor=cursor, limit=limit, offset=offset
+  )
+  set_next_link(request, response, next_cursor)
+  return championships
 
 
 deliveries_stats_router = Router()
@@ -633,9 +739,18 @@ async def list_delivery_stats(request, limit: int = 10, days: int = 7):
 companies_router = Router()
 
 @companies_router.get('/', response=list[CompanyPublicSchema])
-async def list_companies(request, offset: int = 0, limit: int = 50):
+async def list_companies(
+  request,
+  response: HttpResponse,
+  cursor: Optional[str] = None,
+  offset: int = 0,
+  limit: int = 50,
+):
   """List all companies with pagination (public information only)"""
-  companies = Company.objects.select_related('owner').all()[offset:offset + limit]
+  companies, next_cursor = await akeyset_page(
+    Company.objects.select_related('owner'), ('id',), cursor=cursor, limit=limit, offset=offset
+  )
+  set_next_link(request, response, next_cursor)
   
   return [
     {
@@ -646,21 +761,37 @@ async def list_companies(request, offset: int = 0, limit: int = 50):
       'is_corp': company.is_corp,
       'first_seen_at': company.first_seen_at,
     }
-    async for company in companies
+    for company in companies
   ]
 
 
 ministry_elections_router = Router()
 
+def candidates_with_vote_counts():
+  """Prefetches the candidacies with a `vote_count` annotation"""
+  return Prefetch(
+    'candidates',
+    queryset=MinistryCandidacy.objects.select_related('candidate').annotate(vote_count=Count('votes')),
+  )
+
 @ministry_elections_router.get('/', response=list[MinistryElectionPublicSchema])
-async def list_ministry_elections(request, offset: int = 0, limit: int = 20):
-  """List all ministry elections with pagination"""
+async def list_ministry_elections(
+  request,
+  response: HttpResponse,
+  cursor: Optional[str] = None,
+  offset: int = 0,
+  limit: int = 20,
+):
+  """List all ministry elections with pagination, newest first"""
   
-  elections = (MinistryElection.objects
-    .prefetch_related('candidates__candidate', 'candidates__votes', 'winner')
-    .all()
-    .order_by('-created_at')
-  )[offset:offset + limit]
+  elections, next_cursor = await akeyset_page(
+    MinistryElection.objects.prefetch_related(candidates_with_vote_counts(), 'winner'),
+    ('-id',), # ids follow created_at, which isn't indexed
+    cursor=cursor,
+    limit=limit,
+    offset=offset,
+  )
+  set_next_link(request, response, next_cursor)
   
   return [
     {
@@ -676,12 +807,12 @@ async def list_ministry_elections(request, offset: int = 0, limit: int = 20):
           'candidate_id': str(candidacy.candidate.unique_id),
           'manifesto': candidacy.manifesto,
           'created_at': candidacy.created_at,
-          'vote_count': await candidacy.votes.acount(),
+          'vote_count': cast(Any, candidacy).vote_count,
         }
-        async for candidacy in election.candidates.all()
+        for candidacy in election.candidates.all()
       ],
     }
-    async for election in elections
+    for election in elections
   ]
 
 
@@ -690,7 +821,7 @@ async def get_ministry_election(request, id: int):
   """Get a specific ministry election"""
   
   election = await (MinistryElection.objects
-    .prefetch_related('candidates__candidate', 'candidates__votes', 'winner')
+    .prefetch_related(candidates_with_vote_counts(), 'winner')
     .aget(id=id)
   )
   
@@ -707,9 +838,9 @@ async def get_ministry_election(request, id: int):
         'candidate_id': str(candidacy.candidate.unique_id),
         'manifesto': candidacy.manifesto,
         'created_at': candidacy.created_at,
-        'vote_count': await candidacy.votes.acount(),
+        'vote_count': cast(Any, candidacy).vote_count,
       }
-      async for candidacy in election.candidates.all()
+      for candidacy in election.candidates.all()
     ],
   }
 
@@ -719,17 +850,18 @@ race_setups_list_router = Router()
 @race_setups_list_router.get('/', response=list[RaceSetupListSchema])
 async def list_race_setups(request):
   """List all race setups (tracks)"""
-  setups = RaceSetup.objects.filter(name__isnull=False).all()
-  
-  return [
-    {
-      'hash': setup.hash,
-      'route_name': setup.route_name,
-      'num_laps': setup.num_laps,
-      'num_sections': setup.num_sections,
-    }
-    async for setup in setups
-  ]
+  async def fetch_race_setups():
+    setups = RaceSetup.objects.filter(name__isnull=False).all()
+    return [
+      {
+        'hash': setup.hash,
+        'route_name': setup.route_name,
+        'num_laps': setup.num_laps,
+        'num_sections': setup.num_sections,
+      }
+      async for setup in setups
+    ]
+  return await shared_cache.get_or_set(RACE_SETUPS_CACHE_KEY, fetch_race_setups, ttl=300, stale_ttl=60)
 
 # Phase 3: Extended Data Routers
 
@@ -801,9 +933,22 @@ async def list_passenger_stats(request, limit: int = 10, days: int = 7):
 decals_router = Router()
 
 @decals_router.get('/', response=list[VehicleDecalPublicSchema])
-async def list_public_decals(request, offset: int = 0, limit: int = 50):
+async def list_public_decals(
+  request,
+  response: HttpResponse,
+  cursor: Optional[str] = None,
+  offset: int = 0,
+  limit: int = 50,
+):
   """List all public vehicle decals with pagination"""
-  decals = VehicleDecal.objects.filter(private=False).select_related('player').all()[offset:offset + limit]
+  decals, next_cursor = await akeyset_page(
+    VehicleDecal.objects.filter(private=False).select_related('player'),
+    ('id',),
+    cursor=cursor,
+    limit=limit,
+    offset=offset,
+  )
+  set_next_link(request, response, next_cursor)
   
   return [
     {
@@ -814,7 +959,7 @@ async def list_public_decals(request, offset: int = 0, limit: int = 50):
       'price': decal.price,
       'player_name': decal.player.discord_name if decal.player else None,
     }
-    async for decal in decals
+    for decal in decals
   ]
 
 
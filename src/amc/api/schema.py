@@ -178,6 +178,18 @@ class LapSectionTimeSchema(ModelSchema):
       'total_time_seconds',
     ]
 
+class ParticipantSplitsSchema(Schema):
+  id: int
+  character_name: str
+  rank: int
+  best_lap_time: Optional[float] = None
+  theoretical_best_lap_time: Optional[float] = None
+  first_section_total_time_seconds: Optional[float] = None
+  lap_numbers: list[int]
+  section_indexes: list[int]
+  total_times: list[float]
+  section_durations: list[Optional[float]]
+
 class PersonalStandingSchema(Schema):
   total_points: int
   player_id: str
@@ -207,6 +219,20 @@ class DeliveryPointSchema(ModelSchema):
       'last_updated',
     ]
 
+class StorageLevelSchema(Schema):
+  timestamp: AwareDatetime
+  kind: str
+  amount: int
+
+
+class StorageHourlyLevelSchema(Schema):
+  hour: AwareDatetime
+  kind: str
+  min_amount: int
+  max_amount: int
+  last_amount: int
+
+
 class CargoSchema(ModelSchema):
   class Meta:
     model = Cargo
@@ -11,6 +11,38 @@ class AMCConfig(AppConfig):
     name = 'amc'
 
     def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
         from amc.command_framework import registry
+        from amc.query_budget import install_query_recorder
+        from amc.models import DeliveryJob, SubsidyRule, SubsidyArea, Cargo, DeliveryPoint, RaceSetup
+        from amc.models import ChampionshipPoint, on_championship_point_deleting, on_championship_point_deleted, GameEventCharacter
+        from amc.personal_bests import on_participant_deleting, on_participant_deleted
+        from amc.job_index import on_job_saved, on_job_deleted, on_job_relations_changed
+        from amc.subsidy_catalogue import invalidate_catalogue
+        from amc.shared_cache import (
+            invalidating_receiver,
+            DELIVERYPOINTS_CACHE_KEY,
+            CARGOS_CACHE_KEY,
+            RACE_SETUPS_CACHE_KEY,
+        )
+        connection_created.connect(install_query_recorder)
+        pre_delete.connect(on_championship_point_deleting, sender=ChampionshipPoint)
+        post_delete.connect(on_championship_point_deleted, sender=ChampionshipPoint)
+        pre_delete.connect(on_participant_deleting, sender=GameEventCharacter)
+        post_delete.connect(on_participant_deleted, sender=GameEventCharacter)
+        post_save.connect(on_job_saved, sender=DeliveryJob)
+        post_delete.connect(on_job_deleted, sender=DeliveryJob)
+        for field in ('cargos', 'source_points', 'destination_points'):
+            m2m_changed.connect(on_job_relations_changed, sender=getattr(DeliveryJob, field).through)
+        for model in (SubsidyRule, SubsidyArea, Cargo, DeliveryPoint):
+            post_save.connect(invalidate_catalogue, sender=model)
+            post_delete.connect(invalidate_catalogue, sender=model)
+        for field in ('cargos', 'source_areas', 'destination_areas', 'source_delivery_points', 'destination_delivery_points'):
+            m2m_changed.connect(invalidate_catalogue, sender=getattr(SubsidyRule, field).through)
+        for model, key in ((DeliveryPoint, DELIVERYPOINTS_CACHE_KEY), (Cargo, CARGOS_CACHE_KEY), (RaceSetup, RACE_SETUPS_CACHE_KEY)):
+            receiver = invalidating_receiver(key)
+            post_save.connect(receiver, sender=model, weak=False)
+            post_delete.connect(receiver, sender=model, weak=False)
         registry.autodiscover('amc.commands')
         register_lifespan_manager(context_manager=aiohttp_lifespan_manager)
@@ -0,0 +1,157 @@
+import io
+import json
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from amc.metrics import CHART_RENDER_DURATION, CHART_CACHE_HITS
+
+CHART_RENDER_WORKERS = 1
+CHART_CACHE_SIZE = 32
+
+
+def _warm_worker():
+  """Imports Matplotlib and renders once so the first real chart is fast"""
+  # pyrefly: ignore [untyped-import]
+  import matplotlib
+  matplotlib.use('Agg')
+  render_line_chart({'axes': [{'series': 'warmup'}]}, {'warmup': [0]})
+
+
+def render_line_chart(spec: dict, series: dict[str, list]) -> bytes:
+  """
+  Renders a line chart to PNG bytes. Runs inside the worker processes.
+
+  `spec['axes']` lists the y-axes; the first is the primary axis and the
+  others share its x-axis. Each axis plots `series[axis['series']]` with
+  its own color, marker, label and limits.
+  """
+  # pyrefly: ignore [untyped-import]
+  import matplotlib.pyplot as plt
+
+  plt.style.use(spec.get('style', 'dark_background')) # type: ignore[attr-defined]
+  fig, primary = plt.subplots()
+  if spec.get('xlabel'):
+    primary.set_xlabel(spec['xlabel'], color='white')
+
+  lines = []
+  for i, axis in enumerate(spec['axes']):
+    ax = primary if i == 0 else primary.twinx()
+    color = axis.get('color')
+    ax.plot(
+      series[axis['series']],
+      color=color,
+      marker=axis.get('marker'),
+      label=axis.get('legend', axis.get('label')),
+    )
+    if axis.get('label'):
+      ax.set_ylabel(axis['label'], color=color)
+    if color:
+      ax.tick_params(axis='y', labelcolor=color)
+    if axis.get('ylim'):
+      ax.set_ylim(*axis['ylim'])
+    if i == 0:
+      ax.grid(True, linestyle='--', alpha=0.6)
+    lines.extend(ax.get_lines())
+
+  if spec.get('title'):
+    fig.suptitle(spec['title'], color='white')
+  fig.tight_layout(rect=(0, 0.03, 1, 0.95)) # Leave space for the title
+  if spec.get('legend', True):
+    primary.legend(lines, [line.get_label() for line in lines], loc='upper left')
+
+  buffer = io.BytesIO()
+  fig.savefig(buffer, format='png', transparent=True)
+  plt.close(fig)
+  return buffer.getvalue()
+
+
+def chart_key(spec: dict, series: dict[str, list]) -> str:
+  payload = json.dumps({'spec': spec, 'series': series}, sort_keys=True, default=str)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ChartRenderer:
+  """
+  Renders charts in a pool of worker processes, so Matplotlib never holds
+  the event loop's GIL.
+
+  Workers are started and warmed up by `start()`. The PNGs of the most
+  recent charts are kept by a hash of their spec and series, and
+  rendering the same inputs again returns the cached PNG.
+  """
+
+  def __init__(self, max_workers: int = CHART_RENDER_WORKERS, cache_size: int = CHART_CACHE_SIZE):
+    self.max_workers = max_workers
+    self.cache_size = cache_size
+    self._executor: ProcessPoolExecutor | None = None
+    self._cache: OrderedDict[str, bytes] = OrderedDict()
+    self.rendered = 0
+    self.cache_hits = 0
+    self.last_render_seconds: float | None = None
+    self.total_render_seconds = 0.0
+
+  @property
+  def executor(self) -> ProcessPoolExecutor:
+    if self._executor is None:
+      # Spawned (not forked) workers don't inherit the bot's threads and sockets
+      self._executor = ProcessPoolExecutor(
+        max_workers=self.max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_warm_worker,
+      )
+    return self._executor
+
+  async def start(self):
+    """Starts every worker process and waits for them to be warm"""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[
+      loop.run_in_executor(self.executor, time.sleep, 0)
+      for _ in range(self.max_workers)
+    ])
+
+  def shutdown(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+  @property
+  def average_render_seconds(self) -> float | None:
+    if not self.rendered:
+      return None
+    return self.total_render_seconds / self.rendered
+
+  def stats(self) -> dict:
+    return {
+      'rendered': self.rendered,
+      'cache_hits': self.cache_hits,
+      'last_render_seconds': self.last_render_seconds,
+      'average_render_seconds': self.average_render_seconds,
+    }
+
+  async def render(self, spec: dict, series: dict[str, list]) -> bytes:
+    key = chart_key(spec, series)
+    if key in self._cache:
+      self._cache.move_to_end(key)
+      self.cache_hits += 1
+      CHART_CACHE_HITS.inc()
+      return self._cache[key]
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    png = await loop.run_in_executor(self.executor, render_line_chart, spec, series)
+    elapsed = time.perf_counter() - started
+    self.rendered += 1
+    self.last_render_seconds = elapsed
+    self.total_render_seconds += elapsed
+    CHART_RENDER_DURATION.observe(elapsed)
+
+    self._cache[key] = png
+    while len(self._cache) > self.cache_size:
+      self._cache.popitem(last=False)
+    return png
+
+
+chart_renderer = ChartRenderer()
@@ -4,10 +4,14 @@ import aiohttp
 
 from django_asgi_lifespan.types import LifespanManager
 from django.conf import settings
+from amc.metrics import http_trace_config
 
 @asynccontextmanager
 async def aiohttp_lifespan_manager() -> LifespanManager:
-    state = {"aiohttp_client": aiohttp.ClientSession(base_url=settings.MOD_SERVER_API_URL)}
+    state = {"aiohttp_client": aiohttp.ClientSession(
+        base_url=settings.MOD_SERVER_API_URL,
+        trace_configs=[http_trace_config('mod')],
+    )}
 
     try:
         yield state
@@ -0,0 +1,244 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, LiteralString, cast
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+import psycopg
+from amc.models import Character, Delivery, DeliveryJob, Player
+
+JOB_TABLE = DeliveryJob._meta.db_table
+DELIVERY_TABLE = Delivery._meta.db_table
+PLAYER_TABLE = Player._meta.db_table
+CHARACTER_TABLE = Character._meta.db_table
+
+DELIVERY_COLUMNS = (
+  'timestamp',
+  'character_id',
+  'cargo_key',
+  'quantity',
+  'payment',
+  'subsidy',
+  'rp_mode',
+  'sender_point_id',
+  'destination_point_id',
+  'job_id',
+)
+
+
+@dataclass
+class DeliveryGroup:
+  """
+  The delivery of one cargo group of an arrival. `job_id` is the job
+  matched from the index; once posted it is the job the delivery counted
+  towards, or None when that job was no longer active.
+  """
+  job_id: int | None
+  quantity: int
+  # Delivery fields; the subsidy is raised to the job's bonus when posted
+  delivery_data: dict[str, Any]
+  job_fulfilled: bool = False
+
+
+@dataclass
+class LockedJob:
+  quantity_requested: int
+  quantity_fulfilled: int
+  bonus_multiplier: float
+  changed: bool = False
+
+
+def _lock_jobs_query(job_ids):
+  now = timezone.now()
+  sql = (
+    f"SELECT id, quantity_requested, quantity_fulfilled, bonus_multiplier FROM {JOB_TABLE} "
+    "WHERE id = ANY(%s) AND NOT fulfilled AND requested_at <= %s AND expired_at >= %s "
+    "ORDER BY id FOR UPDATE"
+  )
+  return sql, [sorted(job_ids), now, now]
+
+
+def _apply_jobs(groups, rows):
+  """
+  Counts each group towards its locked job, in order, like posting the
+  groups one after the other would
+  """
+  jobs = {
+    job_id: LockedJob(quantity_requested, quantity_fulfilled, bonus_multiplier)
+    for job_id, quantity_requested, quantity_fulfilled, bonus_multiplier in rows
+  }
+  for group in groups:
+    job = jobs.get(group.job_id) if group.job_id else None
+    if job is None or job.quantity_fulfilled >= job.quantity_requested:
+      group.job_id = None
+      continue
+    delivery_data = group.delivery_data
+    quantity_to_add = min(job.quantity_requested - job.quantity_fulfilled, group.quantity)
+    job.quantity_fulfilled += quantity_to_add
+    job.changed = True
+    # The job pays (multiplier - 1) times the payment of the quantity it took
+    multiplier = max(0.0, job.bonus_multiplier - 1)
+    bonus = int(delivery_data['payment'] * (quantity_to_add / delivery_data['quantity']) * multiplier + 0.5)
+    if bonus > delivery_data['subsidy']:
+      delivery_data['subsidy'] = bonus
+    group.job_fulfilled = job.quantity_fulfilled >= job.quantity_requested
+  return jobs
+
+
+def _pk(obj):
+  return obj.pk if obj is not None else None
+
+
+def _write_statements(groups, jobs):
+  """The (sql, params_seq) of the job updates, the delivery inserts and the lifetime earnings"""
+  statements: list[tuple[str, list[Any]]] = []
+  job_updates = [
+    (job.quantity_fulfilled, job_id)
+    for job_id, job in sorted(jobs.items())
+    if job.changed
+  ]
+  if job_updates:
+    statements.append((f"UPDATE {JOB_TABLE} SET quantity_fulfilled = %s WHERE id = %s", job_updates))
+
+  values = []
+  earnings = defaultdict(int)
+  for group in groups:
+    data = group.delivery_data
+    character_id = _pk(data.get('character'))
+    values.extend([
+      data['timestamp'],
+      character_id,
+      data['cargo_key'],
+      data['quantity'],
+      data['payment'],
+      data['subsidy'],
+      data.get('rp_mode', False),
+      _pk(data.get('sender_point')),
+      _pk(data.get('destination_point')),
+      group.job_id,
+    ])
+    if character_id is not None:
+      earnings[character_id] += data['payment'] + data['subsidy']
+  row = f"({', '.join(['%s'] * len(DELIVERY_COLUMNS))})"
+  statements.append((
+    f"INSERT INTO {DELIVERY_TABLE} ({', '.join(DELIVERY_COLUMNS)}) VALUES {', '.join([row] * len(groups))}",
+    [values],
+  ))
+
+  # Kept in step like Delivery.save does
+  if earnings:
+    statements.append((
+      f"UPDATE {PLAYER_TABLE} SET lifetime_earnings = lifetime_earnings + %s "
+      f"WHERE unique_id = (SELECT player_id FROM {CHARACTER_TABLE} WHERE id = %s)",
+      [(total, character_id) for character_id, total in sorted(earnings.items())],
+    ))
+  return statements
+
+
+def post_deliveries(groups: list[DeliveryGroup]) -> list[DeliveryGroup]:
+  """
+  Posts the deliveries of an arrival on Django's connection, in one
+  transaction: locks their jobs, adds the delivered quantities and bonuses,
+  inserts the deliveries and adds to the players' lifetime earnings.
+  """
+  if not groups:
+    return groups
+  with transaction.atomic(), connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+    rows = []
+    if job_ids := {group.job_id for group in groups if group.job_id}:
+      cursor.execute(*_lock_jobs_query(job_ids))
+      rows = cursor.fetchall()
+    jobs = _apply_jobs(groups, rows)
+    for sql, params_seq in _write_statements(groups, jobs):
+      cursor.executemany(sql, params_seq)
+  return groups
+
+
+class DeliveryConnectionPool:
+  """
+  A few psycopg AsyncConnections for posting deliveries, so concurrent
+  webhook batches don't queue behind each other on the single thread
+  that sync_to_async runs the ORM in.
+  """
+
+  def __init__(self, size: int | None = None):
+    self._size = size
+    self._idle: list[psycopg.AsyncConnection] = []
+    self._semaphore: asyncio.Semaphore | None = None
+    self._loop: asyncio.AbstractEventLoop | None = None
+
+  @property
+  def size(self) -> int:
+    return settings.DELIVERY_POSTING_CONNECTIONS if self._size is None else self._size
+
+  @staticmethod
+  def connection_params() -> dict[str, Any]:
+    """The parameters Django connects to the default database with, OPTIONS included"""
+    params = connections[DEFAULT_DB_ALIAS].get_connection_params()
+    # Django's cursor class is for its own sync connections
+    params.pop('cursor_factory', None)
+    return params
+
+  @asynccontextmanager
+  async def connection(self):
+    loop = asyncio.get_running_loop()
+    if loop is not self._loop:
+      # Connections can't be shared between event loops
+      self._loop = loop
+      self._idle = []
+      self._semaphore = asyncio.Semaphore(self.size)
+    assert self._semaphore is not None
+    async with self._semaphore:
+      if self._idle:
+        conn = self._idle.pop()
+      else:
+        conn = await psycopg.AsyncConnection.connect(autocommit=True, **self.connection_params())
+      try:
+        yield conn
+      except BaseException:
+        await conn.close()
+        raise
+      if not conn.closed and loop is self._loop:
+        self._idle.append(conn)
+
+  async def close(self):
+    idle, self._idle = self._idle, []
+    for conn in idle:
+      await conn.close()
+
+
+delivery_connection_pool = DeliveryConnectionPool()
+
+
+async def _apost_deliveries(groups):
+  async with delivery_connection_pool.connection() as conn:
+    # Two round trips: BEGIN and the job locks, then the writes and COMMIT
+    async with conn.pipeline(), conn.transaction(), conn.cursor() as cursor:
+      rows = []
+      if job_ids := {group.job_id for group in groups if group.job_id}:
+        sql, params = _lock_jobs_query(job_ids)
+        # Only the table names are interpolated into the statements
+        await cursor.execute(cast(LiteralString, sql), params)
+        rows = await cursor.fetchall()
+      jobs = _apply_jobs(groups, rows)
+      for sql, params_seq in _write_statements(groups, jobs):
+        await cursor.executemany(cast(LiteralString, sql), params_seq)
+  return groups
+
+
+async def apost_deliveries(groups: list[DeliveryGroup]) -> list[DeliveryGroup]:
+  """
+  Posts the deliveries of an arrival like `post_deliveries`, on a pooled
+  AsyncConnection, outside of any transaction of the caller. Falls back
+  to Django's connection when the pool is disabled
+  (DELIVERY_POSTING_CONNECTIONS = 0), as it is in tests, whose
+  transactions only that connection can see.
+  """
+  if not groups:
+    return groups
+  if not delivery_connection_pool.size:
+    return await sync_to_async(post_deliveries)(groups)
+  return await _apost_deliveries(groups)
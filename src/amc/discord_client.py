@@ -2,6 +2,7 @@ import discord
 from discord.ext import commands
 import aiohttp
 from django.conf import settings
+from amc.metrics import http_trace_config, instrument_discord_http, monitor_event_loop_lag
 from amc_cogs.moderation import ModerationCog
 from amc_cogs.auth import AuthenticationCog
 from amc_cogs.events import EventsCog
@@ -21,17 +22,23 @@ class AMCDiscordBot(commands.Bot):
         super().__init__(*args, **kwargs)
 
     async def setup_hook(self):
+        instrument_discord_http(self)
+        self.event_loop_lag_task = self.loop.create_task(monitor_event_loop_lag('discord'))
         self.http_client_game = aiohttp.ClientSession(
-            base_url=settings.GAME_SERVER_API_URL
+            base_url=settings.GAME_SERVER_API_URL,
+            trace_configs=[http_trace_config('game')],
         )
         self.http_client_mod = aiohttp.ClientSession(
-            base_url=settings.MOD_SERVER_API_URL
+            base_url=settings.MOD_SERVER_API_URL,
+            trace_configs=[http_trace_config('mod')],
         )
         self.event_http_client_game = aiohttp.ClientSession(
-            base_url=settings.EVENT_GAME_SERVER_API_URL
+            base_url=settings.EVENT_GAME_SERVER_API_URL,
+            trace_configs=[http_trace_config('event_game')],
         )
         self.event_http_client_mod = aiohttp.ClientSession(
-            base_url=settings.EVENT_MOD_SERVER_API_URL
+            base_url=settings.EVENT_MOD_SERVER_API_URL,
+            trace_configs=[http_trace_config('event_mod')],
         )
         guild = discord.Object(id=settings.DISCORD_GUILD_ID)
         await self.add_cog(ModerationCog(self), guild=guild)
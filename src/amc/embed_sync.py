@@ -0,0 +1,85 @@
+import json
+import asyncio
+import hashlib
+import discord
+
+EMBED_EDIT_CONCURRENCY = 2
+
+
+def embed_hash(embed: discord.Embed, content: str | None = None) -> str:
+  payload = json.dumps(
+    {'content': content, 'embed': embed.to_dict()},
+    sort_keys=True,
+    default=str,
+  )
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class EmbedSync:
+  """
+  Keeps Discord embed messages in sync with rendered embeds.
+
+  The hash of the last embed written to each message is remembered, so
+  unchanged embeds cost neither a fetch nor an edit. Edits go through
+  partial messages (no fetch) and at most `max_concurrency` Discord
+  requests run at once; the rest wait their turn.
+  """
+
+  def __init__(self, max_concurrency: int = EMBED_EDIT_CONCURRENCY):
+    self.max_concurrency = max_concurrency
+    self._hashes: dict[int, str] = {}
+    self._semaphore: asyncio.Semaphore | None = None
+    self.skipped = 0
+    self.edited = 0
+    self.sent = 0
+
+  @property
+  def semaphore(self) -> asyncio.Semaphore:
+    if self._semaphore is None:
+      self._semaphore = asyncio.Semaphore(self.max_concurrency)
+    return self._semaphore
+
+  def is_unchanged(self, message_id: int | None, digest: str) -> bool:
+    return message_id is not None and self._hashes.get(int(message_id)) == digest
+
+  def forget(self, message_id: int | None):
+    if message_id is not None:
+      self._hashes.pop(int(message_id), None)
+
+  async def sync(self, channel, message_id: int | None, embed: discord.Embed, content: str | None = None) -> int:
+    """
+    Edits the message with the embed, or sends a new one if there is no
+    message (or it was deleted). Returns the id of the message now holding
+    the embed.
+    """
+    digest = embed_hash(embed, content)
+    if message_id is not None and self.is_unchanged(message_id, digest):
+      self.skipped += 1
+      return int(message_id)
+
+    async with self.semaphore:
+      if message_id is not None:
+        try:
+          await channel.get_partial_message(int(message_id)).edit(content=content, embed=embed)
+          self._hashes[int(message_id)] = digest
+          self.edited += 1
+          return int(message_id)
+        except discord.NotFound:
+          self.forget(message_id)
+
+      message = await channel.send(content, embed=embed)
+      self._hashes[message.id] = digest
+      self.sent += 1
+      return message.id
+
+  async def finalize(self, channel, message_id: int, embed: discord.Embed, content: str | None = None):
+    """Writes a final embed to a message that will no longer be synced"""
+    try:
+      async with self.semaphore:
+        await channel.get_partial_message(int(message_id)).edit(content=content, embed=embed)
+        self.edited += 1
+    finally:
+      self.forget(message_id)
+
+
+embed_sync = EmbedSync()
@@ -1,5 +1,7 @@
+import json
 import math
 import asyncio
+import hashlib
 import discord
 import aiohttp
 from datetime import timedelta
@@ -10,6 +12,8 @@ from django.db.models import F, Prefetch, Exists, OuterRef, Window
 from django.db.models.functions import RowNumber
 from amc.mod_server import show_popup, send_system_message, teleport_player
 from amc.game_server import announce
+from amc.embed_sync import embed_sync
+from amc.personal_bests import refresh_game_event_personal_bests
 from amc.models import (
   Character,
   GameEvent,
@@ -74,7 +78,54 @@ async def setup_event(timestamp, player_id, scheduled_event, http_client_mod):
     return True
 
 
+def calculate_payload_hash(event):
+  encoded = json.dumps(event, sort_keys=True, separators=(',', ':'), default=str).encode()
+  return hashlib.sha256(encoded).hexdigest()
+
+
+async def resolve_event_characters(players_info):
+  """
+  Returns the character for each polled player, keyed by UniqueNetId and
+  CharacterGuid. Known characters are loaded in one query; only new or
+  renamed ones go through aget_or_create_character_player.
+  """
+  keys = {
+    (int(player_info['CharacterId']['UniqueNetId']), player_info['CharacterId']['CharacterGuid']): player_info['PlayerName']
+    for player_info in players_info
+  }
+  characters = {
+    (character.player_id, character.guid): character
+    async for character in Character.objects.filter(guid__in=[guid for _, guid in keys])
+  }
+  for (unique_id, guid), name in keys.items():
+    character = characters.get((unique_id, guid))
+    if character is None or character.name != name:
+      characters[(unique_id, guid)], *_ = await Character.objects.aget_or_create_character_player(
+        name,
+        unique_id,
+        character_guid=guid,
+      )
+  return characters
+
+
 async def process_event(event):
+  """
+  Syncs a polled game event and its players.
+
+  Returns None when the payload is identical to the one last processed for
+  the event. Otherwise, all participants are written with one upsert per
+  set of updated columns and their lap section times with one more.
+  """
+  payload_hash = calculate_payload_hash(event)
+  last_payload_hash = await (GameEvent.objects
+    .filter(guid=event['EventGuid'])
+    .order_by('-start_time')
+    .values_list('payload_hash', flat=True)
+    .afirst()
+  )
+  if last_payload_hash == payload_hash:
+    return None
+
   transition = None
   race_setup_hash = RaceSetup.calculate_hash(event['RaceSetup'])
   race_setup, _ = await RaceSetup.objects.aget_or_create(
@@ -145,20 +196,25 @@ async def process_event(event):
       scheduled_event=scheduled_event,
     )
 
-  async def process_player(player_info):
-    character, *_ = await Character.objects.aget_or_create_character_player(
-      player_info['PlayerName'],
-      int(player_info['CharacterId']['UniqueNetId']),
-      character_guid=player_info['CharacterId']['CharacterGuid'],
-    )
-    player_finished = await GameEventCharacter.objects.filter(
-      character=character,
+  characters = await resolve_event_characters(event['Players'])
+  existing_participants = {
+    character_id: (finished, laps, section_index)
+    async for character_id, finished, laps, section_index in GameEventCharacter.objects.filter(
       game_event=game_event,
-      finished=True
-    ).aexists()
-    if player_finished:
+    ).values_list('character_id', 'finished', 'laps', 'section_index')
+  }
+
+  # Rows are grouped by the columns they update, since an upsert
+  # statement updates the same columns for every row
+  participants_by_fields = {}
+  for player_info in event['Players']:
+    character = characters[(
+      int(player_info['CharacterId']['UniqueNetId']),
+      player_info['CharacterId']['CharacterGuid'],
+    )]
+    if existing_participants.get(character.id, (False,))[0]:
       # Do not update finished players
-      return
+      continue
 
     defaults = {
       'last_section_total_time_seconds': player_info['LastSectionTotalTimeSeconds'],
@@ -183,37 +239,71 @@ async def process_event(event):
       else:
         defaults['first_section_total_time_seconds'] = 0
 
-    game_event_character, _ = await GameEventCharacter.objects.aupdate_or_create(
+    participants = participants_by_fields.setdefault(tuple(defaults), {})
+    participants[character.id] = GameEventCharacter(
       character=character,
       game_event=game_event,
-      defaults=defaults,
-      create_defaults={
+      **{
         **defaults,
         'wrong_vehicle': player_info['bWrongVehicle'],
         'wrong_engine': player_info['bWrongEngine'],
       }
     )
 
-    if game_event.state >= 2 and game_event_character.section_index >= 0 and game_event_character.laps >= 1:
-      laps = game_event_character.laps - 1
-      section_index = game_event_character.section_index
-      await LapSectionTime.objects.aupdate_or_create(
+  lap_section_times = []
+  advanced_participant_ids = []
+  for update_fields, participants in participants_by_fields.items():
+    game_event_characters = await GameEventCharacter.objects.abulk_create(
+      list(participants.values()),
+      update_conflicts=True,
+      unique_fields=['character', 'game_event'],
+      update_fields=list(update_fields),
+    )
+    if game_event.state < 2:
+      continue
+    lap_section_times.extend(
+      LapSectionTime(
         game_event_character=game_event_character,
-        section_index=section_index,
-        lap=laps,
-        defaults={
-          'total_time_seconds': game_event_character.last_section_total_time_seconds,
-          'rank': game_event_character.rank,
-        }
+        section_index=game_event_character.section_index,
+        lap=game_event_character.laps - 1,
+        total_time_seconds=game_event_character.last_section_total_time_seconds,
+        rank=game_event_character.rank,
       )
+      for game_event_character in game_event_characters
+      if game_event_character.section_index >= 0 and game_event_character.laps >= 1
+    )
+    advanced_participant_ids.extend(
+      game_event_character.id
+      for game_event_character in game_event_characters
+      if existing_participants.get(game_event_character.character_id, (False, 0, -1))[1:]
+        != (game_event_character.laps, game_event_character.section_index)
+    )
 
-    return game_event_character
-
-  await asyncio.gather(*[
-    process_player(player_info)
-    for player_info in event['Players']
-  ])
+  if lap_section_times:
+    await LapSectionTime.objects.abulk_create(
+      lap_section_times,
+      update_conflicts=True,
+      unique_fields=['game_event_character', 'section_index', 'lap'],
+      update_fields=['total_time_seconds', 'rank'],
+    )
+  if advanced_participant_ids:
+    # Splits only change when a participant reaches a new section
+    await LapSectionTime.objects.aupdate_splits(advanced_participant_ids)
 
+  if transition is not None:
+    await refresh_game_event_personal_bests(game_event)
+  else:
+    # Personal bests only change when a participant joins or finishes
+    changed_character_ids = [
+      character_id
+      for participants in participants_by_fields.values()
+      for character_id, participant in participants.items()
+      if character_id not in existing_participants or participant.finished
+    ]
+    if changed_character_ids:
+      await refresh_game_event_personal_bests(game_event, changed_character_ids)
+
+  await GameEvent.objects.filter(pk=game_event.pk).aupdate(payload_hash=payload_hash)
   return game_event, transition, scheduled_event
 
 def format_time(total_seconds: float) -> str:
@@ -300,7 +390,7 @@ async def monitor_events(ctx, http_client):
         for event in events
       ])
 
-      for (game_event, transition, scheduled_event) in results:
+      for (game_event, transition, scheduled_event) in filter(None, results):
         if transition == (2, 3): # Finished
           participants = [p async for p in (GameEventCharacter.objects
             .select_related('character', 'character__player')
@@ -406,20 +496,10 @@ def create_event_embed(game_event):
 
 async def send_event_embed(game_event, channel):
   embed = create_event_embed(game_event)
-
-  ## Create embed
-  if game_event.discord_message_id is None:
-    message = await channel.send('', embed=embed)
-    game_event.discord_message_id = message.id
+  message_id = await embed_sync.sync(channel, game_event.discord_message_id, embed, content='')
+  if message_id != game_event.discord_message_id:
+    game_event.discord_message_id = message_id
     await game_event.asave(update_fields=['discord_message_id'])
-  else:
-    try:
-      message = await channel.fetch_message(game_event.discord_message_id)
-      await message.edit(content='', embed=embed)
-    except discord.NotFound:
-      message = await channel.send('', embed=embed)
-      game_event.discord_message_id = message.id
-      await game_event.asave(update_fields=['discord_message_id'])
 
 async def send_event_embeds(ctx):
   http_client = ctx.get('http_client_event_mod')
@@ -483,15 +563,23 @@ async def send_event_embeds(ctx):
     if expired_discord_messages:
       try:
         await GameEvent.objects.filter(discord_message_id__in=mIds).aupdate(discord_message_id=None)
+        for mId in mIds:
+          embed_sync.forget(mId)
         await channel.delete_messages(expired_discord_messages)
       except Exception as e:
         print(f'Failed to delete {mIds}: {e}', flush=True)
 
   async def delete_unattached_embeds():
-    to_delete = []
-    async for m in channel.history(limit=20):
-      if not (await GameEvent.objects.filter(discord_message_id=m.id).aexists()):
-        to_delete.append(m)
+    messages = [m async for m in channel.history(limit=20)]
+    attached_message_ids = {
+      message_id
+      async for message_id in GameEvent.objects.filter(
+        discord_message_id__in=[m.id for m in messages]
+      ).values_list('discord_message_id', flat=True)
+    }
+    to_delete = [m for m in messages if m.id not in attached_message_ids]
+    for m in to_delete:
+      embed_sync.forget(m.id)
     await channel.delete_messages(to_delete)
 
   asyncio.run_coroutine_threadsafe(
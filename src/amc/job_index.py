@@ -0,0 +1,191 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+import redis
+import redis.asyncio as aioredis
+from amc.models import Cargo, DeliveryJob
+from amc.redis_utils import get_redis_url
+
+logger = logging.getLogger(__name__)
+
+JOB_INDEX_CHANNEL = 'delivery_jobs_changed'
+JOB_INDEX_MAX_AGE = 60 # seconds, in case a change notification is lost
+
+
+@dataclass(frozen=True)
+class IndexedJob:
+  id: int
+  expired_at: datetime
+  rp_mode: bool
+  # Empty when the job accepts any point
+  source_point_ids: frozenset[str]
+  destination_point_ids: frozenset[str]
+
+  def matches(self, source_point_id, destination_point_id, now):
+    return (
+      self.expired_at >= now
+      and (not self.source_point_ids or source_point_id in self.source_point_ids)
+      and (not self.destination_point_ids or destination_point_id in self.destination_point_ids)
+    )
+
+
+class ActiveJobIndex:
+  """
+  In-process index of the active delivery jobs by the cargo keys they
+  accept, so matching a delivery to a job is a dict lookup instead of
+  `DeliveryJob.objects.filter_active().filter_by_delivery(...)`.
+
+  A job accepts its `cargo_key`, the keys of its cargos and of their
+  types, and the keys of the subtypes of its cargos, the same as
+  `filter_by_delivery`. The index is rebuilt lazily after `invalidate()`,
+  which the DeliveryJob signals call in this process and `listen()`
+  calls when another process broadcasts a change, and at least every
+  `max_age` seconds.
+
+  Matches can be stale by a moment, so the chosen job must be re-checked
+  when it's locked.
+  """
+
+  def __init__(self, max_age: float = JOB_INDEX_MAX_AGE):
+    self.max_age = max_age
+    self._jobs_by_cargo: dict[str, list[IndexedJob]] | None = None
+    self._built_at = 0.0
+    self._generation = 0
+    self.rebuilds = 0
+
+  def invalidate(self):
+    self._generation += 1
+    self._jobs_by_cargo = None
+
+  @property
+  def stale(self):
+    return self._jobs_by_cargo is None or time.monotonic() - self._built_at > self.max_age
+
+  def build(self):
+    generation = self._generation
+    jobs = list(DeliveryJob.objects
+      .filter_active()
+      .values_list('id', 'cargo_key', 'expired_at', 'rp_mode')
+    )
+    job_ids = [job_id for job_id, *_ in jobs]
+
+    cargo_keys = defaultdict(set)
+    for job_id, cargo_key, *_ in jobs:
+      if cargo_key:
+        cargo_keys[job_id].add(cargo_key)
+    job_cargos = DeliveryJob.cargos.through.objects.filter(deliveryjob_id__in=job_ids)
+    jobs_by_type = defaultdict(set)
+    for job_id, cargo_id, type_id in job_cargos.values_list('deliveryjob_id', 'cargo_id', 'cargo__type_id'):
+      cargo_keys[job_id].add(cargo_id)
+      if type_id:
+        cargo_keys[job_id].add(type_id)
+      jobs_by_type[cargo_id].add(job_id)
+    for type_id, key in Cargo.objects.filter(type__in=list(jobs_by_type)).values_list('type_id', 'key'):
+      for job_id in jobs_by_type[type_id]:
+        cargo_keys[job_id].add(key)
+
+    points = {}
+    for field in ('source_points', 'destination_points'):
+      points[field] = defaultdict(set)
+      through = getattr(DeliveryJob, field).through
+      for job_id, point_id in through.objects.filter(deliveryjob_id__in=job_ids).values_list('deliveryjob_id', 'deliverypoint_id'):
+        points[field][job_id].add(point_id)
+
+    jobs_by_cargo = defaultdict(list)
+    for job_id, _, expired_at, rp_mode in sorted(jobs):
+      job = IndexedJob(
+        id=job_id,
+        expired_at=expired_at,
+        rp_mode=rp_mode,
+        source_point_ids=frozenset(points['source_points'][job_id]),
+        destination_point_ids=frozenset(points['destination_points'][job_id]),
+      )
+      for cargo_key in cargo_keys[job_id]:
+        jobs_by_cargo[cargo_key].append(job)
+
+    self.rebuilds += 1
+    # A change during the build leaves the index stale
+    if generation == self._generation:
+      self._jobs_by_cargo = dict(jobs_by_cargo)
+      self._built_at = time.monotonic()
+    return dict(jobs_by_cargo)
+
+  async def amatch(self, source_point_id, destination_point_id, cargo_key) -> IndexedJob | None:
+    """The oldest active job accepting this delivery, like filter_by_delivery().first()"""
+    jobs_by_cargo = self._jobs_by_cargo
+    if self.stale or jobs_by_cargo is None:
+      jobs_by_cargo = await sync_to_async(self.build)()
+    now = timezone.now()
+    for job in jobs_by_cargo.get(cargo_key, []):
+      if job.matches(source_point_id, destination_point_id, now):
+        return job
+    return None
+
+  async def listen(self, redis_url=None):
+    """Invalidates the index whenever another process changes a job"""
+    while True:
+      redis_client = aioredis.from_url(redis_url or get_redis_url())
+      pubsub = redis_client.pubsub()
+      try:
+        await pubsub.subscribe(JOB_INDEX_CHANNEL)
+        # Changes may have been missed while unsubscribed
+        self.invalidate()
+        async for message in pubsub.listen():
+          if message['type'] == 'message':
+            self.invalidate()
+      except asyncio.CancelledError:
+        raise
+      except Exception:
+        logger.exception("Delivery job index listener failed, reconnecting")
+        await asyncio.sleep(5)
+      finally:
+        await pubsub.aclose()
+        await redis_client.aclose()
+
+
+active_job_index = ActiveJobIndex()
+
+
+def broadcast_jobs_changed():
+  try:
+    with redis.Redis.from_url(get_redis_url(), socket_connect_timeout=1) as redis_client:
+      redis_client.publish(JOB_INDEX_CHANNEL, '1')
+  except redis.RedisError as e:
+    logger.warning(f"Failed to broadcast delivery job change: {e}")
+
+
+def _on_jobs_committed():
+  active_job_index.invalidate()
+  broadcast_jobs_changed()
+
+
+def jobs_changed():
+  """
+  Invalidates the active job index of this process now, and of every
+  process (through Redis) once the current transaction commits
+  """
+  active_job_index.invalidate()
+  transaction.on_commit(_on_jobs_committed)
+
+
+def on_job_saved(sender, instance, update_fields=None, **kwargs):
+  # Deliveries only bump the fulfilled quantity; whoever fulfils the
+  # job calls jobs_changed()
+  if update_fields is not None and set(update_fields) <= {'quantity_fulfilled'}:
+    return
+  jobs_changed()
+
+
+def on_job_deleted(sender, instance, **kwargs):
+  jobs_changed()
+
+
+def on_job_relations_changed(sender, action, **kwargs):
+  if action in ('post_add', 'post_remove', 'post_clear'):
+    jobs_changed()
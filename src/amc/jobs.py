@@ -5,11 +5,12 @@ from typing import List
 import itertools
 from operator import attrgetter
 from datetime import timedelta
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from django.db.models import Q, Prefetch
+from django.db import connection
+from django.db.models import Prefetch
 from amc.models import (
     Cargo,
-    DeliveryPointStorage,
     DeliveryJob,
     DeliveryJobTemplate,
     MinistryTerm,
@@ -98,6 +99,134 @@ async def cleanup_expired_jobs():
         await process_treasury_expiration_penalty(job)
 
 
+TEMPLATE_STORAGE_TOTALS_SQL = """
+  WITH template_points AS (
+    SELECT deliveryjobtemplate_id AS template_id, deliverypoint_id, 'source' AS side
+    FROM amc_deliveryjobtemplate_source_points
+    WHERE deliveryjobtemplate_id = ANY(%(template_ids)s)
+    UNION ALL
+    SELECT deliveryjobtemplate_id AS template_id, deliverypoint_id, 'destination' AS side
+    FROM amc_deliveryjobtemplate_destination_points
+    WHERE deliveryjobtemplate_id = ANY(%(template_ids)s)
+  )
+  SELECT
+    tp.template_id,
+    tp.side,
+    COALESCE(SUM(storage.amount), 0),
+    COALESCE(SUM(COALESCE(storage.capacity, type_storage.capacity, 0)), 0)
+  FROM template_points tp
+  JOIN amc_deliverypointstorage storage ON storage.delivery_point_id = tp.deliverypoint_id
+  JOIN amc_cargo cargo ON cargo.key = storage.cargo_id
+  LEFT JOIN amc_deliverypointstorage type_storage ON (
+    type_storage.delivery_point_id = storage.delivery_point_id
+    AND type_storage.cargo_id = cargo.type_id
+    AND type_storage.kind = storage.kind
+  )
+  WHERE EXISTS (
+    SELECT 1 FROM amc_deliveryjobtemplate_cargos template_cargo
+    WHERE template_cargo.deliveryjobtemplate_id = tp.template_id
+    AND (
+      (template_cargo.cargo_id = storage.cargo_id AND position('T::' in template_cargo.cargo_id) = 0)
+      OR template_cargo.cargo_id = cargo.type_id
+    )
+  )
+  GROUP BY tp.template_id, tp.side
+"""
+
+EMPTY_STORAGE_TOTALS = {
+    "source_amount": 0,
+    "source_capacity": 0,
+    "destination_amount": 0,
+    "destination_capacity": 0,
+}
+
+
+async def get_template_storage_totals(template_ids) -> dict[int, dict[str, int]]:
+    """
+    Sums storage amounts and capacities at the source and destination points
+    of every template in one query. A storage counts towards a template when
+    its cargo is one of the template's (non-type) cargos, or a subtype of one
+    of them. Missing capacities fall back to the storage of the cargo type,
+    same as `DeliveryPointStorageQuerySet.annotate_default_capacity`.
+    """
+
+    def _execute_raw_sql(sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    rows = await sync_to_async(_execute_raw_sql, thread_sensitive=True)(
+        TEMPLATE_STORAGE_TOTALS_SQL, {"template_ids": list(template_ids)}
+    )
+
+    totals: dict[int, dict[str, int]] = {}
+    for template_id, side, amount, capacity in rows:
+        template_totals = totals.setdefault(template_id, dict(EMPTY_STORAGE_TOTALS))
+        template_totals[f"{side}_amount"] = int(amount)
+        template_totals[f"{side}_capacity"] = int(capacity)
+    return totals
+
+
+def evaluate_template_posting(
+    template, storage_totals, has_points, num_players, num_active_jobs
+):
+    """
+    Decides whether a template should be posted, given its storage totals.
+    Returns the quantity to request, or None if it should not be posted.
+    """
+    destination_amount = storage_totals["destination_amount"]
+    destination_capacity = storage_totals["destination_capacity"]
+    source_amount = storage_totals["source_amount"]
+    source_capacity = storage_totals["source_capacity"]
+
+    quantity_requested = template.default_quantity
+    if template.expected_player_count_for_quantity:
+        quantity_requested = min(
+            quantity_requested,
+            int(
+                quantity_requested
+                * num_players
+                / template.expected_player_count_for_quantity
+            ),
+        )
+
+    if destination_capacity == 0:
+        is_destination_empty = True
+    else:
+        is_destination_empty = (
+            (destination_amount / destination_capacity) <= 0.15
+        ) or (destination_capacity - destination_amount >= quantity_requested)
+
+    if destination_capacity > 0:
+        quantity_requested = min(
+            quantity_requested, destination_capacity - destination_amount
+        )
+
+    if source_capacity == 0:
+        is_source_enough = True
+    elif source_amount >= source_capacity * 0.85:
+        is_source_enough = True
+    else:
+        is_source_enough = source_amount >= quantity_requested
+
+    if not is_destination_empty or not is_source_enough:
+        return None
+
+    chance = (
+        template.job_posting_probability
+        * max(10, num_players)
+        / 2000
+        / (5 + num_active_jobs * 2)
+    )
+    if not has_points:
+        chance = chance / (24 * 3)
+
+    if random.random() > chance:
+        return None
+
+    return quantity_requested
+
+
 async def monitor_jobs(ctx):
     await cleanup_expired_jobs()
     num_active_jobs = await DeliveryJob.objects.filter_active().acount()
@@ -117,94 +246,38 @@ async def monitor_jobs(ctx):
     if num_active_jobs >= max_active_jobs:
         return
 
-    job_templates = (
-        DeliveryJobTemplate.objects.exclude_has_conflicting_active_job()
+    job_templates = [
+        template
+        async for template in DeliveryJobTemplate.objects.exclude_has_conflicting_active_job()
         .exclude_recently_posted()
         .prefetch_related(
             Prefetch("cargos", queryset=Cargo.objects.select_related("type").all()),
             "source_points",
             "destination_points",
         )
-        .order_by("?")
+    ]
+    if not job_templates:
+        return
+    random.shuffle(job_templates)
+
+    storage_totals = await get_template_storage_totals(
+        [template.id for template in job_templates]
     )
+    active_term = await MinistryTerm.objects.filter(is_active=True).afirst()
 
-    async for template in job_templates:
+    for template in job_templates:
         cargos = template.cargos.all()
         source_points = template.source_points.all()
         destination_points = template.destination_points.all()
 
-        non_type_cargos = [c for c in cargos if "T::" not in c.key]
-        destination_storages = DeliveryPointStorage.objects.filter(
-            Q(cargo__in=non_type_cargos) | Q(cargo__type__in=cargos),
-            delivery_point__in=destination_points,
-        ).annotate_default_capacity()
-        source_storages = DeliveryPointStorage.objects.filter(
-            Q(cargo__in=non_type_cargos) | Q(cargo__type__in=cargos),
-            delivery_point__in=source_points,
-        ).annotate_default_capacity()
-
-        destination_storage_capacities = [
-            (storage.amount, storage.capacity_normalized or 0)
-            async for storage in destination_storages
-        ]
-        source_storage_capacities = [
-            (storage.amount, storage.capacity_normalized or 0)
-            async for storage in source_storages
-        ]
-        destination_amount = sum(
-            [amount for amount, capacity in destination_storage_capacities]
-        )
-        destination_capacity = sum(
-            [capacity for amount, capacity in destination_storage_capacities]
-        )
-        source_amount = sum([amount for amount, capacity in source_storage_capacities])
-        source_capacity = sum(
-            [capacity for amount, capacity in source_storage_capacities]
-        )
-
-        quantity_requested = template.default_quantity
-        if template.expected_player_count_for_quantity:
-            quantity_requested = min(
-                quantity_requested,
-                int(
-                    quantity_requested
-                    * num_players
-                    / template.expected_player_count_for_quantity
-                ),
-            )
-
-        if destination_capacity == 0:
-            is_destination_empty = True
-        else:
-            is_destination_empty = (
-                (destination_amount / destination_capacity) <= 0.15
-            ) or (destination_capacity - destination_amount >= quantity_requested)
-
-        if destination_capacity > 0:
-            quantity_requested = min(
-                quantity_requested, destination_capacity - destination_amount
-            )
-
-        if source_capacity == 0:
-            is_source_enough = True
-        elif source_amount >= source_capacity * 0.85:
-            is_source_enough = True
-        else:
-            is_source_enough = source_amount >= quantity_requested
-
-        if not is_destination_empty or not is_source_enough:
-            continue
-
-        chance = (
-            template.job_posting_probability
-            * max(10, num_players)
-            / 2000
-            / (5 + num_active_jobs * 2)
+        quantity_requested = evaluate_template_posting(
+            template,
+            storage_totals.get(template.id, EMPTY_STORAGE_TOTALS),
+            has_points=bool(source_points or destination_points),
+            num_players=num_players,
+            num_active_jobs=num_active_jobs,
         )
-        if not source_points and not destination_points:
-            chance = chance / (24 * 3)
-
-        if random.random() > chance:
+        if quantity_requested is None:
             continue
 
         rp_mode = template.rp_mode or random.random() < 0.15
@@ -222,7 +295,6 @@ async def monitor_jobs(ctx):
         if rp_mode and not template.rp_mode:
             completion_bonus = completion_bonus * 1.5
 
-        active_term = await MinistryTerm.objects.filter(is_active=True).afirst()
         if active_term:
             # Check if Ministry has enough budget
             # Ideally we should strictly check account balance, but current_budget is a good proxy for speed
@@ -0,0 +1,77 @@
+import time
+import random
+import asyncio
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from amc.enums import CargoKey
+from amc.models import Player, Character, Delivery, DeliveryJob
+from amc.delivery_posting import (
+  DeliveryGroup,
+  apost_deliveries,
+  delivery_connection_pool,
+  post_deliveries,
+)
+
+class Command(BaseCommand):
+  help = "Compare the throughput of posting deliveries through the ORM and on async connections"
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batches', type=int, default=500, help="Webhook batches to post")
+    parser.add_argument('--concurrency', type=int, default=50, help="Batches posted at the same time")
+    parser.add_argument('--groups', type=int, default=3, help="Cargo groups per arrival")
+    parser.add_argument('--jobs', type=int, default=20, help="Jobs the deliveries count towards")
+
+  def handle(self, *args, **options):
+    player = Player.objects.create(unique_id=random.randint(10**15, 10**16))
+    character = Character.objects.create(player=player, name="Delivery posting benchmark")
+    jobs = DeliveryJob.objects.bulk_create([
+      DeliveryJob(
+        name="Delivery posting benchmark",
+        quantity_requested=10**9,
+        bonus_multiplier=1.5,
+        expired_at=timezone.now() + timedelta(hours=1),
+      )
+      for _ in range(options['jobs'])
+    ])
+    job_ids = [job.id for job in jobs]
+    try:
+      for name, post in [
+        ("ORM (sync_to_async)", sync_to_async(post_deliveries)),
+        ("AsyncConnection", apost_deliveries),
+      ]:
+        elapsed = asyncio.run(self.run(post, character, job_ids, **options))
+        self.stdout.write(
+          f"{name}: {options['batches']} batches in {elapsed:.2f}s, "
+          f"{options['batches'] / elapsed:.1f} batches/s"
+        )
+    finally:
+      Delivery.objects.filter(character=character).delete()
+      DeliveryJob.objects.filter(pk__in=job_ids).delete()
+      player.delete()
+
+  async def run(self, post, character, job_ids, batches, concurrency, groups, **options):
+    cargo_keys = [key for key, _ in CargoKey.choices[:groups]]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post_batch():
+      async with semaphore:
+        await post([
+          DeliveryGroup(random.choice(job_ids), 1, {
+            'timestamp': timezone.now(),
+            'character': character,
+            'cargo_key': cargo_key,
+            'quantity': 1,
+            'payment': 1000,
+            'subsidy': 0,
+          })
+          for cargo_key in cargo_keys
+        ])
+
+    started = time.perf_counter()
+    try:
+      await asyncio.gather(*[post_batch() for _ in range(batches)])
+    finally:
+      await delivery_connection_pool.close()
+    return time.perf_counter() - started
@@ -0,0 +1,62 @@
+import time
+import statistics
+from datetime import timedelta
+from urllib.parse import urlencode
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+
+
+def map_page_requests():
+  """The API requests the website's map page makes on load"""
+  now = timezone.now()
+  locations_query = urlencode({
+    'start_time': (now - timedelta(hours=1)).isoformat(),
+    'end_time': now.isoformat(),
+  })
+  return [
+    '/api/deliverypoints/',
+    '/api/deliveryjobs/',
+    '/api/housing/',
+    '/api/subsidies/areas/',
+    '/api/cargos/',
+    f'/api/character_locations/?{locations_query}',
+  ]
+
+
+class Command(BaseCommand):
+  help = "Measure the bytes sent and the p95 latency of the map page's API requests"
+
+  def add_arguments(self, parser):
+    parser.add_argument('--rounds', type=int, default=20, help="Times the request set is made per mode")
+
+  def handle(self, *args, **options):
+    paths = map_page_requests()
+    client = Client(SERVER_NAME='localhost')
+    modes = [
+      ("plain", {}),
+      ("compressed", {'Accept-Encoding': 'br, gzip'}),
+      ("revalidated", {'Accept-Encoding': 'br, gzip'}),
+    ]
+    etags = {}
+    for mode, headers in modes:
+      latencies = []
+      sent = 0
+      statuses = set()
+      for _ in range(options['rounds']):
+        for path in paths:
+          request_headers = dict(headers)
+          if mode == "revalidated" and path in etags:
+            request_headers['If-None-Match'] = etags[path]
+          started = time.perf_counter()
+          response = client.get(path, headers=request_headers)
+          latencies.append(time.perf_counter() - started)
+          sent += len(response.content)
+          statuses.add(response.status_code)
+          if 'ETag' in response:
+            etags[path] = response['ETag']
+      p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+      self.stdout.write(
+        f"{mode}: {sent / options['rounds'] / 1024:.1f} KiB per page load, "
+        f"p95 {p95 * 1000:.1f}ms per request, statuses {sorted(statuses)}"
+      )
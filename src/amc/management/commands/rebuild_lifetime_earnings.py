@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from amc.models import Player
+
+class Command(BaseCommand):
+  help = "Recompute every player's lifetime earnings from their deliveries"
+
+  def handle(self, *args, **options):
+    players = Player.objects.rebuild_lifetime_earnings()
+    self.stdout.write(f"Rebuilt lifetime earnings for {players} players")
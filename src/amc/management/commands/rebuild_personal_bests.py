@@ -0,0 +1,13 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from amc.personal_bests import rebuild_personal_bests
+
+class Command(BaseCommand):
+  help = "Rebuild the track and scheduled event personal best tables"
+
+  async def _async_handle(self, *args, **options):
+    tracks, scheduled_events = await rebuild_personal_bests()
+    self.stdout.write(f"Rebuilt personal bests for {tracks} tracks and {scheduled_events} scheduled events")
+
+  def handle(self, *args, **options):
+    asyncio.run(self._async_handle(*args, **options))
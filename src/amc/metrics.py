@@ -0,0 +1,222 @@
+import re
+import time
+import asyncio
+from functools import wraps
+import aiohttp
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+  CONTENT_TYPE_LATEST,
+  Counter,
+  Gauge,
+  Histogram,
+  generate_latest,
+)
+from amc.query_budget import query_budget
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+JOB_DURATION = Histogram(
+  'amc_job_duration_seconds',
+  'Duration of arq jobs',
+  ['function'],
+)
+JOBS_IN_PROGRESS = Gauge(
+  'amc_jobs_in_progress',
+  'arq jobs currently running; above 1 means runs overlap',
+  ['function'],
+)
+JOB_FAILURES = Counter(
+  'amc_job_failures_total',
+  'arq jobs that raised',
+  ['function'],
+)
+JOB_DB_QUERIES = Histogram(
+  'amc_job_db_queries',
+  'Database queries made by an arq job',
+  ['function'],
+  buckets=QUERY_COUNT_BUCKETS,
+)
+JOB_DB_SECONDS = Histogram(
+  'amc_job_db_seconds',
+  'Time an arq job spent in database queries',
+  ['function'],
+)
+REQUEST_DURATION = Histogram(
+  'amc_request_duration_seconds',
+  'Duration of HTTP requests served by Django',
+  ['route', 'method', 'status'],
+)
+OUTBOUND_HTTP_DURATION = Histogram(
+  'amc_outbound_http_duration_seconds',
+  'Latency of requests to the game, mod and webhook servers',
+  ['service', 'method', 'endpoint', 'status'],
+)
+DISCORD_API_CALLS = Counter(
+  'amc_discord_api_calls_total',
+  'Requests made to the Discord API',
+  ['method', 'route'],
+)
+QUEUE_DEPTH = Gauge(
+  'amc_queue_depth',
+  'Items waiting in a queue',
+  ['queue'],
+)
+EVENT_LOOP_LAG = Gauge(
+  'amc_event_loop_lag_seconds',
+  'How late the event loop woke up a sleeping task',
+  ['loop'],
+)
+WEBHOOK_LAG = Gauge(
+  'amc_webhook_lag_seconds',
+  'Time between the oldest event of the last processed webhook batch and its processing',
+  ['consumer'],
+)
+CHART_RENDER_DURATION = Histogram(
+  'amc_chart_render_seconds',
+  'Time to render a chart in the worker pool',
+)
+CHART_CACHE_HITS = Counter(
+  'amc_chart_cache_hits_total',
+  'Charts served from the render cache',
+)
+SHARED_CACHE_REQUESTS = Counter(
+  'amc_shared_cache_requests_total',
+  'Reads of the shared cache, by outcome: hit, stale, miss, coalesced or error',
+  ['name', 'outcome'],
+)
+
+
+def instrument_job(func):
+  """
+  Records the duration, overlap, failures and queries of an arq job
+  function, and logs the runs that make more than QUERY_BUDGET_JOB queries
+  """
+  name = func.__qualname__
+
+  @wraps(func)
+  async def wrapper(ctx, *args, **kwargs):
+    JOBS_IN_PROGRESS.labels(name).inc()
+    started = time.perf_counter()
+    with query_budget(settings.QUERY_BUDGET_JOB, name) as queries:
+      try:
+        return await func(ctx, *args, **kwargs)
+      except Exception:
+        JOB_FAILURES.labels(name).inc()
+        raise
+      finally:
+        JOB_DURATION.labels(name).observe(time.perf_counter() - started)
+        JOB_DB_QUERIES.labels(name).observe(queries.count)
+        JOB_DB_SECONDS.labels(name).observe(queries.seconds)
+        JOBS_IN_PROGRESS.labels(name).dec()
+  return wrapper
+
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9A-Fa-f]{16,}|[0-9A-Fa-f]{8}(-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12})$')
+
+
+def normalize_endpoint(path):
+  """Replaces ids and guids in a URL path so endpoints share one label"""
+  return '/'.join(
+    '{id}' if _ID_SEGMENT.match(segment) else segment
+    for segment in path.split('/')
+  )
+
+
+def http_trace_config(service):
+  """aiohttp trace config recording the latency of every request of a client session"""
+  trace_config = aiohttp.TraceConfig()
+
+  async def on_request_start(session, context, params):
+    context.started = time.perf_counter()
+
+  def observe(context, params, status):
+    OUTBOUND_HTTP_DURATION.labels(
+      service,
+      params.method,
+      normalize_endpoint(params.url.path),
+      status,
+    ).observe(time.perf_counter() - context.started)
+
+  async def on_request_end(session, context, params):
+    observe(context, params, params.response.status)
+
+  async def on_request_exception(session, context, params):
+    observe(context, params, 'error')
+
+  # aiohttp's signal types don't check as callables
+  # pyrefly: ignore [bad-argument-type]
+  trace_config.on_request_start.append(on_request_start)
+  # pyrefly: ignore [bad-argument-type]
+  trace_config.on_request_end.append(on_request_end)
+  # pyrefly: ignore [bad-argument-type]
+  trace_config.on_request_exception.append(on_request_exception)
+  return trace_config
+
+
+def instrument_discord_http(client):
+  """Counts the Discord API requests made by a discord.py client"""
+  request = client.http.request
+
+  @wraps(request)
+  async def counted_request(route, *args, **kwargs):
+    DISCORD_API_CALLS.labels(route.method, route.path).inc()
+    return await request(route, *args, **kwargs)
+
+  client.http.request = counted_request
+
+
+async def monitor_event_loop_lag(name, interval=1.0):
+  """Measures how late the running loop wakes a task sleeping for `interval`"""
+  loop = asyncio.get_running_loop()
+  while True:
+    started = loop.time()
+    await asyncio.sleep(interval)
+    EVENT_LOOP_LAG.labels(name).set(max(0.0, loop.time() - started - interval))
+
+
+def _record_request(request, response, started):
+  resolver_match = getattr(request, 'resolver_match', None)
+  REQUEST_DURATION.labels(
+    resolver_match.route if resolver_match else 'unmatched',
+    request.method,
+    response.status_code,
+  ).observe(time.perf_counter() - started)
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+  if iscoroutinefunction(get_response):
+    async def middleware(request):
+      started = time.perf_counter()
+      response = await get_response(request)
+      _record_request(request, response, started)
+      return response
+  else:
+    def middleware(request):
+      started = time.perf_counter()
+      response = get_response(request)
+      _record_request(request, response, started)
+      return response
+  return middleware
+
+
+def metrics_allowed(request):
+  if settings.METRICS_TOKEN:
+    authorization = request.headers.get('Authorization', '')
+    return constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}')
+  # Without a token, only scrapers on the host itself; anything that came
+  # through the reverse proxy carries X-Forwarded-For
+  return (
+    request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    and 'X-Forwarded-For' not in request.headers
+  )
+
+
+def metrics_view(request):
+  if not metrics_allowed(request):
+    return HttpResponseForbidden()
+  return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:26
+
+from django.db import migrations, models
+
+
+def remove_duplicate_storages(apps, schema_editor):
+    DeliveryPointStorage = apps.get_model('amc', 'DeliveryPointStorage')
+    seen = set()
+    duplicate_ids = []
+    for storage in DeliveryPointStorage.objects.order_by('-id').only('id', 'delivery_point_id', 'kind', 'cargo_key'):
+        key = (storage.delivery_point_id, storage.kind, storage.cargo_key)
+        if key in seen:
+            duplicate_ids.append(storage.id)
+        else:
+            seen.add(key)
+    DeliveryPointStorage.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0145_rescuerequest_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverypoint',
+            name='data_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(remove_duplicate_storages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='deliverypointstorage',
+            constraint=models.UniqueConstraint(fields=('delivery_point', 'kind', 'cargo_key'), name='unique_delivery_point_storage'),
+        ),
+    ]
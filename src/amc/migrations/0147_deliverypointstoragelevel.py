@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:27
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0146_deliverypoint_data_hash_storage_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryPointStorageHourlyLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('min_amount', models.PositiveIntegerField()),
+                ('max_amount', models.PositiveIntegerField()),
+                ('last_amount', models.PositiveIntegerField()),
+                ('storage', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='hourly_levels', to='amc.deliverypointstorage')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('storage', 'hour'), name='unique_storage_hourly_level')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeliveryPointStorageLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('amount', models.PositiveIntegerField()),
+                ('storage', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='amc.deliverypointstorage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['storage', 'timestamp'], name='storage_level_series_idx'), django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='storage_level_time_brin')],
+            },
+        ),
+    ]
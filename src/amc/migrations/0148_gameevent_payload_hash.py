@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0147_deliverypointstoragelevel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameevent',
+            name='payload_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+
+def best_per_character(participants):
+    # ParticipantQuerySet.filter_best_time_per_player, which historical models don't have
+    return participants.annotate(
+        attempts_count=Window(
+            expression=Count('id', filter=Q(finished=True)),
+            partition_by=[F('character')]
+        )
+    ).alias(
+        p_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('character')],
+            order_by=[F('disqualified').asc(), F('finished').desc(), F('net_time').asc()]
+        ),
+    ).filter(p_rank=1)
+
+
+def populate_personal_bests(apps, schema_editor):
+    GameEvent = apps.get_model('amc', 'GameEvent')
+    GameEventCharacter = apps.get_model('amc', 'GameEventCharacter')
+    ScheduledEvent = apps.get_model('amc', 'ScheduledEvent')
+    TrackPersonalBest = apps.get_model('amc', 'TrackPersonalBest')
+    ScheduledEventPersonalBest = apps.get_model('amc', 'ScheduledEventPersonalBest')
+
+    race_setup_ids = GameEvent.objects.filter(race_setup__isnull=False).values_list('race_setup', flat=True).distinct()
+    for race_setup_id in race_setup_ids:
+        participants = GameEventCharacter.objects.filter(
+            finished=True,
+            disqualified=False,
+            game_event__race_setup=race_setup_id,
+        )
+        TrackPersonalBest.objects.bulk_create([
+            TrackPersonalBest(
+                race_setup_id=race_setup_id,
+                character_id=participant.character_id,
+                participant_id=participant.id,
+                net_time=participant.net_time,
+                attempts_count=participant.attempts_count,
+            )
+            for participant in best_per_character(participants)
+        ])
+
+    for scheduled_event in ScheduledEvent.objects.all():
+        # ParticipantQuerySet.filter_by_scheduled_event
+        if scheduled_event.time_trial:
+            criteria = Q(
+                Q(game_event__scheduled_event=scheduled_event) |
+                Q(game_event__race_setup=scheduled_event.race_setup_id),
+                game_event__start_time__gte=scheduled_event.start_time,
+                game_event__start_time__lte=scheduled_event.end_time,
+            )
+        else:
+            criteria = Q(game_event__scheduled_event=scheduled_event)
+        ScheduledEventPersonalBest.objects.bulk_create([
+            ScheduledEventPersonalBest(
+                scheduled_event=scheduled_event,
+                character_id=participant.character_id,
+                participant_id=participant.id,
+                attempts_count=participant.attempts_count,
+            )
+            for participant in best_per_character(GameEventCharacter.objects.filter(criteria))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0148_gameevent_payload_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledEventPersonalBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts_count', models.PositiveIntegerField(default=0)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_event_personal_bests', to='amc.character')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_event_personal_bests', to='amc.gameeventcharacter')),
+                ('scheduled_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to='amc.scheduledevent')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scheduled_event', 'character'), name='unique_scheduled_event_personal_best')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackPersonalBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('net_time', models.FloatField(blank=True, null=True)),
+                ('attempts_count', models.PositiveIntegerField(default=0)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_personal_bests', to='amc.character')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_personal_bests', to='amc.gameeventcharacter')),
+                ('race_setup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_bests', to='amc.racesetup')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('race_setup', 'character'), name='unique_track_personal_best')],
+            },
+        ),
+        migrations.RunPython(populate_personal_bests, migrations.RunPython.noop),
+    ]
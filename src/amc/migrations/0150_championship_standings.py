@@ -0,0 +1,84 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_standings(apps, schema_editor):
+    ChampionshipPoint = apps.get_model('amc', 'ChampionshipPoint')
+    ChampionshipPersonalStanding = apps.get_model('amc', 'ChampionshipPersonalStanding')
+    ChampionshipTeamStanding = apps.get_model('amc', 'ChampionshipTeamStanding')
+
+    personal_points = {}
+    team_event_points = {}
+    team_participations = {}
+    points = ChampionshipPoint.objects.filter(championship__isnull=False).values_list(
+        'championship_id',
+        'participant__character_id',
+        'participant__game_event__scheduled_event_id',
+        'team_id',
+        'points',
+    )
+    for championship_id, character_id, scheduled_event_id, team_id, amount in points:
+        key = (championship_id, character_id)
+        personal_points[key] = personal_points.get(key, 0) + amount
+        if team_id is not None:
+            team_key = (championship_id, team_id)
+            team_event_points.setdefault((*team_key, scheduled_event_id), []).append(amount)
+            team_participations[team_key] = team_participations.get(team_key, 0) + 1
+
+    # Only the top two results of a team in each event count
+    team_points = {}
+    for (championship_id, team_id, _), amounts in team_event_points.items():
+        team_key = (championship_id, team_id)
+        team_points[team_key] = team_points.get(team_key, 0) + sum(sorted(amounts, reverse=True)[:2])
+
+    ChampionshipPersonalStanding.objects.bulk_create([
+        ChampionshipPersonalStanding(championship_id=championship_id, character_id=character_id, total_points=total)
+        for (championship_id, character_id), total in personal_points.items()
+    ])
+    ChampionshipTeamStanding.objects.bulk_create([
+        ChampionshipTeamStanding(
+            championship_id=championship_id,
+            team_id=team_id,
+            total_points=total,
+            participations=team_participations[(championship_id, team_id)],
+        )
+        for (championship_id, team_id), total in team_points.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0149_personal_bests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChampionshipPersonalStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_points', models.PositiveIntegerField(default=0)),
+                ('championship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_standings', to='amc.championship')),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='championship_standings', to='amc.character')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('championship', 'character'), name='unique_championship_personal_standing')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChampionshipTeamStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_points', models.PositiveIntegerField(default=0)),
+                ('participations', models.PositiveIntegerField(default=0)),
+                ('championship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='team_standings', to='amc.championship')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='championship_standings', to='amc.team')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('championship', 'team'), name='unique_championship_team_standing')],
+            },
+        ),
+        migrations.RunPython(populate_standings, migrations.RunPython.noop),
+    ]
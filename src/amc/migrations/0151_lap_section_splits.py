@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:40
+
+from django.db import migrations, models
+
+
+BACKFILL_SECTION_DURATIONS = """
+UPDATE amc_lapsectiontime AS t
+SET section_duration = w.next_total
+FROM (
+  SELECT id, LEAD(total_time_seconds) OVER (
+    PARTITION BY game_event_character_id ORDER BY lap, section_index
+  ) AS next_total
+  FROM amc_lapsectiontime
+) AS w
+WHERE t.id = w.id AND w.next_total IS NOT NULL
+"""
+
+BACKFILL_THEORETICAL_BESTS = """
+WITH splits AS (
+  SELECT
+    game_event_character_id,
+    section_index,
+    total_time_seconds - LAG(total_time_seconds) OVER (
+      PARTITION BY game_event_character_id ORDER BY lap, section_index
+    ) AS split
+  FROM amc_lapsectiontime
+), best_splits AS (
+  SELECT game_event_character_id, MIN(split) AS best_split
+  FROM splits
+  WHERE split IS NOT NULL
+  GROUP BY game_event_character_id, section_index
+)
+UPDATE amc_gameeventcharacter AS p
+SET theoretical_best_lap_time = b.total
+FROM (
+  SELECT game_event_character_id, SUM(best_split) AS total
+  FROM best_splits
+  GROUP BY game_event_character_id
+) AS b
+WHERE p.id = b.game_event_character_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0150_championship_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameeventcharacter',
+            name='theoretical_best_lap_time',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lapsectiontime',
+            name='section_duration',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SECTION_DURATIONS, migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_THEORETICAL_BESTS, migrations.RunSQL.noop),
+    ]
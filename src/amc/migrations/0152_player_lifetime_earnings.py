@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_lifetime_earnings(apps, schema_editor):
+    Player = apps.get_model('amc', 'Player')
+    Delivery = apps.get_model('amc', 'Delivery')
+    earnings = (Delivery.objects
+        .filter(character__player=OuterRef('pk'))
+        .order_by()
+        .values('character__player')
+        .annotate(total=Sum('payment') + Sum('subsidy'))
+        .values('total')
+    )
+    Player.objects.update(
+        lifetime_earnings=Coalesce(Subquery(earnings), 0, output_field=models.BigIntegerField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0151_lap_section_splits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='lifetime_earnings',
+            field=models.BigIntegerField(default=0, editable=False, help_text="Payment and subsidy of all the player's deliveries, kept in step by Delivery"),
+        ),
+        migrations.RunPython(populate_lifetime_earnings, migrations.RunPython.noop),
+    ]
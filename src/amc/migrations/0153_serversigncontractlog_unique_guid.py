@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_contracts(apps, schema_editor):
+    ServerSignContractLog = apps.get_model('amc', 'ServerSignContractLog')
+
+    duplicate_guids = (ServerSignContractLog.objects
+        .filter(guid__isnull=False)
+        .values('guid')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('guid', flat=True)
+    )
+    for guid in duplicate_guids:
+        logs = list(ServerSignContractLog.objects.filter(guid=guid).order_by('id'))
+        # The first row is kept, with the progress of all of them, so a
+        # contract that was completed isn't completed (and paid) again
+        kept, duplicates = logs[0], logs[1:]
+        kept.finished_amount = max(log.finished_amount for log in logs)
+        kept.delivered = any(log.delivered for log in logs)
+        kept.save(update_fields=['finished_amount', 'delivered'])
+        ServerSignContractLog.objects.filter(pk__in=[log.pk for log in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc', '0152_player_lifetime_earnings'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_contracts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='serversigncontractlog',
+            constraint=models.UniqueConstraint(fields=('guid',), name='unique_contract_guid'),
+        ),
+    ]
@@ -1,13 +1,14 @@
 import math
-import asyncstdlib as a
 from datetime import timedelta
 from deepdiff import DeepHash
+from asgiref.sync import sync_to_async
 from django.contrib import admin
 from django.contrib.gis.db import models
+from django.db import connection, transaction
 from django.db.models import (
   Q, F, Sum, Max, Window, Count, When, Case, OuterRef, Subquery, Exists
 )
-from django.db.models.functions import RowNumber, Lead, Lag
+from django.db.models.functions import RowNumber, Lag, Coalesce
 from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -17,7 +18,7 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import DateTimeRangeField
 from django.contrib.postgres.search import SearchVector
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, BrinIndex
 from typing import override, final, ClassVar, TYPE_CHECKING, Optional
 from amc.server_logs import (
   PlayerVehicleLogEvent,
@@ -47,6 +48,20 @@ class PlayerQuerySet(models.QuerySet):
       )
     )
 
+  def add_lifetime_earnings(self, amount):
+    return self.update(lifetime_earnings=F('lifetime_earnings') + amount)
+
+  def rebuild_lifetime_earnings(self):
+    """Recomputes lifetime_earnings from the players' deliveries"""
+    earnings = (Delivery.objects
+      .filter(character__player=OuterRef('pk'))
+      .earnings_by_player()
+      .values('total')
+    )
+    return self.update(
+      lifetime_earnings=Coalesce(Subquery(earnings), 0, output_field=models.BigIntegerField())
+    )
+
 @final
 class PlayerManager(models.Manager.from_queryset(PlayerQuerySet)): # type: ignore[misc]
   pass
@@ -61,6 +76,11 @@ class Player(models.Model):
   adminstrator = models.BooleanField(default=False)
   displayer = models.BooleanField(default=False, help_text="Livery artists, showcase etc")
   social_score = models.IntegerField(default=0)
+  lifetime_earnings = models.BigIntegerField(
+    default=0,
+    editable=False,
+    help_text="Payment and subsidy of all the player's deliveries, kept in step by Delivery",
+  )
   language = models.CharField(max_length=10, default='en-gb', choices=[('en-gb', 'English'), ('id', 'Indonesian')])
   notes = models.TextField(blank=True)
 
@@ -395,36 +415,43 @@ class Championship(models.Model):
     return self.name
 
   async def calculate_personal_prizes(self):
-    personal_standings = ChampionshipPoint.objects.personal_standings(self.id)[:len(self.personal_prize_by_position)]
+    personal_standings = [
+      standing
+      async for standing in ChampionshipPersonalStanding.objects
+        .for_championship(self.id)[:len(self.personal_prize_by_position)]
+    ]
+    characters = await Character.objects.select_related('player').ain_bulk(
+      [standing['character_id'] for standing in personal_standings]
+    )
     return [
-      (
-        await Character.objects.select_related('player').aget(pk=standing['character_id']),
-        self.personal_prize_by_position[i]
-      )
-      async for i, standing in a.builtins.enumerate(personal_standings)
+      (characters[standing['character_id']], self.personal_prize_by_position[i])
+      for i, standing in enumerate(personal_standings)
     ]
 
   async def calculate_team_prizes(self):
-    team_standings = ChampionshipPoint.objects.team_standings(self.id)[:len(self.team_prize_by_position)]
-
-    async def calculate_team_member_prizes(standing, total_team_prize):
-      total_participations = await ChampionshipPoint.objects.filter(championship=self, team__id=standing['team__id']).acount()
-      member_contributions = ChampionshipPoint.objects.filter(championship=self, team__id=standing['team__id']).values('participant__character').annotate(
-        points=Count('id'),
-        character_id=F('participant__character__id')
-      )
-      return [
-        (
-          await Character.objects.select_related('player').aget(pk=member_contribution['character_id']),
-          total_team_prize * member_contribution['points'] / total_participations
-        )
-        async for member_contribution in member_contributions
-      ]
-
+    team_standings = [
+      standing
+      async for standing in ChampionshipTeamStanding.objects
+        .for_championship(self.id)[:len(self.team_prize_by_position)]
+    ]
+    member_contributions = [
+      contribution
+      async for contribution in ChampionshipPoint.objects
+        .filter(championship=self, team__in=[standing['team__id'] for standing in team_standings])
+        .values('team', character_id=F('participant__character'))
+        .annotate(points=Count('id'))
+    ]
+    characters = await Character.objects.select_related('player').ain_bulk(
+      [contribution['character_id'] for contribution in member_contributions]
+    )
     return [
-      character_prize
-      async for i, standing in a.builtins.enumerate(team_standings)
-      for character_prize in await calculate_team_member_prizes(standing, self.team_prize_by_position[i])
+      (
+        characters[contribution['character_id']],
+        self.team_prize_by_position[i] * contribution['points'] / standing['participations']
+      )
+      for i, standing in enumerate(team_standings)
+      for contribution in member_contributions
+      if contribution['team'] == standing['team__id']
     ]
 
 
@@ -435,6 +462,18 @@ class ScheduledEventQuerySet(models.QuerySet):
       end_time__gte=timestamp,
     )
 
+  def filter_by_game_event(self, game_event):
+    """Scheduled events whose results include the game event (inverse of filter_by_scheduled_event)"""
+    return self.filter(
+      Q(
+        Q(game_events=game_event) | Q(race_setup=game_event.race_setup_id),
+        time_trial=True,
+        start_time__lte=game_event.start_time,
+        end_time__gte=game_event.start_time,
+      ) |
+      Q(game_events=game_event, time_trial=False)
+    ).distinct()
+
 
 @final
 class ScheduledEventManager(models.Manager.from_queryset(ScheduledEventQuerySet)): # type: ignore[misc]
@@ -490,6 +529,7 @@ class GameEvent(models.Model):
   state = models.IntegerField()
   discord_message_id = models.PositiveBigIntegerField(null=True)
   owner = models.ForeignKey(Character, models.SET_NULL, null=True, blank=True)
+  payload_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
   characters = models.ManyToManyField(
     Character,
@@ -531,7 +571,21 @@ class ParticipantQuerySet(models.QuerySet):
   def filter_by_track(self, track):
     return self.filter(game_event__race_setup=track)
 
+  def best_for_scheduled_event(self, scheduled_event):
+    return (self
+      .filter_by_scheduled_event(scheduled_event)
+      .filter_best_time_per_player()
+    )
+
+  def best_for_track(self, track):
+    return (self
+      .filter(finished=True, disqualified=False)
+      .filter_by_track(track)
+      .filter_best_time_per_player()
+    )
+
   def results_for_scheduled_event(self, scheduled_event):
+    """Best participation per character, read from ScheduledEventPersonalBest"""
     return (self
       .select_related(
         'character',
@@ -539,8 +593,8 @@ class ParticipantQuerySet(models.QuerySet):
         'championship_point',
         'championship_point__team'
       )
-      .filter_by_scheduled_event(scheduled_event)
-      .filter_best_time_per_player()
+      .filter(scheduled_event_personal_bests__scheduled_event=scheduled_event)
+      .annotate(attempts_count=F('scheduled_event_personal_bests__attempts_count'))
       .order_by(
         'disqualified',
         'wrong_engine',
@@ -553,6 +607,7 @@ class ParticipantQuerySet(models.QuerySet):
     )
 
   def results_for_track(self, track):
+    """Best finished participation per character, read from TrackPersonalBest"""
     return (self
       .select_related(
         'character',
@@ -560,9 +615,8 @@ class ParticipantQuerySet(models.QuerySet):
         'championship_point',
         'championship_point__team'
       )
-      .filter(finished=True, disqualified=False)
-      .filter_by_track(track)
-      .filter_best_time_per_player()
+      .filter(track_personal_bests__race_setup=track)
+      .annotate(attempts_count=F('track_personal_bests__attempts_count'))
       .order_by(
         'disqualified',
         'wrong_engine',
@@ -594,6 +648,7 @@ class GameEventCharacter(models.Model):
     db_persist=True,
   )
   best_lap_time = models.FloatField(null=True, blank=True)
+  theoretical_best_lap_time = models.FloatField(null=True, blank=True, editable=False)
   lap_times = ArrayField( # raw game value
     models.FloatField(),
     default=list,
@@ -615,6 +670,46 @@ class GameEventCharacter(models.Model):
     ]
 
 
+@final
+class TrackPersonalBest(models.Model):
+  """
+  Best finished, non-disqualified participation of a character on a track.
+  Maintained by amc.personal_bests; rebuild with `rebuild_personal_bests`.
+  """
+  race_setup = models.ForeignKey(RaceSetup, on_delete=models.CASCADE, related_name='personal_bests')
+  character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='track_personal_bests')
+  participant = models.ForeignKey(GameEventCharacter, on_delete=models.CASCADE, related_name='track_personal_bests')
+  net_time = models.FloatField(null=True, blank=True)
+  attempts_count = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["race_setup", "character"], name="unique_track_personal_best"
+      )
+    ]
+
+
+@final
+class ScheduledEventPersonalBest(models.Model):
+  """
+  Best participation of a character in a scheduled event, ranked like
+  ParticipantQuerySet.filter_best_time_per_player.
+  Maintained by amc.personal_bests; rebuild with `rebuild_personal_bests`.
+  """
+  scheduled_event = models.ForeignKey(ScheduledEvent, on_delete=models.CASCADE, related_name='personal_bests')
+  character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='scheduled_event_personal_bests')
+  participant = models.ForeignKey(GameEventCharacter, on_delete=models.CASCADE, related_name='scheduled_event_personal_bests')
+  attempts_count = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["scheduled_event", "character"], name="unique_scheduled_event_personal_best"
+      )
+    ]
+
+
 class ChampionshipPointQuerySet(models.QuerySet):
   def personal_standings(request, championship_id):
     return ChampionshipPoint.objects.filter(
@@ -626,13 +721,17 @@ class ChampionshipPointQuerySet(models.QuerySet):
       character_name=F('participant__character__name'),
     ).order_by('-total_points')
 
-  def team_standings(request, championship_id):
+  def team_standings(request, championship_id, team_ids=None):
     top_results_subquery = (ChampionshipPoint.objects
       .select_related('team')
       .filter(
         championship=championship_id,
         team__isnull=False,
       )
+    )
+    if team_ids is not None:
+      top_results_subquery = top_results_subquery.filter(team__in=team_ids)
+    top_results_subquery = (top_results_subquery
       .annotate(
         team_pos=Window(
           expression=RowNumber(),
@@ -649,6 +748,49 @@ class ChampionshipPointQuerySet(models.QuerySet):
       .order_by('-total_points')
     )
 
+  def standing_changes(self, championship_points):
+    """The (championship_id, character_id, team_id) of the points, for refresh_standings"""
+    character_ids = dict(GameEventCharacter.objects
+      .filter(pk__in=[cp.participant_id for cp in championship_points])
+      .values_list('pk', 'character_id')
+    )
+    return [
+      (cp.championship_id, character_ids.get(cp.participant_id), cp.team_id)
+      for cp in championship_points
+    ]
+
+  def refresh_standings(self, changes):
+    """
+    Recomputes the cached standings touched by the given
+    (championship_id, character_id, team_id) changes.
+    Only the affected characters and teams are re-aggregated.
+    """
+    character_ids_by_championship = {}
+    team_ids_by_championship = {}
+    for championship_id, character_id, team_id in changes:
+      if championship_id is None:
+        continue
+      if character_id is not None:
+        character_ids_by_championship.setdefault(championship_id, set()).add(character_id)
+      if team_id is not None:
+        team_ids_by_championship.setdefault(championship_id, set()).add(team_id)
+
+    with transaction.atomic():
+      for championship_id, character_ids in character_ids_by_championship.items():
+        ChampionshipPersonalStanding.objects.refresh(championship_id, character_ids)
+      for championship_id, team_ids in team_ids_by_championship.items():
+        ChampionshipTeamStanding.objects.refresh(championship_id, team_ids)
+
+  def award(self, championship_points):
+    """Creates championship points and updates the standings in one transaction"""
+    with transaction.atomic():
+      championship_points = self.bulk_create(championship_points)
+      self.refresh_standings(self.standing_changes(championship_points))
+    return championship_points
+
+  async def aaward(self, championship_points):
+    return await sync_to_async(self.award)(championship_points)
+
 @final
 class ChampionshipPointManager(models.Manager.from_queryset(ChampionshipPointQuerySet)): # type: ignore[misc]
   pass
@@ -660,6 +802,7 @@ class ChampionshipPoint(models.Model):
   team = models.ForeignKey(Team, models.SET_NULL, null=True, blank=True)
   points = models.PositiveIntegerField(default=0, blank=True)
   prize = models.PositiveIntegerField(default=0, blank=True)
+  participant_id: int
 
   objects: ClassVar[ChampionshipPointManager] = ChampionshipPointManager()
 
@@ -668,6 +811,20 @@ class ChampionshipPoint(models.Model):
   event_points_by_position = [25, 20, 16, 13, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
   time_trial_points_by_position = [10, 8, 6, 5, 4, 3, 2, 1]
 
+  @override
+  def save(self, *args, **kwargs):
+    with transaction.atomic():
+      changes = [] if self.pk is None else list(
+        ChampionshipPoint.objects
+          .filter(pk=self.pk)
+          .values_list('championship_id', 'participant__character_id', 'team_id')
+      )
+      super().save(*args, **kwargs)
+      ChampionshipPoint.objects.refresh_standings([
+        *changes,
+        *ChampionshipPoint.objects.standing_changes([self]),
+      ])
+
   @classmethod
   def get_event_points_for_position(self, position: int, time_trial: bool=False):
     try:
@@ -694,20 +851,185 @@ class ChampionshipPoint(models.Model):
       return base_pay
 
 
+# Deletes cascade from GameEventCharacter and GameEvent through the
+# Collector, which calls neither ChampionshipPoint.delete nor the queryset's
+# delete, so the standings are kept up to date with signals (see apps.py).
+# The character is looked up before the delete, while the participant exists.
+def on_championship_point_deleting(sender, instance, **kwargs):
+  instance._standing_changes = ChampionshipPoint.objects.standing_changes([instance])
+
+def on_championship_point_deleted(sender, instance, **kwargs):
+  ChampionshipPoint.objects.refresh_standings(getattr(instance, '_standing_changes', []))
+
+
+class ChampionshipPersonalStandingQuerySet(models.QuerySet):
+  def for_championship(self, championship_id):
+    return (self
+      .filter(championship=championship_id)
+      .values(
+        'character_id',
+        'total_points',
+        player_id=F('character__player__unique_id'),
+        character_name=F('character__name'),
+      )
+      .order_by('-total_points')
+    )
+
+  def refresh(self, championship_id, character_ids):
+    standings = [
+      ChampionshipPersonalStanding(
+        championship_id=championship_id,
+        character_id=standing['character_id'],
+        total_points=standing['total_points'] or 0,
+      )
+      for standing in ChampionshipPoint.objects
+        .personal_standings(championship_id)
+        .filter(participant__character__in=character_ids)
+    ]
+    (self
+      .filter(championship=championship_id, character__in=character_ids)
+      .exclude(character__in=[standing.character_id for standing in standings])
+      .delete()
+    )
+    self.bulk_create(
+      standings,
+      update_conflicts=True,
+      unique_fields=['championship', 'character'],
+      update_fields=['total_points'],
+    )
+
+@final
+class ChampionshipPersonalStandingManager(models.Manager.from_queryset(ChampionshipPersonalStandingQuerySet)): # type: ignore[misc]
+  pass
+
+@final
+class ChampionshipPersonalStanding(models.Model):
+  """Cached ChampionshipPointQuerySet.personal_standings, kept up to date by ChampionshipPoint"""
+  championship = models.ForeignKey(Championship, models.CASCADE, related_name='personal_standings')
+  character = models.ForeignKey(Character, models.CASCADE, related_name='championship_standings')
+  total_points = models.PositiveIntegerField(default=0)
+
+  objects: ClassVar[ChampionshipPersonalStandingManager] = ChampionshipPersonalStandingManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["championship", "character"], name="unique_championship_personal_standing"
+      )
+    ]
+
+
+class ChampionshipTeamStandingQuerySet(models.QuerySet):
+  def for_championship(self, championship_id):
+    return (self
+      .filter(championship=championship_id)
+      .values(
+        'total_points',
+        'participations',
+        'team__id',
+        'team__tag',
+        'team__name',
+      )
+      .order_by('-total_points')
+    )
+
+  def refresh(self, championship_id, team_ids):
+    participations = {
+      team_id: count
+      for team_id, count in ChampionshipPoint.objects
+        .filter(championship=championship_id, team__in=team_ids)
+        .values('team')
+        .annotate(count=Count('id'))
+        .values_list('team', 'count')
+    }
+    standings = [
+      ChampionshipTeamStanding(
+        championship_id=championship_id,
+        team_id=standing['team__id'],
+        total_points=standing['total_points'] or 0,
+        participations=participations.get(standing['team__id'], 0),
+      )
+      for standing in ChampionshipPoint.objects.team_standings(championship_id, team_ids=team_ids)
+    ]
+    (self
+      .filter(championship=championship_id, team__in=team_ids)
+      .exclude(team__in=[standing.team_id for standing in standings])
+      .delete()
+    )
+    self.bulk_create(
+      standings,
+      update_conflicts=True,
+      unique_fields=['championship', 'team'],
+      update_fields=['total_points', 'participations'],
+    )
+
+@final
+class ChampionshipTeamStandingManager(models.Manager.from_queryset(ChampionshipTeamStandingQuerySet)): # type: ignore[misc]
+  pass
+
+@final
+class ChampionshipTeamStanding(models.Model):
+  """Cached ChampionshipPointQuerySet.team_standings, kept up to date by ChampionshipPoint"""
+  championship = models.ForeignKey(Championship, models.CASCADE, related_name='team_standings')
+  team = models.ForeignKey(Team, models.CASCADE, related_name='championship_standings')
+  total_points = models.PositiveIntegerField(default=0)
+  participations = models.PositiveIntegerField(default=0)
+
+  objects: ClassVar[ChampionshipTeamStandingManager] = ChampionshipTeamStandingManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["championship", "team"], name="unique_championship_team_standing"
+      )
+    ]
+
+
 class LapSectionTimeQuerySet(models.QuerySet):
   def annotate_net_time(self):
     return self.annotate(
       net_time=F('total_time_seconds') - F('game_event_character__first_section_total_time_seconds')
     )
 
-  def annotate_deltas(self):
-    return self.annotate(
-      section_duration=Window(
-        expression=Lead('total_time_seconds'),
-        partition_by=[F('game_event_character')],
-        order_by=[F('lap').asc(), F('section_index').asc()]
-      ),
-    )
+  async def aupdate_splits(self, participant_ids):
+    """
+    Stores each row's section_duration (the total time at the next
+    section) and each participant's theoretical best lap, the sum of
+    their fastest split per section.
+    Only rows whose value changed are written.
+    """
+    rows_by_participant = {}
+    async for row in (self
+      .filter(game_event_character__in=participant_ids)
+      .order_by('game_event_character', 'lap', 'section_index')
+      .only('id', 'game_event_character_id', 'section_index', 'total_time_seconds', 'section_duration')
+    ):
+      rows_by_participant.setdefault(row.game_event_character_id, []).append(row)
+
+    changed_rows = []
+    theoretical_bests = []
+    for participant_id, rows in rows_by_participant.items():
+      best_splits = {}
+      for i, row in enumerate(rows):
+        next_row = rows[i + 1] if i + 1 < len(rows) else None
+        section_duration = next_row.total_time_seconds if next_row else None
+        if row.section_duration != section_duration:
+          row.section_duration = section_duration
+          changed_rows.append(row)
+        if next_row:
+          split = next_row.total_time_seconds - row.total_time_seconds
+          best_splits[next_row.section_index] = min(split, best_splits.get(next_row.section_index, split))
+      theoretical_bests.append(
+        GameEventCharacter(
+          id=participant_id,
+          theoretical_best_lap_time=sum(best_splits.values()) if best_splits else None,
+        )
+      )
+
+    if changed_rows:
+      await self.abulk_update(changed_rows, ['section_duration'])
+    if theoretical_bests:
+      await GameEventCharacter.objects.abulk_update(theoretical_bests, ['theoretical_best_lap_time'])
 
 
 
@@ -722,6 +1044,7 @@ class LapSectionTime(models.Model):
   lap = models.IntegerField()
   rank = models.IntegerField()
   total_time_seconds = models.FloatField()
+  section_duration = models.FloatField(null=True, blank=True, editable=False)
   objects: ClassVar[LapSectionTimeManager] = LapSectionTimeManager()
 
   class Meta:
@@ -918,21 +1241,60 @@ class CharacterLocation(models.Model):
 
   @classmethod
   async def get_character_activity(self, character, start_time, end_time, afk_treshold=1000, teleport_treshold=10000):
-    qs = self.objects.filter_character_activity(character, start_time, end_time)
-    if not await qs.aexists():
-      return (False, False)
+    activity = await self.get_characters_activity(
+      [character], start_time, end_time, afk_treshold=afk_treshold, teleport_treshold=teleport_treshold
+    )
+    return activity[character.pk]
 
-    total_dis = 0
-    async for cl in qs:
-      if cl.prev_location is None:
-        continue
-      dis = cl.prev_location.distance(cl.location)
-      if dis > teleport_treshold:
-        continue
-      total_dis += dis
-      if total_dis > afk_treshold:
-        return (True, True)
-    return (True, False)
+  @classmethod
+  async def get_characters_activity(self, characters, start_time, end_time, afk_treshold=1000, teleport_treshold=10000):
+    """
+    Returns {character_id: (is_online, is_active)} for every character.
+
+    A character is online if they have a location in the window, and
+    active if the distance between their consecutive locations, leaving
+    out jumps longer than teleport_treshold, adds up to more than
+    afk_treshold. The path lengths are summed in the database.
+    """
+    character_ids = [getattr(character, 'pk', character) for character in characters]
+    activity = {character_id: (False, False) for character_id in character_ids}
+    if not character_ids:
+      return activity
+
+    raw_sql = f"""
+      SELECT
+        character_id,
+        COALESCE(SUM(step) FILTER (WHERE step <= %(teleport_treshold)s), 0) > %(afk_treshold)s
+      FROM (
+        SELECT
+          character_id,
+          ST_Distance(
+            location,
+            LAG(location) OVER (PARTITION BY character_id ORDER BY timestamp)
+          ) AS step
+        FROM {self._meta.db_table}
+        WHERE character_id = ANY(%(character_ids)s)
+          AND timestamp >= %(start_time)s
+          AND timestamp < %(end_time)s
+      ) AS steps
+      GROUP BY character_id
+    """
+    params = {
+      'character_ids': character_ids,
+      'start_time': start_time,
+      'end_time': end_time,
+      'afk_treshold': afk_treshold,
+      'teleport_treshold': teleport_treshold,
+    }
+
+    def _fetch_activity():
+      with connection.cursor() as cursor:
+        cursor.execute(raw_sql, params)
+        return cursor.fetchall()
+
+    for character_id, is_active in await sync_to_async(_fetch_activity)():
+      activity[character_id] = (True, is_active)
+    return activity
 
 
 @final
@@ -951,6 +1313,7 @@ class DeliveryPoint(models.Model):
   type = models.CharField(max_length=200)
   coord = models.PointField(srid=3857, dim=3)
   data = models.JSONField(null=True, blank=True)
+  data_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
   last_updated = models.DateTimeField(editable=False, auto_now=True, null=True)
 
   def __str__(self):
@@ -992,6 +1355,87 @@ class DeliveryPointStorage(models.Model):
   capacity = models.PositiveIntegerField(null=True, blank=True)
   objects: ClassVar[DeliveryPointStorageManager] = DeliveryPointStorageManager()
 
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=['delivery_point', 'kind', 'cargo_key'],
+        name='unique_delivery_point_storage'
+      )
+    ]
+
+class DeliveryPointStorageLevelQuerySet(models.QuerySet):
+  def filter_series(self, delivery_point, cargo_key, start_time, end_time, kind=None):
+    """
+    Filters the levels of a single point/cargo over a time range.
+    Storage ids are resolved first so the range scan stays on the
+    (storage, timestamp) index instead of joining through storages.
+    """
+    storages = DeliveryPointStorage.objects.filter(
+      delivery_point=delivery_point,
+      cargo_key=cargo_key,
+    )
+    if kind is not None:
+      storages = storages.filter(kind=kind)
+    return self.filter(
+      storage__in=Subquery(storages.values('id')),
+      timestamp__gte=start_time,
+      timestamp__lt=end_time,
+    )
+
+@final
+class DeliveryPointStorageLevelManager(models.Manager.from_queryset(DeliveryPointStorageLevelQuerySet)): # type: ignore[misc]
+  pass
+
+@final
+class DeliveryPointStorageLevel(models.Model):
+  """Append-only history of storage amounts, written only when the amount changes"""
+  storage = models.ForeignKey(DeliveryPointStorage, models.CASCADE, related_name='levels', db_index=False)
+  timestamp = models.DateTimeField()
+  amount = models.PositiveIntegerField()
+  objects: ClassVar[DeliveryPointStorageLevelManager] = DeliveryPointStorageLevelManager()
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['storage', 'timestamp'], name='storage_level_series_idx'),
+      BrinIndex(fields=['timestamp'], name='storage_level_time_brin'),
+    ]
+
+class DeliveryPointStorageHourlyLevelQuerySet(models.QuerySet):
+  def filter_series(self, delivery_point, cargo_key, start_time, end_time, kind=None):
+    storages = DeliveryPointStorage.objects.filter(
+      delivery_point=delivery_point,
+      cargo_key=cargo_key,
+    )
+    if kind is not None:
+      storages = storages.filter(kind=kind)
+    return self.filter(
+      storage__in=Subquery(storages.values('id')),
+      hour__gte=start_time,
+      hour__lt=end_time,
+    )
+
+@final
+class DeliveryPointStorageHourlyLevelManager(models.Manager.from_queryset(DeliveryPointStorageHourlyLevelQuerySet)): # type: ignore[misc]
+  pass
+
+@final
+class DeliveryPointStorageHourlyLevel(models.Model):
+  """Hourly rollup of DeliveryPointStorageLevel, only for hours with changes"""
+  storage = models.ForeignKey(DeliveryPointStorage, models.CASCADE, related_name='hourly_levels', db_index=False)
+  hour = models.DateTimeField()
+  min_amount = models.PositiveIntegerField()
+  max_amount = models.PositiveIntegerField()
+  last_amount = models.PositiveIntegerField()
+  objects: ClassVar[DeliveryPointStorageHourlyLevelManager] = DeliveryPointStorageHourlyLevelManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=['storage', 'hour'],
+        name='unique_storage_hourly_level'
+      )
+    ]
+
 @final
 class CharacterAFKReminder(models.Model):
   character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='afk_reminders')
@@ -999,6 +1443,29 @@ class CharacterAFKReminder(models.Model):
   created_at = models.DateTimeField(editable=False, auto_now_add=True)
 
 
+class DeliveryQuerySet(models.QuerySet):
+  def earnings_by_player(self):
+    """The payment and subsidy of the deliveries, summed per player"""
+    return (self
+      .filter(character__player__isnull=False)
+      .order_by()
+      .values('character__player')
+      .annotate(total=Sum('payment') + Sum('subsidy'))
+    )
+
+  @override
+  def delete(self):
+    with transaction.atomic():
+      earnings = list(self.earnings_by_player().values_list('character__player', 'total'))
+      result = super().delete()
+      for player_id, total in earnings:
+        Player.objects.filter(pk=player_id).add_lifetime_earnings(-total)
+    return result
+
+@final
+class DeliveryManager(models.Manager.from_queryset(DeliveryQuerySet)): # type: ignore[misc]
+  pass
+
 @final
 class Delivery(models.Model):
   timestamp = models.DateTimeField()
@@ -1012,6 +1479,27 @@ class Delivery(models.Model):
   destination_point = models.ForeignKey('DeliveryPoint', models.SET_NULL, null=True, blank=True, related_name='batch_deliveries_in')
   job = models.ForeignKey('DeliveryJob', models.SET_NULL, null=True, blank=True, related_name='deliveries')
 
+  objects: ClassVar[DeliveryManager] = DeliveryManager()
+
+  @override
+  def save(self, *args, **kwargs):
+    # Keeps the player's lifetime_earnings in step, in the same transaction
+    with transaction.atomic(savepoint=False):
+      if not self._state.adding:
+        for player_id, total in Delivery.objects.filter(pk=self.pk).earnings_by_player().values_list('character__player', 'total'):
+          Player.objects.filter(pk=player_id).add_lifetime_earnings(-total)
+      super().save(*args, **kwargs)
+      if self.character_id is not None:
+        Player.objects.filter(characters=self.character_id).add_lifetime_earnings(self.payment + self.subsidy)
+
+  @override
+  def delete(self, *args, **kwargs):
+    with transaction.atomic():
+      result = super().delete(*args, **kwargs)
+      if self.character_id is not None:
+        Player.objects.filter(characters=self.character_id).add_lifetime_earnings(-(self.payment + self.subsidy))
+    return result
+
 @final
 class ServerCargoArrivedLog(models.Model):
   timestamp = models.DateTimeField()
@@ -1026,6 +1514,57 @@ class ServerCargoArrivedLog(models.Model):
   data = models.JSONField(null=True, blank=True)
 
 
+@final
+class ServerSignContractLogManager(models.Manager):
+  async def arecord_deliveries(self, deliveries):
+    """
+    Adds the delivered cargo counts ({contract guid: count}) to the
+    contracts' finished_amount and marks the contracts that reach their
+    amount as delivered, in a single statement.
+
+    Returns {contract guid: payment} for the contracts this call
+    completed. A guid has a single row, which is locked while it's read,
+    so a contract is only ever completed (and paid) once, even across
+    concurrent batches.
+    """
+    if not deliveries:
+      return {}
+
+    table = self.model._meta.db_table
+    values = ', '.join(['(%s, %s)'] * len(deliveries))
+    raw_sql = f"""
+      WITH deliveries (guid, count) AS (
+        VALUES {values}
+      ),
+      locked AS (
+        SELECT contract.id, contract.delivered, deliveries.count
+        FROM {table} AS contract
+        JOIN deliveries ON contract.guid = deliveries.guid
+        ORDER BY contract.id
+        FOR UPDATE OF contract
+      )
+      UPDATE {table} AS contract
+      SET
+        finished_amount = contract.finished_amount + locked.count,
+        delivered = contract.delivered OR contract.finished_amount + locked.count >= contract.amount
+      FROM locked
+      WHERE contract.id = locked.id
+      RETURNING contract.guid, contract.payment, contract.delivered AND NOT locked.delivered
+    """
+    params = [param for guid, count in deliveries.items() for param in (guid, count)]
+
+    def _execute_raw_sql():
+      with connection.cursor() as cursor:
+        cursor.execute(raw_sql, params)
+        return cursor.fetchall()
+
+    return {
+      guid: payment
+      for guid, payment, completed in await sync_to_async(_execute_raw_sql)()
+      if completed
+    }
+
+
 @final
 class ServerSignContractLog(models.Model):
   timestamp = models.DateTimeField()
@@ -1038,6 +1577,14 @@ class ServerSignContractLog(models.Model):
   payment = models.PositiveIntegerField()
   delivered = models.BooleanField(default=False)
   data = models.JSONField(null=True, blank=True)
+  objects: ClassVar[ServerSignContractLogManager] = ServerSignContractLogManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["guid"], name="unique_contract_guid"
+      )
+    ]
 
 
 @final
@@ -0,0 +1,141 @@
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from amc.models import (
+  GameEvent,
+  GameEventCharacter,
+  ScheduledEvent,
+  TrackPersonalBest,
+  ScheduledEventPersonalBest,
+)
+
+
+async def refresh_track_personal_bests(race_setup_id, character_ids=None):
+  """
+  Recomputes the track personal bests of the given characters (or of
+  everyone when character_ids is None) from their participations.
+  """
+  qs = GameEventCharacter.objects.all()
+  stale = TrackPersonalBest.objects.filter(race_setup_id=race_setup_id)
+  if character_ids is not None:
+    qs = qs.filter(character__in=character_ids)
+    stale = stale.filter(character__in=character_ids)
+
+  personal_bests = [
+    TrackPersonalBest(
+      race_setup_id=race_setup_id,
+      character_id=participant.character_id,
+      participant_id=participant.id,
+      net_time=participant.net_time,
+      attempts_count=participant.attempts_count,
+    )
+    async for participant in qs.best_for_track(race_setup_id)
+  ]
+  await stale.exclude(character__in=[pb.character_id for pb in personal_bests]).adelete()
+  if personal_bests:
+    await TrackPersonalBest.objects.abulk_create(
+      personal_bests,
+      update_conflicts=True,
+      unique_fields=['race_setup', 'character'],
+      update_fields=['participant', 'net_time', 'attempts_count'],
+    )
+  return len(personal_bests)
+
+
+async def refresh_scheduled_event_personal_bests(scheduled_event, character_ids=None):
+  """
+  Recomputes the scheduled event personal bests of the given characters
+  (or of everyone when character_ids is None) from their participations.
+  """
+  qs = GameEventCharacter.objects.all()
+  stale = ScheduledEventPersonalBest.objects.filter(scheduled_event=scheduled_event)
+  if character_ids is not None:
+    qs = qs.filter(character__in=character_ids)
+    stale = stale.filter(character__in=character_ids)
+
+  personal_bests = [
+    ScheduledEventPersonalBest(
+      scheduled_event=scheduled_event,
+      character_id=participant.character_id,
+      participant_id=participant.id,
+      attempts_count=participant.attempts_count,
+    )
+    async for participant in qs.best_for_scheduled_event(scheduled_event)
+  ]
+  await stale.exclude(character__in=[pb.character_id for pb in personal_bests]).adelete()
+  if personal_bests:
+    await ScheduledEventPersonalBest.objects.abulk_create(
+      personal_bests,
+      update_conflicts=True,
+      unique_fields=['scheduled_event', 'character'],
+      update_fields=['participant', 'attempts_count'],
+    )
+  return len(personal_bests)
+
+
+async def refresh_game_event_personal_bests(game_event: GameEvent, character_ids=None):
+  """Refreshes the personal bests that the game event's participations count towards"""
+  if character_ids is None:
+    character_ids = [
+      character_id
+      async for character_id in (GameEventCharacter.objects
+        .filter(game_event=game_event)
+        .values_list('character_id', flat=True)
+      )
+    ]
+  if not character_ids:
+    return
+
+  scheduled_events = [
+    scheduled_event
+    async for scheduled_event in ScheduledEvent.objects.select_related('race_setup').filter_by_game_event(game_event)
+  ]
+  await refresh_personal_bests(game_event.race_setup_id, scheduled_events, character_ids)
+
+
+async def refresh_personal_bests(race_setup_id, scheduled_events, character_ids):
+  """Refreshes the personal bests of the characters on a track and in scheduled events"""
+  if race_setup_id is not None:
+    await refresh_track_personal_bests(race_setup_id, character_ids)
+  for scheduled_event in scheduled_events:
+    await refresh_scheduled_event_personal_bests(scheduled_event, character_ids)
+
+
+# Deleting a participation, by itself or with its game event, cascades to
+# the personal bests pointing at it, so the characters' next best
+# participations are promoted once the delete commits (see apps.py).
+# What the game event counts towards is looked up before the delete, while
+# the game event exists.
+def on_participant_deleting(sender, instance, **kwargs):
+  game_event = instance.game_event
+  instance._personal_bests = (
+    game_event.race_setup_id,
+    list(ScheduledEvent.objects.select_related('race_setup').filter_by_game_event(game_event)),
+  )
+
+def on_participant_deleted(sender, instance, **kwargs):
+  if not hasattr(instance, '_personal_bests'):
+    return
+  race_setup_id, scheduled_events = instance._personal_bests
+  character_ids = [instance.character_id]
+  transaction.on_commit(
+    lambda: async_to_sync(refresh_personal_bests)(race_setup_id, scheduled_events, character_ids)
+  )
+
+
+async def rebuild_personal_bests():
+  """Recomputes every personal best from scratch"""
+  race_setup_ids = [
+    race_setup_id
+    async for race_setup_id in GameEvent.objects
+      .filter(race_setup__isnull=False)
+      .values_list('race_setup', flat=True)
+      .distinct()
+  ]
+  for race_setup_id in race_setup_ids:
+    await refresh_track_personal_bests(race_setup_id)
+
+  scheduled_events = 0
+  async for scheduled_event in ScheduledEvent.objects.select_related('race_setup'):
+    await refresh_scheduled_event_personal_bests(scheduled_event)
+    scheduled_events += 1
+  return len(race_setup_ids), scheduled_events
@@ -0,0 +1,147 @@
+import time
+import logging
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+  count: int = 0
+  seconds: float = 0.0
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+  """
+  Database execute wrapper that adds the query to the QueryStats of the
+  current context, if any. Installed on every connection by
+  `install_query_recorder`; sync_to_async copies the context into the
+  ORM thread, so async code is counted as well.
+  """
+  stats = _query_stats.get()
+  if stats is None:
+    return execute(sql, params, many, context)
+  started = time.perf_counter()
+  try:
+    return execute(sql, params, many, context)
+  finally:
+    stats.count += 1
+    stats.seconds += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+  if record_query not in connection.execute_wrappers:
+    connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def track_queries():
+  """Counts and times the queries made inside the block, including by nested blocks"""
+  parent = _query_stats.get()
+  stats = QueryStats()
+  token = _query_stats.set(stats)
+  try:
+    yield stats
+  finally:
+    _query_stats.reset(token)
+    if parent is not None:
+      parent.count += stats.count
+      parent.seconds += stats.seconds
+
+
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+
+class query_budget:
+  """
+  Counts and times the queries of a block, and flags it when it makes
+  more than `max_queries`.
+
+  Usable as a context manager or as a decorator of sync and async
+  functions. By default an over-budget block is logged as a warning, which
+  is what production code wants; with `strict=True` it raises
+  QueryBudgetExceeded instead, which is what tests want:
+
+      with query_budget(5, strict=True):
+        await client.get('/api/players/')
+  """
+
+  def __init__(self, max_queries: int, name: str | None = None, strict: bool = False):
+    self.max_queries = max_queries
+    self.name = name
+    self.strict = strict
+    self.stats = QueryStats()
+    self._exit_stack = ExitStack()
+
+  def __enter__(self):
+    self.stats = self._exit_stack.enter_context(track_queries())
+    return self.stats
+
+  def __exit__(self, exc_type, exc, tb):
+    self._exit_stack.__exit__(exc_type, exc, tb)
+    if exc_type is None:
+      self.check()
+    return False
+
+  def check(self):
+    if self.stats.count <= self.max_queries:
+      return
+    message = (
+      f"{self.name or 'Block'} made {self.stats.count} queries "
+      f"({self.stats.seconds * 1000:.1f}ms), over its budget of {self.max_queries}"
+    )
+    if self.strict:
+      raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+  def __call__(self, func):
+    name = self.name or func.__qualname__
+
+    if iscoroutinefunction(func):
+      @wraps(func)
+      async def async_wrapper(*args, **kwargs):
+        with query_budget(self.max_queries, name, self.strict):
+          return await func(*args, **kwargs)
+      return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+      with query_budget(self.max_queries, name, self.strict):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _request_name(request):
+  resolver_match = getattr(request, 'resolver_match', None)
+  return f"{request.method} {resolver_match.route if resolver_match else request.path}"
+
+
+@sync_and_async_middleware
+def query_budget_middleware(get_response):
+  """Logs the requests that make more than QUERY_BUDGET_REQUEST queries"""
+  if iscoroutinefunction(get_response):
+    async def middleware(request):
+      budget = query_budget(settings.QUERY_BUDGET_REQUEST)
+      with budget:
+        response = await get_response(request)
+        # The route is only resolved once the view has been found
+        budget.name = _request_name(request)
+      return response
+  else:
+    def middleware(request):
+      budget = query_budget(settings.QUERY_BUDGET_REQUEST)
+      with budget:
+        response = get_response(request)
+        budget.name = _request_name(request)
+      return response
+  return middleware
@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def get_redis_url() -> str:
+  """The URL of the Redis in REDIS_SETTINGS, the one arq uses, falling back to localhost"""
+  redis_settings = getattr(settings, 'REDIS_SETTINGS', {})
+  host = redis_settings.get('host', 'localhost')
+  port = redis_settings.get('port', 6379)
+  return f"redis://{host}:{port}"
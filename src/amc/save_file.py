@@ -42,14 +42,24 @@ def decrypt_file(path: str) -> bytes:
         data = f.read()
     return decrypt(data)
 
+WORLD_SAVE_PATH = os.path.join(SAVED_PATH, 'SaveGames/Worlds/0/Island.world')
+CHARACTER_SAVE_PATH = os.path.join(SAVED_PATH, 'SaveGames/Characters/0.sav')
+
+def get_save_version(*paths) -> str | None:
+  """Changes whenever one of the save files is written; None if one is missing"""
+  try:
+    return ':'.join(str(os.stat(path).st_mtime_ns) for path in paths)
+  except OSError:
+    return None
+
 def get_world():
-  path = os.path.join(SAVED_PATH, 'SaveGames/Worlds/0/Island.world')
+  path = WORLD_SAVE_PATH
   decrypted_bytes = decrypt_file(path)
   decrypted_str = decrypted_bytes.decode("utf-8")
   return json.loads(decrypted_str)['world']
 
 def get_character():
-  path = os.path.join(SAVED_PATH, 'SaveGames/Characters/0.sav')
+  path = CHARACTER_SAVE_PATH
   decrypted_bytes = decrypt_file(path)
   decrypted_str = decrypted_bytes.decode("utf-8")
   return json.loads(decrypted_str)
@@ -0,0 +1,234 @@
+import time
+import uuid
+import pickle
+import asyncio
+import logging
+from django.conf import settings
+from django.db import transaction
+import redis
+import redis.asyncio as aioredis
+from amc.metrics import SHARED_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_INTERVAL = 0.05 # seconds
+
+# Keys of the lists that are dropped when their models change
+DELIVERYPOINTS_CACHE_KEY = 'deliverypoints_list'
+CARGOS_CACHE_KEY = 'cargos_list'
+RACE_SETUPS_CACHE_KEY = 'race_setups_list'
+
+# Deletes the lock only if it is still ours
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend:
+  """Shared between every process, through the Redis at CACHE_REDIS_URL"""
+
+  def __init__(self, url: str):
+    self.url = url
+    self._client: aioredis.Redis | None = None
+    self._loop: asyncio.AbstractEventLoop | None = None
+
+  @property
+  def client(self) -> aioredis.Redis:
+    loop = asyncio.get_running_loop()
+    if self._client is None or loop is not self._loop:
+      # Connections can't be shared between event loops
+      self._client = aioredis.from_url(self.url, socket_connect_timeout=1)
+      self._loop = loop
+    return self._client
+
+  async def get(self, key):
+    return await self.client.get(key)
+
+  async def set(self, key, value, ttl: float):
+    await self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+  async def add(self, key, value, ttl: float) -> bool:
+    return bool(await self.client.set(key, value, px=max(1, int(ttl * 1000)), nx=True))
+
+  async def release(self, key, value):
+    # pyrefly: ignore [not-async]
+    await self.client.eval(RELEASE_LOCK_SCRIPT, 1, key, value)
+
+  def delete_sync(self, key):
+    with redis.Redis.from_url(self.url, socket_connect_timeout=1) as redis_client:
+      redis_client.delete(key)
+
+
+class LocalBackend:
+  """Process-local, for tests and single-process use"""
+
+  def __init__(self):
+    self._values: dict[str, tuple[float, bytes]] = {}
+
+  def _get(self, key):
+    expires_at, value = self._values.get(key, (0.0, None))
+    if expires_at <= time.monotonic():
+      self._values.pop(key, None)
+      return None
+    return value
+
+  async def get(self, key):
+    return self._get(key)
+
+  async def set(self, key, value, ttl: float):
+    self._values[key] = (time.monotonic() + ttl, value)
+
+  async def add(self, key, value, ttl: float) -> bool:
+    if self._get(key) is not None:
+      return False
+    await self.set(key, value, ttl)
+    return True
+
+  async def release(self, key, value):
+    if self._get(key) == value:
+      self._values.pop(key, None)
+
+  def delete_sync(self, key):
+    self._values.pop(key, None)
+
+
+class SharedCache:
+  """
+  Caches the results of expensive calls (game server polls, hot list
+  queries) across processes, without stampeding when they expire:
+
+  - a value is fresh for `ttl` seconds, then served stale for up to
+    `stale_ttl` more while a single caller refreshes it in the background
+  - a missing value is computed by one caller across all processes,
+    holding a short lock; the others wait for it to be stored
+  - concurrent callers of the same key in a process share one lookup
+
+  Reads are counted in amc_shared_cache_requests_total by `name` and
+  outcome (hit, stale, miss, coalesced, error).
+
+  Without CACHE_REDIS_URL (as in tests) every call computes its value,
+  unless a backend is given.
+  """
+
+  def __init__(self, backend=None, lock_ttl: float = 5.0):
+    self._backend = backend
+    self.lock_ttl = lock_ttl
+    self._inflight: dict[str, asyncio.Task] = {}
+    self._refreshes: set[asyncio.Task] = set()
+
+  @property
+  def backend(self):
+    if self._backend is None and settings.CACHE_REDIS_URL:
+      self._backend = RedisBackend(settings.CACHE_REDIS_URL)
+    return self._backend
+
+  @staticmethod
+  def make_key(key: str) -> str:
+    return f"amc:shared_cache:{key}"
+
+  async def get_or_set(self, key: str, compute, ttl: float, stale_ttl: float = 0, name: str | None = None):
+    """The value cached under `key`, or the result of `await compute()`"""
+    name = name or key
+    if self.backend is None:
+      SHARED_CACHE_REQUESTS.labels(name, 'miss').inc()
+      return await compute()
+
+    task = self._inflight.get(key)
+    if task is not None and task.get_loop() is asyncio.get_running_loop():
+      SHARED_CACHE_REQUESTS.labels(name, 'coalesced').inc()
+    else:
+      task = asyncio.ensure_future(self._get_or_set(key, compute, ttl, stale_ttl, name))
+      self._inflight[key] = task
+      task.add_done_callback(lambda done: self._forget_inflight(key, done))
+    # A cancelled caller must not cancel the lookup the others wait for
+    return await asyncio.shield(task)
+
+  def _forget_inflight(self, key, task):
+    if self._inflight.get(key) is task:
+      del self._inflight[key]
+
+  async def _get_or_set(self, key, compute, ttl, stale_ttl, name):
+    backend = self.backend
+    assert backend is not None # get_or_set computes the value without one
+    cache_key = self.make_key(key)
+    lock_key = f"{cache_key}:lock"
+    token = uuid.uuid4().hex
+    try:
+      if (entry := await backend.get(cache_key)) is not None:
+        fresh_until, value = pickle.loads(entry)
+        if time.time() < fresh_until:
+          SHARED_CACHE_REQUESTS.labels(name, 'hit').inc()
+          return value
+        SHARED_CACHE_REQUESTS.labels(name, 'stale').inc()
+        if await backend.add(lock_key, token, self.lock_ttl):
+          refresh = asyncio.create_task(self._refresh_in_background(cache_key, lock_key, token, compute, ttl, stale_ttl))
+          self._refreshes.add(refresh)
+          refresh.add_done_callback(self._refreshes.discard)
+        return value
+
+      # Wait for whoever is computing the value, up to the lock's life
+      deadline = time.monotonic() + self.lock_ttl
+      while not await backend.add(lock_key, token, self.lock_ttl):
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        if (entry := await backend.get(cache_key)) is not None:
+          SHARED_CACHE_REQUESTS.labels(name, 'coalesced').inc()
+          return pickle.loads(entry)[1]
+        if time.monotonic() > deadline:
+          break
+    except redis.RedisError as e:
+      logger.warning(f"Shared cache unavailable for {key}: {e}")
+      SHARED_CACHE_REQUESTS.labels(name, 'error').inc()
+      return await compute()
+
+    SHARED_CACHE_REQUESTS.labels(name, 'miss').inc()
+    return await self._refresh(cache_key, lock_key, token, compute, ttl, stale_ttl)
+
+  async def _refresh(self, cache_key, lock_key, token, compute, ttl, stale_ttl):
+    backend = self.backend
+    assert backend is not None
+    try:
+      value = await compute()
+      try:
+        entry = pickle.dumps((time.time() + ttl, value))
+        await backend.set(cache_key, entry, ttl + stale_ttl)
+      except redis.RedisError as e:
+        logger.warning(f"Failed to store {cache_key} in the shared cache: {e}")
+      return value
+    finally:
+      try:
+        await backend.release(lock_key, token)
+      except redis.RedisError:
+        pass # The lock expires on its own
+
+  async def _refresh_in_background(self, cache_key, *args):
+    try:
+      await self._refresh(cache_key, *args)
+    except Exception:
+      logger.exception(f"Failed to refresh {cache_key}, serving it stale")
+
+  def invalidate(self, key: str):
+    """Drops the value of `key` once the current transaction commits"""
+    if self.backend is not None:
+      transaction.on_commit(lambda: self._delete(key))
+
+  def _delete(self, key):
+    backend = self.backend
+    if backend is None:
+      return
+    try:
+      backend.delete_sync(self.make_key(key))
+    except redis.RedisError as e:
+      logger.warning(f"Failed to invalidate {key} in the shared cache: {e}")
+
+
+shared_cache = SharedCache()
+
+
+def invalidating_receiver(key: str):
+  """A model signal receiver that drops `key` from the shared cache"""
+  def receiver(sender, **kwargs):
+    shared_cache.invalidate(key)
+  return receiver
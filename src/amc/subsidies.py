@@ -4,6 +4,7 @@ from django.db.models import Q
 from django.contrib.gis.geos import Point
 from amc.mod_server import show_popup, transfer_money
 from amc.models import ServerPassengerArrivedLog, SubsidyRule
+from amc.subsidy_catalogue import aget_catalogue
 from amc_finance.services import (
   send_fund_to_player_wallet,
   get_character_max_loan,
@@ -13,50 +14,8 @@ from amc_finance.services import (
 )
 
 async def get_subsidies_text():
-    text = "<Title>ASEAN Server Subsidies</>\n\n"
-    
-    rules = SubsidyRule.objects.filter(active=True).order_by('-priority')
-    
-    async for rule in rules:
-        # Build Reward String
-        if rule.reward_type == SubsidyRule.RewardType.PERCENTAGE:
-            reward_str = f"{int(rule.reward_value * 100)}%"
-        else:
-            reward_str = f"{int(rule.reward_value)} coins"
-            
-        if rule.scales_with_damage:
-             reward_str += " (Reduces with damage)"
-        if rule.requires_on_time:
-             reward_str += " (Must be on time)"
-
-        # Build Cargo String
-        cargos = [c async for c in rule.cargos.all()]
-        if cargos:
-            cargo_names_list = [c.label for c in cargos]
-            cargo_str = ", ".join(cargo_names_list)
-        else:
-            cargo_str = "Any Cargo"
-            
-        text += f"<Bold>{cargo_str}</> - <Money>{reward_str}</>\n"
-        
-        # Secondary info (Areas & Points)
-        source_areas = [a async for a in rule.source_areas.all()]
-        source_points = [p async for p in rule.source_delivery_points.all()]
-        all_sources = source_areas + source_points
-        
-        dest_areas = [a async for a in rule.destination_areas.all()]
-        dest_points = [p async for p in rule.destination_delivery_points.all()]
-        all_dests = dest_areas + dest_points
-        
-        if all_sources:
-            source_names = ", ".join([obj.name for obj in all_sources])
-            text += f"<Secondary>From: {source_names}</>\n"
-            
-        if all_dests:
-            dest_names = ", ".join([obj.name for obj in all_dests])
-            text += f"<Secondary>To: {dest_names}</>\n"
-            
-    return text
+    catalogue = await aget_catalogue()
+    return catalogue.text
 
 SUBSIDIES_TEXT = "Use await get_subsidies_text()"
 
@@ -274,7 +233,7 @@ def get_passenger_subsidy(passenger):
     case _:
       return 0
 
-async def subsidise_player(subsidy, character, session, message=None):
+async def subsidise_player(subsidy, character, session, message=None, batch=None):
   if message is None:
     message = 'ASEAN Subsidy' if subsidy > 0 else 'ASEAN Tax'
   await transfer_money(
@@ -283,5 +242,8 @@ async def subsidise_player(subsidy, character, session, message=None):
     message,
     character.player.unique_id,
   )
-  await send_fund_to_player_wallet(subsidy, character, message)
+  if batch is not None:
+    batch.add_wallet_payout(subsidy, message)
+  else:
+    await send_fund_to_player_wallet(subsidy, character, message)
 
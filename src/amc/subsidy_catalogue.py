@@ -0,0 +1,133 @@
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+import redis
+import redis.asyncio as aioredis
+from amc.models import SubsidyRule
+from amc.redis_utils import get_redis_url
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_KEY = 'subsidies:catalogue'
+CATALOGUE_VERSION_KEY = 'subsidies:catalogue:version'
+
+
+@dataclass(frozen=True)
+class SubsidyCatalogue:
+  """The active subsidy rules, rendered for the /subsidies popup and for the API"""
+  text: str
+  rules: list[dict]
+  etag: str
+
+
+def render_rule_text(rule) -> str:
+  if rule.reward_type == SubsidyRule.RewardType.PERCENTAGE:
+    reward_str = f"{int(rule.reward_value * 100)}%"
+  else:
+    reward_str = f"{int(rule.reward_value)} coins"
+  if rule.scales_with_damage:
+    reward_str += " (Reduces with damage)"
+  if rule.requires_on_time:
+    reward_str += " (Must be on time)"
+
+  cargos = rule.cargos.all()
+  cargo_str = ", ".join(c.label for c in cargos) if cargos else "Any Cargo"
+  text = f"<Bold>{cargo_str}</> - <Money>{reward_str}</>\n"
+
+  all_sources = [*rule.source_areas.all(), *rule.source_delivery_points.all()]
+  all_dests = [*rule.destination_areas.all(), *rule.destination_delivery_points.all()]
+  if all_sources:
+    text += f"<Secondary>From: {', '.join(obj.name for obj in all_sources)}</>\n"
+  if all_dests:
+    text += f"<Secondary>To: {', '.join(obj.name for obj in all_dests)}</>\n"
+  return text
+
+
+def rule_to_dict(rule) -> dict:
+  """Public information of a rule, as SubsidyRulePublicSchema"""
+  return {
+    'id': rule.id,
+    'name': rule.name,
+    'active': rule.active,
+    'priority': rule.priority,
+    'reward_type': rule.reward_type,
+    'reward_value': float(rule.reward_value),
+    'cargo_keys': [c.key for c in rule.cargos.all()],
+    'source_area_names': [a.name for a in rule.source_areas.all()],
+    'destination_area_names': [a.name for a in rule.destination_areas.all()],
+    'requires_on_time': rule.requires_on_time,
+  }
+
+
+def _make_catalogue(text, rules) -> SubsidyCatalogue:
+  content = json.dumps({'text': text, 'rules': rules}, sort_keys=True)
+  etag = f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"'
+  return SubsidyCatalogue(text=text, rules=rules, etag=etag)
+
+
+def build_catalogue() -> SubsidyCatalogue:
+  rules = list(SubsidyRule.objects
+    .filter(active=True)
+    .order_by('-priority', 'id')
+    .prefetch_related(
+      'cargos',
+      'source_areas',
+      'source_delivery_points',
+      'destination_areas',
+      'destination_delivery_points',
+    )
+  )
+  text = "<Title>ASEAN Server Subsidies</>\n\n"
+  text += "".join(render_rule_text(rule) for rule in rules)
+  return _make_catalogue(text, [rule_to_dict(rule) for rule in rules])
+
+
+async def aget_catalogue() -> SubsidyCatalogue:
+  """
+  The catalogue cached in Redis, built when missing. Rule, area, cargo
+  and delivery point changes bump the catalogue's version through
+  `invalidate_catalogue`, so a catalogue built during a change is cached
+  under the old version and never read. The catalogue also expires after
+  SUBSIDY_CATALOGUE_TTL, in case an invalidation is lost.
+  """
+  if not settings.SUBSIDY_CATALOGUE_TTL:
+    return await sync_to_async(build_catalogue)()
+  redis_client = aioredis.from_url(get_redis_url(), socket_connect_timeout=1)
+  try:
+    try:
+      version = int(await redis_client.get(CATALOGUE_VERSION_KEY) or 0)
+      key = f"{CATALOGUE_KEY}:{version}"
+      if cached := await redis_client.get(key):
+        return SubsidyCatalogue(**json.loads(cached))
+    except redis.RedisError as e:
+      logger.warning(f"Failed to read the subsidies catalogue: {e}")
+      return await sync_to_async(build_catalogue)()
+
+    catalogue = await sync_to_async(build_catalogue)()
+    try:
+      await redis_client.set(key, json.dumps(asdict(catalogue)), ex=settings.SUBSIDY_CATALOGUE_TTL)
+    except redis.RedisError as e:
+      logger.warning(f"Failed to cache the subsidies catalogue: {e}")
+    return catalogue
+  finally:
+    await redis_client.aclose()
+
+
+def _bump_catalogue_version():
+  try:
+    with redis.Redis.from_url(get_redis_url(), socket_connect_timeout=1) as redis_client:
+      redis_client.incr(CATALOGUE_VERSION_KEY)
+  except redis.RedisError as e:
+    logger.warning(f"Failed to invalidate the subsidies catalogue: {e}")
+
+
+def invalidate_catalogue(sender=None, action=None, **kwargs):
+  """Drops the cached catalogue once the current transaction commits"""
+  # m2m_changed is sent both before and after each change
+  if action is not None and not action.startswith('post_'):
+    return
+  transaction.on_commit(_bump_catalogue_version)
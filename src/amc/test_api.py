@@ -1,15 +1,15 @@
-from datetime import timedelta
-from urllib.parse import quote
+import json
+from datetime import datetime, timedelta
 from typing import cast, Any
 from django.utils import timezone
 from django.contrib.gis.geos import Point
 from asgiref.sync import sync_to_async
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, RequestFactory
 from ninja.testing import TestAsyncClient
 from amc.api.routes import (
   players_router,
   characters_router,
-  player_locations_router,
+  player_locations_version,
   stats_router,
   teams_router,
   scheduled_events_router,
@@ -17,6 +17,7 @@ from amc.api.routes import (
   results_router,
   deliveryjobs_router,
 )
+from amc.personal_bests import refresh_game_event_personal_bests
 from amc.factories import (
   PlayerFactory,
   CharacterFactory,
@@ -159,8 +160,15 @@ class LeaderboardsAPITest(TestCase):
     self.assertEqual(response.json()[0]['depots_restocked'], 1)
 
 class PlayerLocationsAPITest(TestCase):
-  def setUp(self):
-    self.api_client = TestAsyncClient(player_locations_router)
+  async def get_locations(self, **params):
+    # Django's client, as ninja's can't consume an async stream
+    response = await self.async_client.get('/api/character_locations/', {
+      key: value.isoformat() if isinstance(value, datetime) else value
+      for key, value in params.items()
+    })
+    self.assertEqual(response.status_code, 200)
+    streaming_content = cast(Any, response).streaming_content
+    return json.loads(b''.join([chunk async for chunk in streaming_content]))
 
   async def test_list_positions(self):
     character = await sync_to_async(CharacterFactory)()
@@ -169,14 +177,11 @@ class PlayerLocationsAPITest(TestCase):
       timestamp=timezone.now() - timedelta(hours=3),
       location=Point(1, 1, 1)
     )
-    start_time = timezone.now() - timedelta(days=3)
-    start_time_str = quote(start_time.isoformat())
-    end_time = timezone.now()
-    end_time_str = quote(end_time.isoformat())
-    response = await cast(Any, self.api_client.get(f"/?start_time={start_time_str}&end_time={end_time_str}"))
-
-    self.assertEqual(response.status_code, 200)
-    self.assertEqual(response.json()[0]['location']['x'], 1.0)
+    data = await self.get_locations(
+      start_time=timezone.now() - timedelta(days=3),
+      end_time=timezone.now(),
+    )
+    self.assertEqual(data[0]['location']['x'], 1.0)
 
   async def test_list_positions_character(self):
     player = await sync_to_async(PlayerFactory)()
@@ -202,17 +207,28 @@ class PlayerLocationsAPITest(TestCase):
       timestamp=timezone.now() - timedelta(hours=2),
       location=Point(1, 1, 1)
     )
-    start_time = timezone.now() - timedelta(days=3)
-    start_time_str = quote(start_time.isoformat())
-    end_time = timezone.now()
-    end_time_str = quote(end_time.isoformat())
-    response = await cast(Any, self.api_client.get(f"/?start_time={start_time_str}&end_time={end_time_str}&player_id={player.unique_id}&num_samples=2"))
-
-    self.assertEqual(response.status_code, 200)
-    data = response.json()
+    data = await self.get_locations(
+      start_time=timezone.now() - timedelta(days=3),
+      end_time=timezone.now(),
+      player_id=str(player.unique_id),
+      num_samples=2,
+    )
     self.assertEqual(len(data), 2)
     self.assertEqual(data[0]['location']['x'], 1.0)
 
+class PlayerLocationsVersionTest(SimpleTestCase):
+  def version(self, end_time):
+    return player_locations_version(RequestFactory().get('/', {'end_time': end_time}))
+
+  def test_settled(self):
+    self.assertEqual(self.version((timezone.now() - timedelta(days=1)).isoformat()), 'settled')
+    self.assertIsNone(self.version(timezone.now().isoformat()))
+
+  def test_naive_or_invalid(self):
+    for end_time in ['2025-01-01T00:00:00', '2025-13-01T00:00:00Z', 'yesterday']:
+      with self.subTest(end_time=end_time):
+        self.assertIsNone(self.version(end_time))
+
 
 class TeamsAPITest(TestCase):
   def setUp(self):
@@ -249,6 +265,7 @@ class ScheduledEventAPITest(TestCase):
       game_event=game_event,
       finished=False,
     )
+    await refresh_game_event_personal_bests(game_event)
 
     response = await cast(Any, self.api_client.get(f"/{game_event.scheduled_event_id}/results/"))
     data = response.json()
@@ -269,6 +286,7 @@ class ScheduledEventAPITest(TestCase):
       game_event=game_event,
       finished=False,
     )
+    await refresh_game_event_personal_bests(game_event)
 
     response = await cast(Any, self.api_client.get(f"/{game_event.scheduled_event_id}/results/"))
     data = response.json()
@@ -329,6 +347,48 @@ class ResultsAPITestCase(TestCase):
     self.assertEqual(len(data), 2)
     print(data)
 
+  async def test_splits(self):
+    game_event = await sync_to_async(GameEventFactory)(state=3)
+    participant = await sync_to_async(GameEventCharacterFactory)(
+      game_event=game_event,
+      finished=True,
+      first_section_total_time_seconds=2,
+    )
+    await sync_to_async(GameEventCharacterFactory)(game_event=game_event)
+    times = [
+      # (lap, section index, total time)
+      (0, 0, 2),
+      (0, 1, 6),
+      (1, 0, 9),
+      (1, 1, 12),
+      (2, 0, 14),
+    ]
+    for lap, section_index, total_time_seconds in times:
+      await LapSectionTime.objects.acreate(
+        game_event_character=participant,
+        lap=lap,
+        section_index=section_index,
+        total_time_seconds=total_time_seconds,
+        rank=1,
+      )
+    await LapSectionTime.objects.aupdate_splits([participant.id])
+
+    await participant.arefresh_from_db()
+    # Fastest split into section 1 is 3s, into section 0 is 2s
+    self.assertEqual(participant.theoretical_best_lap_time, 5)
+
+    response = await cast(Any, self.api_client.get(
+      "/splits/",
+      query_params={'game_event_id': game_event.id}
+    ))
+    data = {p['id']: p for p in response.json()}
+    self.assertEqual(len(data), 2)
+    splits = data[participant.id]
+    self.assertEqual(splits['lap_numbers'], [0, 0, 1, 1, 2])
+    self.assertEqual(splits['section_indexes'], [0, 1, 0, 1, 0])
+    self.assertEqual(splits['total_times'], [2, 6, 9, 12, 14])
+    self.assertEqual(splits['section_durations'], [6, 9, 12, 14, None])
+
 class ChampionshipAPITest(TestCase):
   def setUp(self):
     self.api_client = TestAsyncClient(championships_router)
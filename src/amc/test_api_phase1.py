@@ -84,6 +84,21 @@ class SubsidyRulesAPITest(TestCase):
     self.assertNotIn('allocation', data)
     self.assertNotIn('spent', data)
 
+  async def test_conditional_request(self):
+    """Test that an unchanged catalogue is answered with 304 Not Modified"""
+    await sync_to_async(SubsidyRuleFactory)(active=True)
+
+    response = await cast(Any, self.api_client.get("/"))
+    etag = response['ETag']
+    response = await cast(Any, self.api_client.get("/", headers={'If-None-Match': etag}))
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(response['ETag'], etag)
+
+    await sync_to_async(SubsidyRuleFactory)(active=True)
+    response = await cast(Any, self.api_client.get("/", headers={'If-None-Match': etag}))
+    self.assertEqual(response.status_code, 200)
+    self.assertNotEqual(response['ETag'], etag)
+
 
 class MinistryAPITest(TestCase):
   """Test the /ministry/ endpoints"""
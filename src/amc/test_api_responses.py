@@ -0,0 +1,101 @@
+import gzip
+import json
+from django.http import JsonResponse, HttpResponse
+from django.test import SimpleTestCase, RequestFactory
+from amc.api.responses import conditional, compress_response, stream_json_list
+
+
+class ConditionalTestCase(SimpleTestCase):
+  def setUp(self):
+    self.factory = RequestFactory()
+    self.runs = 0
+
+  async def render(self, request, **kwargs):
+    self.runs += 1
+    return JsonResponse({'hello': 'world'}, safe=False)
+
+  async def test_version_skips_the_view(self):
+    view = conditional(lambda request: 'v1')(self.render)
+    response = await view(self.factory.get('/world/'))
+    self.assertEqual(response.status_code, 200)
+    etag = response['ETag']
+
+    response = await view(self.factory.get('/world/', headers={'If-None-Match': etag}))
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(response['ETag'], etag)
+    self.assertEqual(self.runs, 1)
+
+    # The compressed representation's ETag revalidates as well
+    response = await view(self.factory.get('/world/', headers={'If-None-Match': f'{etag[:-1]}-gzip"'}))
+    self.assertEqual(response.status_code, 304)
+
+  async def test_content_hash(self):
+    view = conditional()(self.render)
+    etag = (await view(self.factory.get('/results/')))['ETag']
+    response = await view(self.factory.get('/results/', headers={'If-None-Match': etag}))
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(self.runs, 2)
+
+  def test_sync_view(self):
+    view = conditional(lambda request: None)(lambda request: JsonResponse([1, 2], safe=False))
+    etag = view(self.factory.get('/housing/'))['ETag']
+    response = view(self.factory.get('/housing/', headers={'If-None-Match': etag}))
+    self.assertEqual(response.status_code, 304)
+
+
+class CompressResponseTestCase(SimpleTestCase):
+  def setUp(self):
+    self.factory = RequestFactory()
+    self.data = [{'guid': str(i), 'data': {'inventory': []}} for i in range(200)]
+
+  def make_response(self):
+    response = JsonResponse(self.data, safe=False)
+    response['ETag'] = '"abc"'
+    return response
+
+  def test_gzip(self):
+    request = self.factory.get('/', headers={'Accept-Encoding': 'gzip;q=1.0, br;q=0'})
+    response = compress_response(request, self.make_response())
+    self.assertEqual(response['Content-Encoding'], 'gzip')
+    self.assertEqual(response['ETag'], '"abc-gzip"')
+    self.assertIn('Accept-Encoding', response['Vary'])
+    self.assertEqual(json.loads(gzip.decompress(response.content)), self.data)
+
+  def test_not_accepted(self):
+    request = self.factory.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+    response = compress_response(request, self.make_response())
+    self.assertFalse(response.has_header('Content-Encoding'))
+    self.assertEqual(response['ETag'], '"abc"')
+
+  def test_small_or_not_json(self):
+    request = self.factory.get('/', headers={'Accept-Encoding': 'gzip'})
+    response = compress_response(request, JsonResponse({'small': True}))
+    self.assertFalse(response.has_header('Content-Encoding'))
+    response = compress_response(request, HttpResponse('<p></p>' * 1000))
+    self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class FakeQuerySet:
+  def __init__(self, rows):
+    self.rows = rows
+    self.chunk_size = None
+
+  async def aiterator(self, chunk_size):
+    self.chunk_size = chunk_size
+    for row in self.rows:
+      yield row
+
+
+class StreamJsonListTestCase(SimpleTestCase):
+  async def read(self, response):
+    return json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+
+  async def test_stream(self):
+    queryset = FakeQuerySet([1, 2, 3])
+    response = stream_json_list(queryset, lambda row: {'row': row}, chunk_size=2)
+    self.assertEqual(response['Content-Type'], 'application/json')
+    self.assertEqual(await self.read(response), [{'row': 1}, {'row': 2}, {'row': 3}])
+    self.assertEqual(queryset.chunk_size, 2)
+
+  async def test_empty(self):
+    self.assertEqual(await self.read(stream_json_list(FakeQuerySet([]), str)), [])
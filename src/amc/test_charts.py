@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase
+from amc.charts import ChartRenderer
+from amc_cogs.status import StatusCog
+
+
+class ChartRendererTestCase(SimpleTestCase):
+  async def test_renders_and_caches(self):
+    renderer = ChartRenderer(max_workers=1, cache_size=1)
+    spec, series = StatusCog.status_chart([60, 58, 61], [10.5, 10.6, 10.4])
+    try:
+      await renderer.start()
+      png = await renderer.render(spec, series)
+      self.assertTrue(png.startswith(b'\x89PNG'))
+
+      self.assertEqual(await renderer.render(spec, series), png)
+      self.assertEqual(renderer.stats()['rendered'], 1)
+      self.assertEqual(renderer.stats()['cache_hits'], 1)
+
+      # Changed data is rendered again, evicting the oldest PNG
+      await renderer.render(spec, {**series, 'fps': [60, 58, 30]})
+      await renderer.render(spec, series)
+      self.assertEqual(renderer.rendered, 3)
+      self.assertIsNotNone(renderer.average_render_seconds)
+    finally:
+      renderer.shutdown()
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import timedelta
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from amc.factories import CharacterFactory
+from amc.models import Delivery, DeliveryJob, Player
+from amc.delivery_posting import (
+  DeliveryGroup,
+  _apply_jobs,
+  _write_statements,
+  apost_deliveries,
+  delivery_connection_pool,
+)
+
+
+def make_group(job_id, quantity, payment=1000, subsidy=0, **delivery_data):
+  return DeliveryGroup(job_id, quantity, {
+    'timestamp': timezone.now(),
+    'cargo_key': 'SmallBox',
+    'quantity': quantity,
+    'payment': payment * quantity,
+    'subsidy': subsidy,
+    **delivery_data,
+  })
+
+
+class ApplyJobsTestCase(SimpleTestCase):
+  def test_bonus_and_fulfilment(self):
+    groups = [make_group(1, 10), make_group(1, 10, subsidy=20_000), make_group(1, 5)]
+    jobs = _apply_jobs(groups, [(1, 15, 0, 2.0)])
+
+    # The first group takes 10 of 15, the second the 5 left, the third none
+    self.assertEqual([group.job_id for group in groups], [1, 1, None])
+    self.assertEqual([group.delivery_data['subsidy'] for group in groups], [10_000, 20_000, 0])
+    self.assertEqual([group.job_fulfilled for group in groups], [False, True, False])
+    self.assertEqual(jobs[1].quantity_fulfilled, 15)
+
+  def test_jobs_no_longer_active_are_dropped(self):
+    groups = [make_group(1, 10), make_group(None, 10)]
+    jobs = _apply_jobs(groups, [])
+    self.assertEqual(jobs, {})
+    self.assertEqual([group.job_id for group in groups], [None, None])
+    self.assertEqual([group.delivery_data['subsidy'] for group in groups], [0, 0])
+
+  def test_one_insert_for_all_groups(self):
+    groups = [make_group(None, 1), make_group(None, 2)]
+    statements = _write_statements(groups, _apply_jobs(groups, []))
+    self.assertEqual(len(statements), 1)
+    sql, params_seq = statements[0]
+    self.assertTrue(sql.startswith('INSERT INTO amc_delivery'))
+    self.assertEqual(len(params_seq), 1)
+    self.assertEqual(len(params_seq[0]), 20)
+
+
+class PostDeliveriesTestCase(TestCase):
+  def setUp(self):
+    self.character = CharacterFactory()
+
+  async def test_posts_all_groups(self):
+    job = await DeliveryJob.objects.acreate(
+      quantity_requested=10,
+      bonus_multiplier=1.5,
+      expired_at=timezone.now() + timedelta(days=1),
+    )
+    groups = await apost_deliveries([
+      make_group(job.id, 6, character=self.character),
+      make_group(job.id, 6, character=self.character),
+      make_group(None, 1, character=self.character),
+    ])
+
+    self.assertEqual([group.job_fulfilled for group in groups], [False, True, False])
+    await job.arefresh_from_db()
+    self.assertEqual(job.quantity_fulfilled, 10)
+    deliveries = [
+      (delivery.job_id, delivery.quantity, delivery.subsidy)
+      async for delivery in Delivery.objects.filter(character=self.character).order_by('id')
+    ]
+    self.assertEqual(deliveries, [(job.id, 6, 3000), (job.id, 6, 2000), (None, 1, 0)])
+    player = await Player.objects.aget(pk=self.character.player_id)
+    self.assertEqual(player.lifetime_earnings, 13_000 + 5_000)
+
+
+@override_settings(DELIVERY_POSTING_CONNECTIONS=2)
+class PooledPostDeliveriesTestCase(TransactionTestCase):
+  """Posting on the pool's AsyncConnections, which only see committed rows"""
+
+  def setUp(self):
+    self.character = CharacterFactory()
+
+  async def test_concurrent_arrivals(self):
+    job = await DeliveryJob.objects.acreate(
+      quantity_requested=10,
+      bonus_multiplier=1.5,
+      expired_at=timezone.now() + timedelta(days=1),
+    )
+    try:
+      arrivals = await asyncio.gather(*[
+        apost_deliveries([make_group(job.id, 6, character=self.character)])
+        for _ in range(2)
+      ])
+    finally:
+      await delivery_connection_pool.close()
+
+    # The job's row lock makes one arrival count after the other
+    subsidies = [delivery.subsidy async for delivery in Delivery.objects.filter(job=job)]
+    self.assertEqual(sorted(subsidies), [2000, 3000])
+    self.assertEqual(sorted(groups[0].job_fulfilled for groups in arrivals), [False, True])
+    await job.arefresh_from_db()
+    self.assertEqual(job.quantity_fulfilled, 10)
@@ -0,0 +1,159 @@
+from datetime import timedelta
+from urllib.parse import quote
+from typing import cast, Any
+from unittest.mock import patch, AsyncMock
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.gis.geos import Point
+from ninja.testing import TestAsyncClient
+from amc.api.routes import deliverypoints_router
+from amc.deliverypoints import monitor_deliverypoints, rollup_storage_levels_between
+from amc.models import (
+  Cargo,
+  DeliveryPoint,
+  DeliveryPointStorage,
+  DeliveryPointStorageLevel,
+  DeliveryPointStorageHourlyLevel,
+)
+
+
+def make_dp_info(guid, input_amount, output_amount):
+  return {
+    'guid': guid.upper(),
+    'InputInventory': {
+      '0': {'cargo': {'name': 'Coal'}, 'amount': input_amount},
+    },
+    'OutputInventory': {
+      '0': {'cargo': {'name': 'Oranges'}, 'amount': output_amount},
+    },
+    'Deliveries': {},
+  }
+
+
+@patch('amc.deliverypoints.get_deliverypoints', new_callable=AsyncMock)
+class MonitorDeliveryPointsTestCase(TestCase):
+  def setUp(self):
+    Cargo.objects.create(key='Coal', label='Coal')
+    Cargo.objects.create(key='OrangeBox', label='Oranges')
+    self.dp1 = DeliveryPoint.objects.create(guid='abc', name='mine', type='mine', coord=Point(0, 0, 0))
+    self.dp2 = DeliveryPoint.objects.create(guid='def', name='farm', type='farm', coord=Point(1, 1, 0))
+
+  async def test_creates_and_updates_storages(self, mock_get_deliverypoints):
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 20),
+      '2': make_dp_info('def', 0, 5),
+    }}
+    result = await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(result, {'delivery_points_changed': 2, 'storages_changed': 4})
+
+    storage = await DeliveryPointStorage.objects.aget(
+      delivery_point=self.dp1,
+      kind=DeliveryPointStorage.Kind.OUTPUT,
+      cargo_key='OrangeBox',
+    )
+    self.assertEqual(storage.amount, 20)
+    self.assertEqual(storage.cargo_id, 'OrangeBox')
+    await self.dp1.arefresh_from_db()
+    assert self.dp1.data is not None
+    self.assertEqual(self.dp1.data['inputInventory'][0]['amount'], 10)
+
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 25),
+      '2': make_dp_info('def', 0, 5),
+    }}
+    result = await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(result, {'delivery_points_changed': 1, 'storages_changed': 1})
+    await storage.arefresh_from_db()
+    self.assertEqual(storage.amount, 25)
+    self.assertEqual(await DeliveryPointStorage.objects.acount(), 4)
+
+  async def test_unchanged_inventory_is_skipped(self, mock_get_deliverypoints):
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 20),
+    }}
+    await monitor_deliverypoints({'http_client': None})
+    result = await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(result, {'delivery_points_changed': 0, 'storages_changed': 0})
+
+  async def test_preserves_capacity(self, mock_get_deliverypoints):
+    await DeliveryPointStorage.objects.acreate(
+      delivery_point=self.dp1,
+      kind=DeliveryPointStorage.Kind.INPUT,
+      cargo_key='Coal',
+      amount=0,
+      capacity=100,
+    )
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 20),
+    }}
+    await monitor_deliverypoints({'http_client': None})
+    storage = await DeliveryPointStorage.objects.aget(
+      delivery_point=self.dp1,
+      kind=DeliveryPointStorage.Kind.INPUT,
+      cargo_key='Coal',
+    )
+    self.assertEqual(storage.amount, 10)
+    self.assertEqual(storage.capacity, 100)
+
+  async def test_records_levels_only_on_change(self, mock_get_deliverypoints):
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 20),
+    }}
+    await monitor_deliverypoints({'http_client': None})
+    await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(await DeliveryPointStorageLevel.objects.acount(), 2)
+
+    mock_get_deliverypoints.return_value = {'data': {
+      '1': make_dp_info('abc', 10, 15),
+    }}
+    await monitor_deliverypoints({'http_client': None})
+    levels = [
+      amount
+      async for amount in DeliveryPointStorageLevel.objects.filter_series(
+        'abc', 'OrangeBox', timezone.now() - timedelta(hours=1), timezone.now()
+      ).order_by('timestamp').values_list('amount', flat=True)
+    ]
+    self.assertEqual(levels, [20, 15])
+
+
+class StorageLevelRollupTestCase(TestCase):
+  def setUp(self):
+    self.dp = DeliveryPoint.objects.create(guid='abc', name='mine', type='mine', coord=Point(0, 0, 0))
+    self.storage = DeliveryPointStorage.objects.create(
+      delivery_point=self.dp,
+      kind=DeliveryPointStorage.Kind.OUTPUT,
+      cargo_key='Coal',
+      amount=0,
+    )
+    self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    for minutes, amount in [(-10, 50), (5, 40), (20, 80), (70, 60)]:
+      DeliveryPointStorageLevel.objects.create(
+        storage=self.storage,
+        timestamp=self.hour + timedelta(minutes=minutes),
+        amount=amount,
+      )
+    self.api_client = TestAsyncClient(deliverypoints_router)
+
+  async def test_rollup(self):
+    count = await rollup_storage_levels_between(self.hour, self.hour + timedelta(hours=2))
+    self.assertEqual(count, 2)
+    rollups = [
+      (r.min_amount, r.max_amount, r.last_amount)
+      async for r in DeliveryPointStorageHourlyLevel.objects.order_by('hour')
+    ]
+    # The first hour opens at 50, carried over from the previous hour
+    self.assertEqual(rollups, [(40, 80, 80), (60, 80, 60)])
+
+    # Re-running is idempotent
+    await rollup_storage_levels_between(self.hour, self.hour + timedelta(hours=2))
+    self.assertEqual(await DeliveryPointStorageHourlyLevel.objects.acount(), 2)
+
+  async def test_levels_api(self):
+    start_time = quote((self.hour).isoformat())
+    end_time = quote((self.hour + timedelta(hours=1)).isoformat())
+    response = await cast(Any, self.api_client.get(
+      f"/abc/storages/Coal/levels/?start_time={start_time}&end_time={end_time}"
+    ))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual([level['amount'] for level in response.json()], [40, 80])
+    self.assertEqual(response.json()[0]['kind'], 'OU')
@@ -0,0 +1,95 @@
+import asyncio
+import discord
+from unittest.mock import MagicMock, AsyncMock
+from django.test import TestCase
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from amc.embed_sync import EmbedSync
+from amc.factories import CharacterFactory, DeliveryJobFactory
+from amc.models import Delivery, DeliveryJob
+from amc_cogs.jobs import JobsCog
+
+
+def make_channel():
+  channel = MagicMock()
+  partial_message = MagicMock()
+  partial_message.edit = AsyncMock()
+  channel.get_partial_message.return_value = partial_message
+  channel.send = AsyncMock(return_value=MagicMock(id=999))
+  return channel, partial_message
+
+
+class EmbedSyncTestCase(TestCase):
+  async def test_sends_new_message(self):
+    sync = EmbedSync()
+    channel, _ = make_channel()
+    message_id = await sync.sync(channel, None, discord.Embed(title='Job'))
+    self.assertEqual(message_id, 999)
+    channel.send.assert_awaited_once()
+
+  async def test_skips_unchanged_embed(self):
+    sync = EmbedSync()
+    channel, partial_message = make_channel()
+    await sync.sync(channel, 123, discord.Embed(title='Job (0/10)'))
+    await sync.sync(channel, 123, discord.Embed(title='Job (0/10)'))
+    self.assertEqual(partial_message.edit.await_count, 1)
+    self.assertEqual(sync.skipped, 1)
+
+    await sync.sync(channel, 123, discord.Embed(title='Job (5/10)'))
+    self.assertEqual(partial_message.edit.await_count, 2)
+    channel.send.assert_not_awaited()
+
+  async def test_resends_deleted_message(self):
+    sync = EmbedSync()
+    channel, partial_message = make_channel()
+    partial_message.edit.side_effect = discord.NotFound(MagicMock(status=404), 'Unknown Message')
+    message_id = await sync.sync(channel, 123, discord.Embed(title='Job'))
+    self.assertEqual(message_id, 999)
+    channel.send.assert_awaited_once()
+
+  async def test_limits_concurrency(self):
+    sync = EmbedSync(max_concurrency=2)
+    running = 0
+    max_running = 0
+
+    async def slow_edit(**kwargs):
+      nonlocal running, max_running
+      running += 1
+      max_running = max(max_running, running)
+      await asyncio.sleep(0.01)
+      running -= 1
+
+    channel, partial_message = make_channel()
+    partial_message.edit.side_effect = slow_edit
+    await asyncio.gather(*[
+      sync.sync(channel, message_id, discord.Embed(title=str(message_id)))
+      for message_id in range(1, 8)
+    ])
+    self.assertEqual(partial_message.edit.await_count, 7)
+    self.assertEqual(max_running, 2)
+
+
+class JobContributorsTestCase(TestCase):
+  async def test_aggregates_contributors(self):
+    job = await sync_to_async(DeliveryJobFactory)(quantity_requested=100, completion_bonus=100_000)
+    alice = await sync_to_async(CharacterFactory)(name='alice')
+    bob = await sync_to_async(CharacterFactory)(name='bob')
+    for character, quantity in [(alice, 3), (bob, 10), (alice, 4)]:
+      await Delivery.objects.acreate(
+        timestamp=timezone.now(),
+        character=character,
+        cargo_key='Coal',
+        quantity=quantity,
+        payment=1000,
+        job=job,
+      )
+
+    contributors = await JobsCog.get_job_contributors([job.id])
+    self.assertEqual(contributors, {job.id: {'alice': 7, 'bob': 10}})
+
+    cog = JobsCog(MagicMock())
+    job = await DeliveryJob.objects.prefetch_related(
+      'source_points', 'destination_points', 'cargos'
+    ).aget(pk=job.id)
+    embed = cog._build_job_embed(job, contributors[job.id])
+    self.assertIn('**bob**: 10 (10,000 bonus upon completion)\n**alice**: 7', embed.description or '')
@@ -1,6 +1,6 @@
 import json
 from django.test import TestCase
-from amc.models import GameEvent, GameEventCharacter
+from amc.models import GameEvent, GameEventCharacter, LapSectionTime
 from amc.events import process_event
 
 class EventsTests(TestCase):
@@ -92,3 +92,58 @@ class EventsTests(TestCase):
       [2, 2]
     )
 
+
+def make_player(name, unique_id, guid, **kwargs):
+  return {
+    "LastSectionTotalTimeSeconds": 0.0, "SectionIndex": -1, "BestLapTime": 0.0, "bFinished": False,
+    "bWrongVehicle": False, "LapTimes": {}, "PlayerName": name, "bWrongEngine": False,
+    "bDisqualified": False, "Rank": 0, "Laps": 0,
+    "CharacterId": {"UniqueNetId": str(unique_id), "CharacterGuid": guid},
+    **kwargs,
+  }
+
+def make_event(players, state):
+  return {
+    "Players": players,
+    "OwnerCharacterId": players[0]["CharacterId"],
+    "EventType": 1, "EventGuid": "5B11926A45D1869C3AA6309F3F564829", "EventName": "Race",
+    "RaceSetup": {"VehicleKeys": {}, "Route": {"Waypoints": [], "RouteName": "Route"}, "EngineKeys": {}, "NumLaps": 0},
+    "State": state, "bInCountdown": False,
+  }
+
+class EventTelemetryTests(TestCase):
+  async def test_unchanged_payload_is_skipped(self):
+    event = make_event([make_player('freeman', 76561198378447512, 'E603C74946EFF3F8834C9AAB3D0E3181')], 1)
+    self.assertIsNotNone(await process_event(event))
+    self.assertIsNone(await process_event(event))
+
+    event = make_event([make_player('freeman', 76561198378447512, 'E603C74946EFF3F8834C9AAB3D0E3181', Rank=1)], 1)
+    self.assertIsNotNone(await process_event(event))
+    self.assertEqual((await GameEventCharacter.objects.aget()).rank, 1)
+
+  async def test_bulk_lap_section_times(self):
+    guids = ['A' * 32, 'B' * 32, 'C' * 32]
+    await process_event(make_event([
+      make_player(f'racer{i}', 1000 + i, guid) for i, guid in enumerate(guids)
+    ], 2))
+    for section_index, laps in [(0, 1), (1, 1), (0, 2)]:
+      await process_event(make_event([
+        make_player(
+          f'racer{i}', 1000 + i, guid,
+          SectionIndex=section_index, Laps=laps, Rank=i + 1,
+          LastSectionTotalTimeSeconds=10.0 * (section_index + laps) + i,
+        )
+        for i, guid in enumerate(guids)
+      ], 2))
+
+    self.assertEqual(await GameEventCharacter.objects.acount(), 3)
+    self.assertEqual(await LapSectionTime.objects.acount(), 9)
+    participant = await GameEventCharacter.objects.aget(character__guid='C' * 32)
+    self.assertEqual(participant.first_section_total_time_seconds, 12.0)
+    self.assertEqual(
+      [
+        (t.lap, t.section_index, t.total_time_seconds, t.rank)
+        async for t in participant.lap_section_times.order_by('lap', 'section_index')
+      ],
+      [(0, 0, 12.0, 3), (0, 1, 22.0, 3), (1, 0, 22.0, 3)],
+    )
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase
+from django.utils import timezone
+from amc.factories import DeliveryPointFactory
+from amc.models import Cargo, DeliveryJob
+from amc.job_index import ActiveJobIndex
+
+
+class ActiveJobIndexTestCase(TestCase):
+  def setUp(self):
+    self.index = ActiveJobIndex()
+    self.source = DeliveryPointFactory(guid='source', name='Source')
+    self.destination = DeliveryPointFactory(guid='destination', name='Destination')
+    self.fruit = Cargo.objects.create(key='Fruit', label='Fruit')
+    self.apples = Cargo.objects.create(key='Apples', label='Apples', type=self.fruit)
+
+  async def create_job(self, **kwargs):
+    return await DeliveryJob.objects.acreate(
+      quantity_requested=10,
+      bonus_multiplier=1.0,
+      expired_at=timezone.now() + timedelta(days=1),
+      **kwargs,
+    )
+
+  async def assert_matches_query(self, source, destination, cargo_key):
+    expected = await (DeliveryJob.objects
+      .filter_active()
+      .filter_by_delivery(source, destination, cargo_key)
+    ).afirst()
+    job = await self.index.amatch(
+      source.pk if source else None,
+      destination.pk if destination else None,
+      cargo_key,
+    )
+    self.assertEqual(job and job.id, expected and expected.id)
+
+  async def test_matches_like_filter_by_delivery(self):
+    by_key = await self.create_job(cargo_key='Coal')
+    by_type = await self.create_job(name='Fruit to destination')
+    await by_type.cargos.aadd(self.fruit)
+    await by_type.destination_points.aadd(self.destination)
+    by_cargo = await self.create_job()
+    await by_cargo.cargos.aadd(self.apples)
+    await by_cargo.source_points.aadd(self.source)
+    await self.create_job(cargo_key='Coal', expired_at=timezone.now() - timedelta(hours=1))
+    await self.create_job(cargo_key='Logs', quantity_fulfilled=10)
+
+    for source in [self.source, self.destination, None]:
+      for destination in [self.source, self.destination, None]:
+        for cargo_key in ['Coal', 'Fruit', 'Apples', 'Logs']:
+          with self.subTest(source=source, destination=destination, cargo_key=cargo_key):
+            await self.assert_matches_query(source, destination, cargo_key)
+
+    job = await self.index.amatch(None, None, 'Coal')
+    assert job is not None
+    self.assertEqual(job.id, by_key.id)
+
+  async def test_rebuilt_only_when_jobs_change(self):
+    await self.create_job(cargo_key='Coal')
+    await self.index.amatch(None, None, 'Coal')
+    await self.index.amatch(None, None, 'Coal')
+    self.assertEqual(self.index.rebuilds, 1)
+
+    with patch('amc.job_index.active_job_index', self.index):
+      job = await self.create_job()
+      await job.cargos.aadd(self.apples)
+    matched = await self.index.amatch(None, None, 'Apples')
+    assert matched is not None
+    self.assertEqual(matched.id, job.id)
+    self.assertEqual(self.index.rebuilds, 2)
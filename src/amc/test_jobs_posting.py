@@ -0,0 +1,135 @@
+import random
+from types import SimpleNamespace
+from django.test import TestCase
+from django.db.models import Q
+from django.contrib.gis.geos import Point
+from asgiref.sync import sync_to_async
+from amc.factories import DeliveryJobTemplateFactory
+from amc.models import Cargo, DeliveryPoint, DeliveryPointStorage
+from amc.jobs import (
+  get_template_storage_totals,
+  evaluate_template_posting,
+  EMPTY_STORAGE_TOTALS,
+)
+
+
+class TemplateStorageTotalsTestCase(TestCase):
+  def setUp(self):
+    self.log_type = Cargo.objects.create(key='T::Log', label='Log')
+    self.oak = Cargo.objects.create(key='OakLog', label='Oak Log', type=self.log_type)
+    self.pine = Cargo.objects.create(key='PineLog', label='Pine Log', type=self.log_type)
+    self.coal = Cargo.objects.create(key='Coal', label='Coal')
+    self.forest = DeliveryPoint.objects.create(guid='forest', name='forest', type='forest', coord=Point(0, 0, 0))
+    self.mill = DeliveryPoint.objects.create(guid='mill', name='mill', type='mill', coord=Point(1, 1, 0))
+
+    for cargo, amount in [(self.oak, 40), (self.pine, 30), (self.coal, 10)]:
+      DeliveryPointStorage.objects.create(
+        delivery_point=self.forest,
+        kind=DeliveryPointStorage.Kind.OUTPUT,
+        cargo_key=cargo.key,
+        cargo=cargo,
+        amount=amount,
+        capacity=100,
+      )
+    # Subtype storages at the mill inherit capacity from the type storage
+    DeliveryPointStorage.objects.create(
+      delivery_point=self.mill,
+      kind=DeliveryPointStorage.Kind.INPUT,
+      cargo_key=self.log_type.key,
+      cargo=self.log_type,
+      amount=0,
+      capacity=200,
+    )
+    for cargo, amount in [(self.oak, 5), (self.pine, 15)]:
+      DeliveryPointStorage.objects.create(
+        delivery_point=self.mill,
+        kind=DeliveryPointStorage.Kind.INPUT,
+        cargo_key=cargo.key,
+        cargo=cargo,
+        amount=amount,
+      )
+
+  async def orm_totals(self, template):
+    cargos = [c async for c in template.cargos.select_related('type')]
+    non_type_cargos = [c for c in cargos if 'T::' not in c.key]
+    totals = {}
+    for side, points in [('source', template.source_points.all()), ('destination', template.destination_points.all())]:
+      storages = DeliveryPointStorage.objects.filter(
+        Q(cargo__in=non_type_cargos) | Q(cargo__type__in=cargos),
+        delivery_point__in=points,
+      ).annotate_default_capacity()
+      capacities = [(s.amount, s.capacity_normalized or 0) async for s in storages]
+      totals[f'{side}_amount'] = sum(amount for amount, _ in capacities)
+      totals[f'{side}_capacity'] = sum(capacity for _, capacity in capacities)
+    return totals
+
+  async def test_matches_per_template_queries(self):
+    type_template = await sync_to_async(DeliveryJobTemplateFactory)(
+      cargos=[self.log_type],
+      source_points=[self.forest],
+      destination_points=[self.mill],
+    )
+    cargo_template = await sync_to_async(DeliveryJobTemplateFactory)(
+      cargos=[self.oak, self.coal],
+      source_points=[self.forest],
+      destination_points=[self.mill],
+    )
+    pointless_template = await sync_to_async(DeliveryJobTemplateFactory)(
+      cargos=[self.coal],
+    )
+
+    totals = await get_template_storage_totals([
+      type_template.id,
+      cargo_template.id,
+      pointless_template.id,
+    ])
+    self.assertEqual(totals[type_template.id], await self.orm_totals(type_template))
+    self.assertEqual(totals[cargo_template.id], await self.orm_totals(cargo_template))
+    self.assertEqual(totals[type_template.id], {
+      'source_amount': 70,
+      'source_capacity': 200,
+      'destination_amount': 20,
+      'destination_capacity': 400,
+    })
+    self.assertNotIn(pointless_template.id, totals)
+
+
+class EvaluateTemplatePostingTestCase(TestCase):
+  def make_template(self, **kwargs):
+    return SimpleNamespace(**{
+      'default_quantity': 100,
+      'expected_player_count_for_quantity': None,
+      'job_posting_probability': 1.0,
+      **kwargs,
+    })
+
+  def test_destination_full(self):
+    template = self.make_template()
+    totals = {**EMPTY_STORAGE_TOTALS, 'destination_amount': 90, 'destination_capacity': 100}
+    self.assertIsNone(evaluate_template_posting(template, totals, True, 50, 0))
+
+  def test_source_not_enough(self):
+    template = self.make_template()
+    totals = {**EMPTY_STORAGE_TOTALS, 'source_amount': 10, 'source_capacity': 1000}
+    self.assertIsNone(evaluate_template_posting(template, totals, True, 50, 0))
+
+  def test_quantity_capped_by_destination(self):
+    template = self.make_template(job_posting_probability=1000.0)
+    totals = {**EMPTY_STORAGE_TOTALS, 'destination_amount': 5, 'destination_capacity': 60}
+    self.assertEqual(evaluate_template_posting(template, totals, True, 50, 0), 55)
+
+  def test_posting_probability(self):
+    template = self.make_template(job_posting_probability=2.0)
+    num_players, num_active_jobs = 40, 1
+    expected_chance = 2.0 * 40 / 2000 / (5 + 1 * 2)
+
+    for has_points, chance in [(True, expected_chance), (False, expected_chance / (24 * 3))]:
+      random.seed(1234)
+      expected = [not (random.random() > chance) for _ in range(20000)]
+      random.seed(1234)
+      posted = [
+        evaluate_template_posting(template, EMPTY_STORAGE_TOTALS, has_points, num_players, num_active_jobs) is not None
+        for _ in range(20000)
+      ]
+      self.assertEqual(posted, expected)
+      self.assertAlmostEqual(sum(posted) / len(posted), chance, delta=max(chance * 0.25, 0.001))
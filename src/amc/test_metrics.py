@@ -0,0 +1,89 @@
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase, TestCase
+from prometheus_client import REGISTRY
+from amc.models import Character
+from amc.metrics import (
+  instrument_job,
+  normalize_endpoint,
+  http_trace_config,
+)
+from amc.query_budget import track_queries
+
+
+def sample(name, labels):
+  return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class NormalizeEndpointTestCase(SimpleTestCase):
+  def test_normalize_endpoint(self):
+    self.assertEqual(normalize_endpoint('/players/76561198000000000/money'), '/players/{id}/money')
+    self.assertEqual(
+      normalize_endpoint('/rp_sessions/0123456789ABCDEF0123456789ABCDEF/toggle'),
+      '/rp_sessions/{id}/toggle',
+    )
+    self.assertEqual(normalize_endpoint('/status/general'), '/status/general')
+
+
+class HttpTraceConfigTestCase(SimpleTestCase):
+  async def test_records_outbound_latency(self):
+    async def handler(request):
+      return web.json_response({'data': []})
+
+    app = web.Application()
+    app.router.add_get('/players/{player_id}', handler)
+    labels = {'service': 'test', 'method': 'GET', 'endpoint': '/players/{id}', 'status': '200'}
+    before = sample('amc_outbound_http_duration_seconds_count', labels)
+
+    async with TestServer(app) as server:
+      async with aiohttp.ClientSession(
+        base_url=str(server.make_url('')),
+        trace_configs=[http_trace_config('test')],
+      ) as session:
+        async with session.get('/players/123') as resp:
+          await resp.json()
+
+    self.assertEqual(sample('amc_outbound_http_duration_seconds_count', labels), before + 1)
+
+
+class InstrumentJobTestCase(TestCase):
+  async def test_records_duration_and_queries(self):
+    async def count_characters(ctx):
+      return await Character.objects.acount() + await Character.objects.filter(name='x').acount()
+
+    job = instrument_job(count_characters)
+    name = count_characters.__qualname__
+    before = sample('amc_job_db_queries_sum', {'function': name})
+
+    with track_queries() as outer:
+      self.assertEqual(await job({}), 0)
+
+    self.assertEqual(outer.count, 2)
+    self.assertEqual(sample('amc_job_duration_seconds_count', {'function': name}), 1)
+    self.assertEqual(sample('amc_job_db_queries_sum', {'function': name}), before + 2)
+    self.assertEqual(sample('amc_jobs_in_progress', {'function': name}), 0)
+
+  async def test_records_failures(self):
+    async def failing_job(ctx):
+      raise ValueError()
+
+    with self.assertRaises(ValueError):
+      await instrument_job(failing_job)({})
+    self.assertEqual(sample('amc_job_failures_total', {'function': failing_job.__qualname__}), 1)
+
+  def test_metrics_view(self):
+    response = self.client.get('/metrics')
+    self.assertEqual(response.status_code, 200)
+    self.assertIn(b'amc_job_duration_seconds', response.content)
+
+  def test_metrics_view_restricted(self):
+    response = self.client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.7'})
+    self.assertEqual(response.status_code, 403)
+    response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7')
+    self.assertEqual(response.status_code, 403)
+
+    with self.settings(METRICS_TOKEN='secret'):
+      self.assertEqual(self.client.get('/metrics').status_code, 403)
+      response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+      self.assertEqual(response.status_code, 200)
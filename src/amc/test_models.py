@@ -1,10 +1,27 @@
 from datetime import timedelta
+from typing import cast
 from django.test import TestCase
 from django.utils import timezone
 from django.contrib.gis.geos import Point
 from asgiref.sync import sync_to_async
-from amc.factories import CharacterFactory, ChampionshipFactory, ChampionshipPointFactory
-from amc.models import CharacterLocation, Character
+from amc.factories import (
+  CharacterFactory,
+  ChampionshipFactory,
+  ChampionshipPointFactory,
+  DeliveryFactory,
+  GameEventCharacterFactory,
+  GameEventFactory,
+  TeamFactory,
+)
+from amc.models import (
+  CharacterLocation,
+  Character,
+  ChampionshipPoint,
+  ChampionshipPersonalStanding,
+  ChampionshipTeamStanding,
+  Delivery,
+  Player,
+)
 
 class CharacterLocationTestCase(TestCase):
   async def test_activity(self):
@@ -76,6 +93,108 @@ class ChampionshipTestCase(TestCase):
     prizes = await championship.calculate_team_prizes()
     print(prizes)
 
+class ChampionshipStandingsTestCase(TestCase):
+  async def assert_standings_consistent(self, championship):
+    cached_personal = [
+      (s['character_id'], s['total_points'])
+      async for s in ChampionshipPersonalStanding.objects.for_championship(championship.id)
+    ]
+    personal = [
+      (s['character_id'], s['total_points'])
+      async for s in ChampionshipPoint.objects.personal_standings(championship.id)
+    ]
+    self.assertEqual(sorted(cached_personal), sorted(personal))
+    cached_teams = [
+      (s['team__id'], s['total_points'])
+      async for s in ChampionshipTeamStanding.objects.for_championship(championship.id)
+    ]
+    teams = [
+      (s['team__id'], s['total_points'])
+      async for s in ChampionshipPoint.objects.team_standings(championship.id)
+    ]
+    self.assertEqual(sorted(cached_teams), sorted(teams))
+
+  async def test_award_and_edit_points(self):
+    championship = await sync_to_async(ChampionshipFactory)()
+    team, other_team = await sync_to_async(TeamFactory)(), await sync_to_async(TeamFactory)()
+    characters = [await sync_to_async(CharacterFactory)() for _ in range(4)]
+
+    for event_points in [[25, 20, 16, 13], [25, 13, 20, 16]]:
+      game_event = await sync_to_async(GameEventFactory)()
+      participants = [
+        await sync_to_async(GameEventCharacterFactory)(game_event=game_event, character=character)
+        for character in characters
+      ]
+      await ChampionshipPoint.objects.aaward([
+        ChampionshipPoint(
+          championship=championship,
+          participant=participant,
+          team=team if i < 3 else other_team,
+          points=points,
+        )
+        for i, (participant, points) in enumerate(zip(participants, event_points))
+      ])
+    await self.assert_standings_consistent(championship)
+    team_standing = await ChampionshipTeamStanding.objects.aget(team=team)
+    self.assertEqual((team_standing.total_points, team_standing.participations), (90, 6))
+
+    cp = await ChampionshipPoint.objects.filter(team=team).alatest('id')
+    cp.team = other_team
+    cp.points = 1
+    await cp.asave()
+    await self.assert_standings_consistent(championship)
+
+    await ChampionshipPoint.objects.filter(participant__character=characters[0]).adelete()
+    await self.assert_standings_consistent(championship)
+    self.assertFalse(
+      await ChampionshipPersonalStanding.objects.filter(character=characters[0]).aexists()
+    )
+
+    # Deleting a participant or a whole event cascades to its points
+    await participants[1].adelete()
+    await self.assert_standings_consistent(championship)
+    await game_event.adelete()
+    await self.assert_standings_consistent(championship)
+
+    prizes = await championship.calculate_team_prizes()
+    self.assertAlmostEqual(sum(prize for _, prize in prizes), sum(championship.team_prize_by_position[:2]))
+
+class LifetimeEarningsTestCase(TestCase):
+  async def assert_lifetime_earnings(self, player, expected):
+    await player.arefresh_from_db()
+    self.assertEqual(player.lifetime_earnings, expected)
+
+  async def test_kept_in_step_with_deliveries(self):
+    character = await sync_to_async(CharacterFactory)()
+    alt = await sync_to_async(CharacterFactory)(player=character.player)
+    player = character.player
+
+    await sync_to_async(DeliveryFactory)(character=character, payment=1000, subsidy=200)
+    await sync_to_async(DeliveryFactory)(character=alt, payment=500, subsidy=0)
+    delivery = cast(Delivery, await sync_to_async(DeliveryFactory)(character=alt, payment=300, subsidy=50))
+    await self.assert_lifetime_earnings(player, 2050)
+
+    delivery.subsidy = 150
+    await delivery.asave()
+    await self.assert_lifetime_earnings(player, 2150)
+
+    await delivery.adelete()
+    await self.assert_lifetime_earnings(player, 1700)
+
+    await Delivery.objects.filter(character=character).adelete()
+    await self.assert_lifetime_earnings(player, 500)
+
+  async def test_rebuild_lifetime_earnings(self):
+    character = await sync_to_async(CharacterFactory)()
+    other = await sync_to_async(CharacterFactory)()
+    await sync_to_async(DeliveryFactory)(character=character, payment=1000, subsidy=200)
+    await Player.objects.aupdate(lifetime_earnings=99)
+
+    await sync_to_async(Player.objects.rebuild_lifetime_earnings)()
+    await self.assert_lifetime_earnings(character.player, 1200)
+    await self.assert_lifetime_earnings(other.player, 0)
+
+
 class CharacterMangerTestCase(TestCase):
   async def test_change_name(self):
     character1, *_ = await Character.objects.aget_or_create_character_player('test', 123, character_guid=234)
@@ -0,0 +1,56 @@
+from typing import cast, Any
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from ninja.errors import HttpError
+from ninja.testing import TestAsyncClient
+from amc.api.pagination import encode_cursor, decode_cursor, _after
+from amc.api.routes import championships_list_router
+from amc.factories import ChampionshipFactory
+
+
+class CursorTestCase(SimpleTestCase):
+  def test_round_trip(self):
+    cursor = encode_cursor(['2025-01-01 00:00:00.123456+00:00', 7])
+    self.assertEqual(decode_cursor(cursor, 2), ['2025-01-01 00:00:00.123456+00:00', 7])
+
+  def test_invalid(self):
+    for cursor in ['not base64!', encode_cursor({'id': 1}), encode_cursor([1])]:
+      with self.assertRaises(HttpError):
+        decode_cursor(cursor, 2)
+
+  def test_after(self):
+    after = _after(('-created_at', 'id'), ['2025-01-01', 7])
+    self.assertEqual(after, Q(created_at__lt='2025-01-01') | Q(created_at='2025-01-01', id__gt=7))
+
+
+class KeysetPaginationTestCase(TestCase):
+  def setUp(self):
+    self.api_client = TestAsyncClient(championships_list_router)
+
+  async def test_pages(self):
+    for i in range(5):
+      await sync_to_async(ChampionshipFactory)(name=f'Cup {i}')
+
+    response = await cast(Any, self.api_client.get("/?limit=2"))
+    self.assertEqual([c['name'] for c in response.json()], ['Cup 0', 'Cup 1'])
+    link = response['Link']
+    self.assertTrue(link.endswith('; rel="next"'))
+
+    names = []
+    while link:
+      url = '/' + link[link.index('?'):link.index('>')]
+      response = await cast(Any, self.api_client.get(url))
+      names += [c['name'] for c in response.json()]
+      link = response.get('Link')
+    self.assertEqual(names, ['Cup 2', 'Cup 3', 'Cup 4'])
+
+  async def test_offset(self):
+    for i in range(3):
+      await sync_to_async(ChampionshipFactory)(name=f'Cup {i}')
+    response = await cast(Any, self.api_client.get("/?offset=1&limit=1"))
+    self.assertEqual([c['name'] for c in response.json()], ['Cup 1'])
+
+  async def test_invalid_cursor(self):
+    response = await cast(Any, self.api_client.get("/?cursor=nope"))
+    self.assertEqual(response.status_code, 400)
@@ -0,0 +1,139 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from django.utils import timezone
+from amc.factories import (
+  CharacterFactory,
+  GameEventFactory,
+  GameEventCharacterFactory,
+  ScheduledEventFactory,
+)
+from amc.models import (
+  GameEventCharacter,
+  RaceSetup,
+  ScheduledEventPersonalBest,
+  TrackPersonalBest,
+)
+from amc.personal_bests import (
+  rebuild_personal_bests,
+  refresh_game_event_personal_bests,
+)
+
+
+class PersonalBestsTestCase(TestCase):
+  def setUp(self):
+    self.track = RaceSetup.objects.create(hash='track', config={})
+    self.other_track = RaceSetup.objects.create(hash='other', config={})
+    self.race = ScheduledEventFactory(race_setup=self.track)
+    self.characters = [CharacterFactory() for _ in range(4)]
+    self.game_events = [
+      GameEventFactory(scheduled_event=self.race, race_setup=self.track, state=3),
+      GameEventFactory(scheduled_event=self.race, race_setup=self.track, state=3),
+      GameEventFactory(scheduled_event=None, race_setup=self.track, state=3, start_time=timezone.now()),
+      GameEventFactory(scheduled_event=None, race_setup=self.other_track, state=3, start_time=timezone.now()),
+    ]
+    results = [
+      # (game event, character, finished, disqualified, net time)
+      (0, 0, True, False, 120),
+      (1, 0, True, False, 110),
+      (2, 0, True, False, 130),
+      (0, 1, True, True, 90),
+      (1, 1, False, False, None),
+      (2, 1, True, False, 140),
+      (0, 2, False, False, None),
+      (3, 2, True, False, 100),
+      (3, 3, True, False, 95),
+    ]
+    for game_event, character, finished, disqualified, net_time in results:
+      GameEventCharacterFactory(
+        game_event=self.game_events[game_event],
+        character=self.characters[character],
+        finished=finished,
+        disqualified=disqualified,
+        first_section_total_time_seconds=0 if finished else None,
+        last_section_total_time_seconds=net_time,
+      )
+
+  async def assert_consistent(self):
+    for track in [self.track, self.other_track]:
+      expected = {
+        p.character_id: (p.id, p.attempts_count)
+        async for p in GameEventCharacter.objects.best_for_track(track)
+      }
+      actual = {
+        p.character_id: (p.id, p.attempts_count)
+        async for p in GameEventCharacter.objects.results_for_track(track)
+      }
+      self.assertEqual(actual, expected)
+
+    expected = {
+      p.character_id: (p.id, p.attempts_count)
+      async for p in GameEventCharacter.objects.best_for_scheduled_event(self.race)
+    }
+    actual = {
+      p.character_id: (p.id, p.attempts_count)
+      async for p in GameEventCharacter.objects.results_for_scheduled_event(self.race)
+    }
+    self.assertEqual(actual, expected)
+
+  async def test_rebuild_matches_window_functions(self):
+    self.assertEqual(await rebuild_personal_bests(), (2, 1))
+    await self.assert_consistent()
+
+    results = [p async for p in GameEventCharacter.objects.results_for_track(self.track)]
+    self.assertEqual(
+      [(p.character_id, p.net_time, p.attempts_count) for p in results],
+      [(self.characters[0].id, 110, 3), (self.characters[1].id, 140, 1)],
+    )
+
+  async def test_refresh_keeps_tables_consistent(self):
+    await rebuild_personal_bests()
+
+    # A new best time on the track
+    game_event = await sync_to_async(GameEventFactory)(
+      scheduled_event=self.race, race_setup=self.track, state=3
+    )
+    await sync_to_async(GameEventCharacterFactory)(
+      game_event=game_event,
+      character=self.characters[2],
+      finished=True,
+      first_section_total_time_seconds=0,
+      last_section_total_time_seconds=80,
+    )
+    await refresh_game_event_personal_bests(game_event, [self.characters[2].id])
+    await self.assert_consistent()
+
+    # Disqualifying the only finished result on the other track removes it
+    participant = await GameEventCharacter.objects.aget(
+      game_event=self.game_events[3],
+      character=self.characters[3],
+    )
+    participant.disqualified = True
+    await participant.asave()
+    await refresh_game_event_personal_bests(self.game_events[3])
+    await self.assert_consistent()
+    self.assertFalse(
+      await TrackPersonalBest.objects.filter(character=self.characters[3]).aexists()
+    )
+
+  def test_deletes_promote_the_next_best(self):
+    async_to_sync(rebuild_personal_bests)()
+
+    # Character 0's best, 110 in the second race, is deleted on its own
+    participant = GameEventCharacter.objects.get(game_event=self.game_events[1], character=self.characters[0])
+    with self.captureOnCommitCallbacks(execute=True):
+      participant.delete()
+    async_to_sync(self.assert_consistent)()
+    personal_best = TrackPersonalBest.objects.get(race_setup=self.track, character=self.characters[0])
+    self.assertEqual(personal_best.net_time, 120)
+    personal_best = ScheduledEventPersonalBest.objects.get(scheduled_event=self.race, character=self.characters[0])
+    self.assertEqual(personal_best.participant.game_event_id, self.game_events[0].id)
+
+    # and then with its game event, which was character 0's last in the race
+    with self.captureOnCommitCallbacks(execute=True):
+      self.game_events[0].delete()
+    async_to_sync(self.assert_consistent)()
+    personal_best = TrackPersonalBest.objects.get(race_setup=self.track, character=self.characters[0])
+    self.assertEqual(personal_best.net_time, 130)
+    self.assertFalse(
+      ScheduledEventPersonalBest.objects.filter(scheduled_event=self.race, character=self.characters[0]).exists()
+    )
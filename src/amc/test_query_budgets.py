@@ -0,0 +1,516 @@
+import os
+import json
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import cast, Any, AsyncIterator
+from unittest.mock import patch, AsyncMock, MagicMock
+from urllib.parse import quote
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from ninja.testing import TestAsyncClient, TestClient
+from amc.api import routes
+from amc.query_budget import query_budget, track_queries, QueryBudgetExceeded
+from amc.factories import (
+  PlayerFactory,
+  CharacterFactory,
+  TeamFactory,
+  GameEventFactory,
+  GameEventCharacterFactory,
+  ChampionshipFactory,
+  ChampionshipPointFactory,
+  CargoFactory,
+  DeliveryPointFactory,
+  DeliveryJobFactory,
+  DeliveryJobTemplateFactory,
+  DeliveryFactory,
+  SubsidyRuleFactory,
+  MinistryTermFactory,
+)
+from amc.models import (
+  Character,
+  CharacterLocation,
+  Company,
+  DeliveryPointStorage,
+  DeliveryPointStorageLevel,
+  LapSectionTime,
+  MinistryCandidacy,
+  MinistryElection,
+  MinistryVote,
+  PlayerRestockDepotLog,
+  RaceSetup,
+  VehicleDecal,
+)
+from amc.personal_bests import refresh_game_event_personal_bests
+from amc.locations import monitor_locations
+from amc.events import monitor_events, send_event_embeds
+from amc.ubi import handout_ubi
+from amc.deliverypoints import monitor_deliverypoints, rollup_storage_levels
+from amc.jobs import monitor_jobs
+from amc.status import monitor_server_status
+from amc_finance.models import Account
+from amc_finance.services import apply_interest_to_bank_accounts
+
+ROUTE_CONFIG = {
+  'Route': {'RouteName': 'Budget Ring', 'Waypoints': []},
+  'NumLaps': 1,
+  'VehicleKeys': [],
+  'EngineKeys': [],
+}
+
+
+@asynccontextmanager
+async def fake_server(routes_by_path):
+  """Serves a JSON body per path, and yields a client session for it"""
+  app = web.Application()
+  for path, body in routes_by_path.items():
+    async def handler(request, body=body):
+      return web.json_response(body)
+    app.router.add_get(path, handler)
+
+  async with TestServer(app) as server:
+    async with aiohttp.ClientSession(base_url=str(server.make_url(''))) as session:
+      yield session
+
+
+class QueryBudgetTestCase(TestCase):
+  async def test_counts_queries(self):
+    with query_budget(2, strict=True) as stats:
+      await Character.objects.acount()
+      await Character.objects.filter(name='x').acount()
+    self.assertEqual(stats.count, 2)
+
+  async def test_strict_budget_raises(self):
+    with self.assertRaises(QueryBudgetExceeded):
+      with query_budget(1, 'two counts', strict=True):
+        await Character.objects.acount()
+        await Character.objects.acount()
+
+  async def test_logs_offenders(self):
+    with self.assertLogs('amc.query_budget', level='WARNING') as logs:
+      with query_budget(0, 'one count'):
+        await Character.objects.acount()
+    self.assertIn('one count made 1 queries', logs.output[0])
+
+  async def test_decorator(self):
+    @query_budget(0, strict=True)
+    async def count_characters():
+      return await Character.objects.acount()
+
+    with track_queries() as outer:
+      with self.assertRaises(QueryBudgetExceeded):
+        await count_characters()
+    self.assertEqual(outer.count, 1)
+
+
+class APIQueryBudgetTestCase(TestCase):
+  """
+  Every endpoint is called against several rows of data, with a ceiling
+  below what a query per row would cost.
+  """
+
+  def setUp(self):
+    now = timezone.now()
+    self.players = PlayerFactory.create_batch(3)
+    self.characters = [player.characters.first() for player in self.players]
+    for character in self.characters:
+      CharacterLocation.objects.create(character=character, location=Point(1, 1, 1))
+      PlayerRestockDepotLog.objects.create(character=character, timestamp=now, depot_name='depot')
+      Company.objects.create(name=character.name, owner=character, is_corp=False, first_seen_at=now)
+
+    self.team = TeamFactory()
+    self.team.players.add(*self.players)
+
+    self.race_setup = RaceSetup.objects.create(hash='budgetring', config=ROUTE_CONFIG, name='Budget Ring')
+    self.game_event = GameEventFactory(state=3, race_setup=self.race_setup)
+    participants = [
+      GameEventCharacterFactory(game_event=self.game_event, character=character)
+      for character in self.characters
+    ]
+    for participant in participants:
+      LapSectionTime.objects.create(
+        game_event_character=participant,
+        section_index=0,
+        lap=0,
+        rank=1,
+        total_time_seconds=10.0,
+      )
+    async_to_sync(refresh_game_event_personal_bests)(self.game_event)
+    self.participant = participants[0]
+
+    self.championship = ChampionshipFactory()
+    for participant in participants:
+      ChampionshipPointFactory(championship=self.championship, participant=participant, team=self.team)
+
+    self.cargos = [CargoFactory(key=f'C::Budget{i}', label=f'Budget {i}') for i in range(3)]
+    self.delivery_points = DeliveryPointFactory.create_batch(3, name='Budget Point')
+    for job in DeliveryJobFactory.create_batch(3):
+      job.cargos.add(*self.cargos)
+      job.source_points.add(self.delivery_points[0])
+      job.destination_points.add(self.delivery_points[1])
+      for character in self.characters:
+        DeliveryFactory(character=character, job=job, timestamp=now)
+
+    for _ in range(3):
+      rule = SubsidyRuleFactory()
+      rule.cargos.add(*self.cargos)
+      rule.source_delivery_points.add(self.delivery_points[0])
+      rule.destination_delivery_points.add(self.delivery_points[1])
+
+    MinistryTermFactory(minister=self.players[0])
+
+    for _ in range(2):
+      election = MinistryElection.objects.create(
+        candidacy_end_at=now - timedelta(days=1),
+        poll_end_at=now + timedelta(days=1),
+      )
+      candidacies = [
+        MinistryCandidacy.objects.create(election=election, candidate=player)
+        for player in self.players
+      ]
+      for player, candidacy in zip(self.players, candidacies):
+        MinistryVote.objects.create(election=election, voter=player, candidate=candidacy)
+    self.election = election
+
+    for i, player in enumerate(self.players):
+      VehicleDecal.objects.create(name=f'Decal {i}', hash=f'budget{i}', player=player, private=False)
+
+  async def assertWithinBudget(self, router, url, max_queries):
+    with query_budget(max_queries, url, strict=True):
+      response = await cast(Any, TestAsyncClient(router).get(url))
+    self.assertEqual(response.status_code, 200, url)
+    return response
+
+  async def test_players(self):
+    unique_id = self.players[0].unique_id
+    with patch('amc.api.routes.get_players', new_callable=AsyncMock) as mock_get_players:
+      mock_get_players.return_value = [{'name': 'freeman', 'unique_id': '1'}]
+      await self.assertWithinBudget(routes.players_router, '/', 0)
+    await self.assertWithinBudget(routes.players_router, f'/{unique_id}/', 2)
+    await self.assertWithinBudget(routes.players_router, f'/{unique_id}/characters/', 1)
+    await self.assertWithinBudget(routes.players_router, f'/{unique_id}/results/', 1)
+    await self.assertWithinBudget(routes.characters_router, f'/{self.characters[0].id}/', 1)
+
+  async def test_player_me(self):
+    user = await get_user_model().objects.acreate(username='budget')
+    self.players[0].user = user
+    await self.players[0].asave(update_fields=['user'])
+    with query_budget(2, strict=True):
+      player = await routes.get_player_me(SimpleNamespace(auth=user))
+    self.assertEqual(player.pk, self.players[0].pk)
+
+  async def test_player_positions(self):
+    request = SimpleNamespace(state={'aiohttp_client': None})
+    players = [{'PlayerName': 'freeman', 'Location': {'X': 1, 'Y': 2, 'Z': 3}, 'VehicleKey': 'Fortem', 'UniqueID': '1'}]
+    with patch('amc.api.routes.get_players_mod', new_callable=AsyncMock, return_value=players):
+      with query_budget(0, strict=True):
+        response = await routes.streaming_player_positions(request)
+        chunk = await anext(aiter(cast(AsyncIterator[bytes], response.streaming_content)))
+    self.assertIn(b'freeman', chunk)
+
+  async def test_character_locations(self):
+    with query_budget(3, strict=True):
+      response = await routes.player_locations(
+        SimpleNamespace(),
+        start_time=timezone.now() - timedelta(days=1),
+        end_time=timezone.now() + timedelta(minutes=1),
+      )
+      streaming_content = cast(AsyncIterator[bytes], response.streaming_content)
+      content = b''.join([chunk async for chunk in streaming_content])
+    self.assertEqual(len(json.loads(content)), 3)
+
+  async def test_stats(self):
+    await self.assertWithinBudget(routes.stats_router, '/depots_restocked_leaderboard/', 1)
+    await self.assertWithinBudget(routes.deliveries_stats_router, '/', 1)
+    await self.assertWithinBudget(routes.passenger_stats_router, '/', 1)
+
+  async def test_race_setups(self):
+    await self.assertWithinBudget(routes.race_setups_router, f'/{self.race_setup.hash}/', 1)
+    await self.assertWithinBudget(routes.race_setups_list_router, '/', 1)
+
+  async def test_teams(self):
+    await self.assertWithinBudget(routes.teams_router, '/', 3)
+    await self.assertWithinBudget(routes.teams_router, f'/{self.team.id}/', 3)
+
+  async def test_results(self):
+    scheduled_event_id = self.game_event.scheduled_event_id
+    await self.assertWithinBudget(routes.scheduled_events_router, '/', 1)
+    await self.assertWithinBudget(routes.scheduled_events_router, f'/{scheduled_event_id}/', 1)
+    await self.assertWithinBudget(routes.scheduled_events_router, f'/{scheduled_event_id}/results/', 2)
+    await self.assertWithinBudget(routes.tracks_router, f'/{self.race_setup.hash}/results/', 2)
+    await self.assertWithinBudget(routes.results_router, f'/{self.participant.id}/lap_section_times/', 1)
+    await self.assertWithinBudget(routes.results_router, f'/splits/?game_event_id={self.game_event.id}', 1)
+
+  async def test_championships(self):
+    await self.assertWithinBudget(routes.championships_router, f'/{self.championship.id}/personal_standings/', 1)
+    await self.assertWithinBudget(routes.championships_router, f'/{self.championship.id}/team_standings/', 1)
+    await self.assertWithinBudget(routes.championships_list_router, '/', 1)
+
+  async def test_deliverypoints(self):
+    guid = self.delivery_points[0].guid
+    start_time = quote((timezone.now() - timedelta(days=1)).isoformat())
+    end_time = quote(timezone.now().isoformat())
+    await self.assertWithinBudget(routes.deliverypoints_router, '/', 1)
+    await self.assertWithinBudget(routes.deliverypoints_router, f'/{guid}/', 1)
+    await self.assertWithinBudget(
+      routes.deliverypoints_router,
+      f'/{guid}/storages/C::Budget0/levels/?start_time={start_time}&end_time={end_time}',
+      1,
+    )
+    await self.assertWithinBudget(
+      routes.deliverypoints_router,
+      f'/{guid}/storages/C::Budget0/levels/hourly/?start_time={start_time}&end_time={end_time}',
+      1,
+    )
+
+  async def test_deliveryjobs(self):
+    response = await self.assertWithinBudget(routes.deliveryjobs_router, '/', 5)
+    self.assertEqual(len(response.json()), 3)
+
+  async def test_subsidies(self):
+    await self.assertWithinBudget(routes.cargos_router, '/', 1)
+    await self.assertWithinBudget(routes.subsidies_rules_router, '/', 6)
+    await self.assertWithinBudget(routes.subsidy_areas_router, '/', 1)
+    response = await self.assertWithinBudget(routes.app_router, '/subsidies/', 6)
+    self.assertIn('Budget Point', response.json()['subsidies_text'])
+
+  async def test_ministry(self):
+    await self.assertWithinBudget(routes.ministry_router, '/current/', 1)
+    response = await self.assertWithinBudget(routes.ministry_elections_router, '/', 3)
+    self.assertEqual(
+      [candidate['vote_count'] for candidate in response.json()[0]['candidates']],
+      [1, 1, 1],
+    )
+    await self.assertWithinBudget(routes.ministry_elections_router, f'/{self.election.id}/', 3)
+
+  async def test_community(self):
+    await self.assertWithinBudget(routes.companies_router, '/', 1)
+    await self.assertWithinBudget(routes.decals_router, '/', 1)
+    await self.assertWithinBudget(routes.dealerships_router, '/', 1)
+    await self.assertWithinBudget(routes.commands_list_router, '/', 0)
+
+
+class FileAPIQueryBudgetTestCase(SimpleTestCase):
+  """The save file and route info endpoints read files and never the database"""
+
+  def setUp(self):
+    self.api_client = TestClient(routes.app_router)
+
+  def assertNoQueries(self, url):
+    with query_budget(0, url, strict=True):
+      response = self.api_client.get(url)
+    self.assertEqual(response.status_code, 200, url)
+    return response
+
+  @patch('amc.api.routes.get_housings', return_value={})
+  @patch('amc.api.routes.get_save_character', return_value={})
+  @patch('amc.api.routes.get_world', return_value={})
+  def test_save_file(self, *mocks):
+    self.assertNoQueries('/world/')
+    self.assertNoQueries('/housing/')
+
+  def test_route_info(self):
+    with tempfile.TemporaryDirectory() as data_path:
+      os.makedirs(os.path.join(data_path, 'routes'))
+      with open(os.path.join(data_path, 'routes', 'budgetring.json'), 'w') as f:
+        json.dump(ROUTE_CONFIG, f)
+      with patch('amc.api.routes.DATA_PATH', data_path):
+        self.assertNoQueries('/active_events')
+        response = self.assertNoQueries('/route_info/budgetring/laps/1')
+    self.assertEqual(response.json()['best_times'], [])
+
+
+class FakeChannel:
+  def __init__(self):
+    self.send = AsyncMock(return_value=SimpleNamespace(id=1))
+    self.delete_messages = AsyncMock()
+    self.partial_message = MagicMock()
+    self.partial_message.edit = AsyncMock()
+
+  def get_partial_message(self, message_id):
+    return self.partial_message
+
+  async def history(self, limit=None):
+    for message in []:
+      yield message
+
+
+class CronQueryBudgetTestCase(TestCase):
+  """
+  Crons are run against several rows of data. Crons that are still
+  written per row get a per-row allowance, the rest a fixed ceiling.
+  """
+
+  async def test_monitor_locations(self):
+    characters = [await sync_to_async(CharacterFactory)(guid=f'{i}' * 32) for i in range(3)]
+    players = [
+      {
+        'PlayerName': character.name,
+        'CharacterGuid': character.guid,
+        'Location': {'X': 1.0, 'Y': 2.0, 'Z': 3.0},
+        'VehicleKey': 'Fortem',
+      }
+      for character in characters
+    ]
+    async with fake_server({'/players': {'data': players}}) as http_client_mod:
+      # Character, last location and new location, per player
+      with query_budget(3 * len(players), strict=True):
+        await monitor_locations({'http_client_mod': http_client_mod})
+    self.assertEqual(await CharacterLocation.objects.acount(), 3)
+
+  async def test_monitor_events_is_constant_in_participants(self):
+    def make_player(i, **kwargs):
+      return {
+        'LastSectionTotalTimeSeconds': 0.0, 'SectionIndex': -1, 'BestLapTime': 0.0, 'bFinished': False,
+        'bWrongVehicle': False, 'LapTimes': {}, 'PlayerName': f'racer{i}', 'bWrongEngine': False,
+        'bDisqualified': False, 'Rank': i + 1, 'Laps': 0,
+        'CharacterId': {'UniqueNetId': str(1000 + i), 'CharacterGuid': f'{i:032d}'},
+        **kwargs,
+      }
+
+    def make_event(guid, num_players, **kwargs):
+      players = [make_player(i, **kwargs) for i in range(num_players)]
+      return {
+        'Players': players,
+        'OwnerCharacterId': players[0]['CharacterId'],
+        'EventType': 1, 'EventGuid': guid, 'EventName': 'Race',
+        'RaceSetup': {'VehicleKeys': {}, 'Route': {'Waypoints': [], 'RouteName': 'Route'}, 'EngineKeys': {}, 'NumLaps': 1},
+        'State': 2, 'bInCountdown': False,
+      }
+
+    ctx = {'discord_client': MagicMock(get_cog=MagicMock(return_value=None))}
+    counts = []
+    for guid, num_players in [('A' * 32, 3), ('B' * 32, 6)]:
+      async with fake_server({'/events': {'data': [make_event(guid, num_players)]}}) as http_client:
+        await monitor_events(ctx, http_client)
+      event = make_event(guid, num_players, SectionIndex=0, Laps=1, LastSectionTotalTimeSeconds=10.0)
+      async with fake_server({'/events': {'data': [event]}}) as http_client:
+        with query_budget(30, strict=True) as stats:
+          await monitor_events(ctx, http_client)
+      counts.append(stats.count)
+
+    self.assertEqual(await LapSectionTime.objects.acount(), 9)
+    self.assertEqual(counts[0], counts[1])
+
+  async def test_send_event_embeds(self):
+    race_setup = await RaceSetup.objects.acreate(hash='budgetring', config=ROUTE_CONFIG)
+    game_events = []
+    for i in range(3):
+      game_event = await sync_to_async(GameEventFactory)(guid=f'event{i}', state=2, race_setup=race_setup)
+      for _ in range(3):
+        await sync_to_async(GameEventCharacterFactory)(game_event=game_event, finished=False)
+      game_events.append(game_event)
+
+    discord_client = MagicMock(loop=asyncio.get_running_loop())
+    discord_client.is_ready.return_value = True
+    discord_client.get_channel.return_value = FakeChannel()
+    scheduled = []
+    events = {'data': [{'EventGuid': game_event.guid} for game_event in game_events]}
+    async with fake_server({'/events': events}) as http_client:
+      with patch('asyncio.run_coroutine_threadsafe', side_effect=lambda coro, loop: scheduled.append(coro)):
+        with query_budget(6, strict=True):
+          await send_event_embeds({'http_client_event_mod': http_client, 'discord_client': discord_client})
+          await asyncio.gather(*scheduled)
+    self.assertEqual(len(scheduled), 5)
+
+  @patch('amc.ubi.transfer_money', new_callable=AsyncMock)
+  @patch('amc.ubi.get_players', new_callable=AsyncMock)
+  async def test_handout_ubi(self, mock_get_players, mock_transfer_money):
+    characters = [
+      await sync_to_async(CharacterFactory)(driver_level=100, guid=f'{i}' * 32)
+      for i in range(5)
+    ]
+    mock_get_players.return_value = [
+      (f"player-{character.guid}", {'character_guid': character.guid})
+      for character in characters
+    ]
+    with query_budget(20, strict=True):
+      await handout_ubi({}, rate_limit=1000)
+    self.assertEqual(mock_transfer_money.await_count, 5)
+
+  async def test_apply_interest_to_bank_accounts(self):
+    accounts = []
+    for _ in range(3):
+      character = await sync_to_async(CharacterFactory)()
+      accounts.append(await Account.objects.acreate(
+        account_type=Account.AccountType.LIABILITY,
+        book=Account.Book.BANK,
+        character=character,
+        balance=Decimal(1000),
+      ))
+    # Last location and journal entry, per account
+    with query_budget(6 + 8 * len(accounts), strict=True):
+      await apply_interest_to_bank_accounts({})
+
+  @patch('amc.deliverypoints.get_deliverypoints', new_callable=AsyncMock)
+  async def test_monitor_deliverypoints(self, mock_get_deliverypoints):
+    delivery_points = [await sync_to_async(DeliveryPointFactory)(guid=f'dp{i}', name=f'dp{i}') for i in range(3)]
+    mock_get_deliverypoints.return_value = {'data': {
+      str(i): {
+        'guid': delivery_point.guid.upper(),
+        'InputInventory': {'0': {'cargo': {'name': 'Coal'}, 'amount': i}},
+        'OutputInventory': {'0': {'cargo': {'name': 'Oranges'}, 'amount': i}},
+        'Deliveries': {},
+      }
+      for i, delivery_point in enumerate(delivery_points)
+    }}
+    with query_budget(6, strict=True):
+      result = await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(result['delivery_points_changed'], 3)
+    with query_budget(3, strict=True):
+      result = await monitor_deliverypoints({'http_client': None})
+    self.assertEqual(result['delivery_points_changed'], 0)
+
+  async def test_rollup_storage_levels(self):
+    delivery_point = await sync_to_async(DeliveryPointFactory)()
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    for i in range(3):
+      storage = await DeliveryPointStorage.objects.acreate(
+        delivery_point=delivery_point,
+        kind=DeliveryPointStorage.Kind.INPUT,
+        cargo_key=f'Budget{i}',
+        amount=10,
+      )
+      for minute in range(3):
+        await DeliveryPointStorageLevel.objects.acreate(
+          storage=storage,
+          timestamp=hour + timedelta(minutes=minute),
+          amount=minute,
+        )
+    with query_budget(3, strict=True):
+      self.assertEqual(await rollup_storage_levels({}), 3)
+
+  @patch('amc.jobs.announce', new_callable=AsyncMock)
+  @patch('amc.jobs.get_players', new_callable=AsyncMock)
+  async def test_monitor_jobs(self, mock_get_players, mock_announce):
+    mock_get_players.return_value = []
+    cargo = await sync_to_async(CargoFactory)(key='C::Budget', label='Budget')
+    delivery_points = [await sync_to_async(DeliveryPointFactory)() for _ in range(2)]
+    for _ in range(3):
+      await sync_to_async(DeliveryJobTemplateFactory)(
+        cargos=[cargo],
+        source_points=[delivery_points[0]],
+        destination_points=[delivery_points[1]],
+      )
+    with query_budget(30, strict=True):
+      await monitor_jobs({'http_client': None})
+
+  @patch('amc.status.get_players', new_callable=AsyncMock, return_value=[])
+  @patch('amc.status.get_status', new_callable=AsyncMock, return_value={'FPS': 30})
+  async def test_monitor_server_status(self, *mocks):
+    with query_budget(1, strict=True):
+      await monitor_server_status({'http_client': None, 'http_client_mod': None})
+
+  async def test_record_queue_depths(self):
+    from amc_backend.worker import record_queue_depths
+    with query_budget(0, strict=True):
+      await record_queue_depths({})
@@ -0,0 +1,67 @@
+import asyncio
+from django.test import SimpleTestCase
+from amc.shared_cache import SharedCache, LocalBackend
+
+
+class Counter:
+  def __init__(self, delay=0.0):
+    self.calls = 0
+    self.delay = delay
+
+  async def __call__(self):
+    self.calls += 1
+    await asyncio.sleep(self.delay)
+    return self.calls
+
+
+class SharedCacheTestCase(SimpleTestCase):
+  def setUp(self):
+    self.backend = LocalBackend()
+    self.cache = SharedCache(backend=self.backend)
+
+  async def test_hit_after_miss(self):
+    compute = Counter()
+    self.assertEqual(await self.cache.get_or_set('key', compute, ttl=60), 1)
+    self.assertEqual(await self.cache.get_or_set('key', compute, ttl=60), 1)
+    self.assertEqual(compute.calls, 1)
+
+  async def test_concurrent_callers_coalesce(self):
+    compute = Counter(delay=0.05)
+    # Two caches on one backend stand for two processes
+    other_process = SharedCache(backend=self.backend)
+    values = await asyncio.gather(*[
+      cache.get_or_set('key', compute, ttl=60)
+      for cache in [self.cache, other_process] * 5
+    ])
+    self.assertEqual(values, [1] * 10)
+    self.assertEqual(compute.calls, 1)
+
+  async def test_stale_while_revalidate(self):
+    compute = Counter(delay=0.05)
+    await self.cache.get_or_set('key', compute, ttl=0.01, stale_ttl=60)
+    await asyncio.sleep(0.02)
+
+    values = await asyncio.gather(*[
+      self.cache.get_or_set('key', compute, ttl=0.01, stale_ttl=60)
+      for _ in range(5)
+    ])
+    # Served stale while one refresh runs in the background
+    self.assertEqual(values, [1] * 5)
+    await asyncio.sleep(0.1)
+    self.assertEqual(compute.calls, 2)
+    self.assertEqual(await self.cache.get_or_set('key', compute, ttl=60), 2)
+
+  async def test_caches_none(self):
+    calls = []
+    async def compute():
+      calls.append(1)
+    await self.cache.get_or_set('key', compute, ttl=60)
+    self.assertIsNone(await self.cache.get_or_set('key', compute, ttl=60))
+    self.assertEqual(len(calls), 1)
+
+  async def test_without_backend(self):
+    cache = SharedCache()
+    compute = Counter()
+    await cache.get_or_set('key', compute, ttl=60)
+    await cache.get_or_set('key', compute, ttl=60)
+    self.assertEqual(compute.calls, 2)
@@ -0,0 +1,109 @@
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import timedelta
+from unittest.mock import patch, AsyncMock
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.gis.geos import Point
+from amc.factories import CharacterFactory
+from amc.models import CharacterLocation
+from amc.ubi import handout_ubi, run_rate_limited, ACTIVE_GRANT_AMOUNT, AFK_GRANT_AMOUNT, MAX_LEVEL
+from amc_finance.models import Account, JournalEntry
+from amc_finance.accounts import aget_account_balance
+
+
+class UBITestCase(TestCase):
+  def setUp(self):
+    self.active = CharacterFactory(driver_level=100, guid='active')
+    self.afk = CharacterFactory(driver_level=400, ubi_multiplier=0.5, guid='afk')
+    self.teleporter = CharacterFactory(driver_level=800, guid='teleporter')
+    self.offline = CharacterFactory(driver_level=200, guid='offline')
+    self.rejecting = CharacterFactory(driver_level=200, reject_ubi=True, guid='rejecting')
+    self.new_driver = CharacterFactory(driver_level=None, guid='new')
+    paths = [
+      (self.active, [(0, 0), (600, 0), (1200, 0)]),
+      (self.afk, [(0, 0), (10, 0), (20, 10)]),
+      (self.teleporter, [(0, 0), (50_000, 0)]),
+    ]
+    for character, points in paths:
+      for x, y in points:
+        CharacterLocation.objects.create(character=character, location=Point(x, y, 0))
+    self.characters = [
+      self.active, self.afk, self.teleporter, self.offline, self.rejecting, self.new_driver
+    ]
+
+  async def test_characters_activity(self):
+    now = timezone.now()
+    activity = await CharacterLocation.get_characters_activity(
+      self.characters,
+      now - timedelta(minutes=20),
+      now + timedelta(minutes=1),
+    )
+    self.assertEqual(activity, {
+      self.active.id: (True, True),
+      self.afk.id: (True, False),
+      # The single 50km jump is a teleport, not driving
+      self.teleporter.id: (True, False),
+      self.offline.id: (False, False),
+      self.rejecting.id: (False, False),
+      self.new_driver.id: (False, False),
+    })
+
+  @patch('amc.ubi.transfer_money', new_callable=AsyncMock)
+  @patch('amc.ubi.get_players', new_callable=AsyncMock)
+  async def test_handout_ubi(self, mock_get_players, mock_transfer_money):
+    mock_get_players.return_value = [
+      (f"player-{character.guid}", {'character_guid': character.guid})
+      for character in self.characters
+    ]
+    with patch('amc.ubi.timezone.now', return_value=timezone.now() + timedelta(seconds=1)):
+      await handout_ubi({}, rate_limit=1000)
+
+    def amount(grant, driver_level, multiplier=1):
+      grant = Decimal(str(grant))
+      return min(grant, driver_level * grant * Decimal(str(multiplier)) / MAX_LEVEL)
+
+    expected = {
+      f"player-{self.active.guid}": amount(ACTIVE_GRANT_AMOUNT, 100),
+      f"player-{self.afk.guid}": amount(AFK_GRANT_AMOUNT, 400, 0.5),
+      f"player-{self.teleporter.guid}": amount(AFK_GRANT_AMOUNT, 800),
+      f"player-{self.offline.guid}": amount(AFK_GRANT_AMOUNT, 200),
+    }
+    transfers = {
+      call.args[3]: call.args[1]
+      for call in mock_transfer_money.await_args_list
+    }
+    self.assertEqual(transfers, {player_id: int(a) for player_id, a in expected.items()})
+
+    total = sum(a.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) for a in expected.values())
+    treasury_expenses = await Account.objects.aget(name='Treasury Expenses')
+    treasury_fund = await Account.objects.aget(name='Treasury Fund')
+    self.assertEqual(await aget_account_balance(treasury_expenses), total)
+    self.assertEqual(await aget_account_balance(treasury_fund), -total)
+    self.assertEqual(
+      await JournalEntry.objects.filter(description='Universal Basic Income').acount(),
+      len(expected),
+    )
+
+  async def test_run_rate_limited(self):
+    running = 0
+    max_running = 0
+
+    async def job(i):
+      nonlocal running, max_running
+      running += 1
+      max_running = max(max_running, running)
+      await sync_to_async(lambda: None)()
+      running -= 1
+      if i == 2:
+        raise ValueError(i)
+      return i
+
+    results = await run_rate_limited(
+      [lambda i=i: job(i) for i in range(5)],
+      rate_limit=1000,
+      concurrency=2,
+    )
+    self.assertEqual(results[:2], [0, 1])
+    self.assertIsInstance(results[2], ValueError)
+    self.assertLessEqual(max_running, 2)
@@ -0,0 +1,65 @@
+import time
+import asyncio
+from unittest.mock import patch, AsyncMock, MagicMock
+from django.test import SimpleTestCase
+from amc.webhook_consumer import WebhookConsumer
+
+
+def make_events(*timestamps):
+  return [{'hook': 'ServerCargoArrived', 'timestamp': timestamp, 'data': {}} for timestamp in timestamps]
+
+
+class WebhookConsumerTestCase(SimpleTestCase):
+  @patch('amc.webhook_consumer.process_events', new_callable=AsyncMock)
+  @patch('amc.webhook_consumer.get_webhook_events2', new_callable=AsyncMock)
+  async def test_processes_fetched_batches(self, mock_get_events, mock_process_events):
+    now = time.time()
+    batches = [make_events(now - 3, now - 2), make_events(now - 1)]
+    mock_get_events.side_effect = lambda session: batches.pop(0) if batches else []
+    redis = MagicMock(get=AsyncMock(return_value=None), set=AsyncMock())
+
+    consumer = WebhookConsumer('main', MagicMock(), redis=redis, min_poll_interval=0.01)
+    await consumer.start()
+    while consumer.processed_events < 3:
+      await asyncio.sleep(0.01)
+    await consumer.stop()
+
+    processed = [event for call in mock_process_events.await_args_list for event in call.args[0]]
+    self.assertEqual([event['timestamp'] for event in processed], [now - 3, now - 2, now - 1])
+    self.assertEqual(consumer.cursor, now - 1)
+    self.assertGreaterEqual(consumer.max_lag_seconds or 0, 3)
+    redis.set.assert_awaited_with('webhook_consumer:main:cursor', now - 1)
+
+  @patch('amc.webhook_consumer.get_webhook_events2', new_callable=AsyncMock)
+  async def test_adaptive_polling(self, mock_get_events):
+    consumer = WebhookConsumer('main', MagicMock(), min_poll_interval=0.5, max_poll_interval=4)
+
+    mock_get_events.return_value = []
+    intervals = []
+    for _ in range(5):
+      await consumer.fetch()
+      intervals.append(consumer.poll_interval)
+    self.assertEqual(intervals, [1, 2, 4, 4, 4])
+
+    # Polls again right away while events keep coming
+    mock_get_events.return_value = make_events(time.time())
+    await consumer.fetch()
+    self.assertEqual(consumer.poll_interval, 0)
+
+    # Fetch errors back off like an empty buffer
+    mock_get_events.side_effect = Exception('Connection refused')
+    await consumer.fetch()
+    self.assertEqual(consumer.poll_interval, 0.5)
+
+  @patch('amc.webhook_consumer.get_webhook_events2', new_callable=AsyncMock)
+  async def test_backpressure(self, mock_get_events):
+    mock_get_events.return_value = make_events(time.time())
+    consumer = WebhookConsumer('main', MagicMock(), queue_size=2)
+    await consumer.fetch()
+    await consumer.fetch()
+    with self.assertRaises(asyncio.TimeoutError):
+      await asyncio.wait_for(consumer.fetch(), 0.05)
+    self.assertEqual(consumer.queue.qsize(), 2)
+
+    events, batch_count = consumer.next_batch(consumer.queue.get_nowait())
+    self.assertEqual((len(events), batch_count), (2, 2))
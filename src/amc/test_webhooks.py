@@ -8,7 +8,7 @@ from django.contrib.gis.geos import Point
 import unittest
 from asgiref.sync import sync_to_async
 from amc.factories import PlayerFactory, CharacterFactory
-from amc.webhook import process_events, process_event
+from amc.webhook import process_events, process_event, handle_contract_deliveries
 from amc.models import (
   DeliveryPoint,
   ServerCargoArrivedLog,
@@ -293,6 +293,45 @@ class ProcessEventTests(TestCase):
       self.assertEqual(log.finished_amount, 2)
       self.assertTrue(log.delivered)
 
+  async def test_contract_deliveries_batch(self, mock_get_treasury, mock_get_rp_mode):
+      player = await sync_to_async(PlayerFactory)()
+      log = await ServerSignContractLog.objects.acreate(
+          guid="contract_guid_123",
+          player=player,
+          cargo_key="sand",
+          amount=2,
+          finished_amount=0,
+          payment=50000,
+          cost=1000,
+          timestamp=timezone.now()
+      )
+      contracts = [
+          {'ContractGuid': "contract_guid_123"},
+          {'ContractGuid': "contract_guid_123"},
+          {'ContractGuid': "contract_guid_123"},
+          # Unknown contract with its details is created
+          {'ContractGuid': "contract_guid_456", 'Item': 'sand', 'Amount': 1, 'CompletionPayment': 20000},
+          # Unknown contract without details is ignored
+          {'ContractGuid': "contract_guid_789"},
+      ]
+
+      payment = await handle_contract_deliveries(contracts, player, timezone.now())
+      self.assertEqual(payment, 70000)
+      await log.arefresh_from_db()
+      self.assertEqual(log.finished_amount, 3)
+      self.assertTrue(log.delivered)
+      new_log = await ServerSignContractLog.objects.aget(guid="contract_guid_456")
+      self.assertTrue(new_log.delivered)
+      self.assertFalse(await ServerSignContractLog.objects.filter(guid="contract_guid_789").aexists())
+
+      # Completed contracts are only paid once
+      payment = await handle_contract_deliveries(contracts[:1], player, timezone.now())
+      self.assertEqual(payment, 0)
+      # and contracts created from event data are only created once
+      payment = await handle_contract_deliveries(contracts[3:4], player, timezone.now())
+      self.assertEqual(payment, 0)
+      self.assertEqual(await ServerSignContractLog.objects.filter(guid="contract_guid_456").acount(), 1)
+
 
 @patch('amc.webhook.get_rp_mode', new_callable=AsyncMock)
 @patch('amc.webhook.get_treasury_fund_balance', new_callable=AsyncMock)
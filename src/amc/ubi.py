@@ -1,4 +1,5 @@
 import asyncio
+import logging
 from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
@@ -8,41 +9,91 @@ from amc.models import (
 )
 from amc.game_server import get_players
 from amc.mod_server import transfer_money
-from amc_finance.services import send_fund_to_player_wallet
+from amc_finance.services import send_funds_to_player_wallets
+
+logger = logging.getLogger(__name__)
 
 TASK_FREQUENCY = 20 # minutes
 ACTIVE_GRANT_AMOUNT = 18_000 / (60 / TASK_FREQUENCY)
 AFK_GRANT_AMOUNT = 6_000 / (60 / TASK_FREQUENCY)
 MAX_LEVEL = 400
+TRANSFER_RATE_LIMIT = 5 # transfers started per second
+TRANSFER_CONCURRENCY = 4
+
+
+def calculate_ubi_amount(character, is_active):
+  if is_active:
+    grant_amount = ACTIVE_GRANT_AMOUNT
+  else:
+    grant_amount = AFK_GRANT_AMOUNT
+  # ubi_multiplier is a float, which Decimal arithmetic refuses
+  multiplier = Decimal(str(character.ubi_multiplier))
+  return min(Decimal(str(grant_amount)), character.driver_level * Decimal(str(grant_amount)) * multiplier / MAX_LEVEL)
+
+
+async def run_rate_limited(coroutine_functions, rate_limit=TRANSFER_RATE_LIMIT, concurrency=TRANSFER_CONCURRENCY):
+  """
+  Runs the coroutine functions concurrently, starting at most `rate_limit`
+  per second with at most `concurrency` in flight. Returns their results
+  (or exceptions) in order.
+  """
+  semaphore = asyncio.Semaphore(concurrency)
+  interval = 1 / rate_limit
+
+  async def run(i, coroutine_function):
+    await asyncio.sleep(i * interval)
+    async with semaphore:
+      return await coroutine_function()
 
-async def handout_ubi(ctx):
+  return await asyncio.gather(
+    *[run(i, f) for i, f in enumerate(coroutine_functions)],
+    return_exceptions=True,
+  )
+
+
+async def handout_ubi(ctx, rate_limit=TRANSFER_RATE_LIMIT, concurrency=TRANSFER_CONCURRENCY):
   http_client = ctx.get('http_client')
   http_client_mod = ctx.get('http_client_mod')
   now = timezone.now()
 
   players = await get_players(http_client)
-  for player_id, player in players:
-    character = await Character.objects.aget(guid=player['character_guid'])
-    if not character.driver_level or character.reject_ubi:
-      continue
-
-    is_online, is_active = await CharacterLocation.get_character_activity(
-      character,
-      now - timedelta(minutes=TASK_FREQUENCY),
-      now
-    )
-    if is_active:
-      grant_amount = ACTIVE_GRANT_AMOUNT
-    else:
-      grant_amount = AFK_GRANT_AMOUNT
-    amount = min(Decimal(str(grant_amount)), character.driver_level * Decimal(str(grant_amount)) * character.ubi_multiplier / MAX_LEVEL)
-
-    await send_fund_to_player_wallet(amount, character, 'Universal Basic Income')
-    await transfer_money(
+  player_ids_by_guid = {
+    player['character_guid']: player_id
+    for player_id, player in players
+  }
+  characters = [
+    character
+    async for character in Character.objects.filter(guid__in=player_ids_by_guid.keys())
+    if character.driver_level and not character.reject_ubi
+  ]
+  if not characters:
+    return
+
+  activity = await CharacterLocation.get_characters_activity(
+    characters,
+    now - timedelta(minutes=TASK_FREQUENCY),
+    now
+  )
+  payouts = [
+    (calculate_ubi_amount(character, activity[character.id][1]), character)
+    for character in characters
+  ]
+
+  await send_funds_to_player_wallets(payouts, 'Universal Basic Income')
+
+  def transfer(amount, character):
+    return lambda: transfer_money(
       http_client_mod,
       int(amount),
       'Universal Basic Income',
-      player_id
+      player_ids_by_guid[character.guid]
     )
-    await asyncio.sleep(1)
 
+  results = await run_rate_limited(
+    [transfer(amount, character) for amount, character in payouts],
+    rate_limit=rate_limit,
+    concurrency=concurrency,
+  )
+  for (amount, character), result in zip(payouts, results):
+    if isinstance(result, Exception):
+      logger.error(f"Failed to transfer UBI of {int(amount)} to {character.name}: {result}")
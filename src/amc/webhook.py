@@ -5,12 +5,10 @@ from operator import attrgetter
 from datetime import timedelta
 from django.utils import timezone
 from django.contrib.gis.geos import Point
-from django.db import transaction
 from asgiref.sync import sync_to_async
-from django.db.models import F, Q
-from typing import Any, cast
+from django.db.models import Q
 from amc.game_server import announce
-from amc.mod_server import get_webhook_events2, show_popup, get_rp_mode
+from amc.mod_server import show_popup, get_rp_mode
 from amc.subsidies import (
   repay_loan_for_profit,
   set_aside_player_savings,
@@ -20,7 +18,7 @@ from amc.subsidies import (
 )
 from amc_finance.services import (
     get_treasury_fund_balance,
-    record_ministry_subsidy_spend,
+    PostingBatch,
 )
 from amc.jobs import on_delivery_job_fulfilled
 from amc.models import (
@@ -29,24 +27,24 @@ from amc.models import (
     ServerSignContractLog,
     ServerPassengerArrivedLog,
     ServerTowRequestArrivedLog,
-    Delivery,
     DeliveryPoint,
     DeliveryJob,
     Character,
     CharacterLocation,
     MinistryTerm,
-    SubsidyRule,
 )
 from amc.locations import gwangjin_shortcut
+from amc.job_index import active_job_index, jobs_changed
+from amc.delivery_posting import DeliveryGroup, apost_deliveries, post_deliveries
 
 
-async def on_player_profits(player_profits, session):
+async def on_player_profits(player_profits, session, batch=None):
   for character, total_subsidy, total_payment in player_profits:
-    await on_player_profit(character, total_subsidy, total_payment, session)
+    await on_player_profit(character, total_subsidy, total_payment, session, batch=batch)
 
-async def on_player_profit(character, total_subsidy, total_payment, session):
+async def on_player_profit(character, total_subsidy, total_payment, session, batch=None):
   if total_subsidy != 0:
-    await subsidise_player(total_subsidy, character, session)
+    await subsidise_player(total_subsidy, character, session, batch=batch)
   loan_repayment = await repay_loan_for_profit(character, total_payment, session)
   savings = total_payment - loan_repayment
   if savings > 0:
@@ -94,28 +92,8 @@ async def post_discord_delivery_embed(
       )
     )
 
-async def monitor_webhook(ctx):
-  http_client = ctx.get('http_client')
-  http_client_mod = ctx.get('http_client_mod')
-  http_client_webhook = ctx.get('http_client_webhook')
-  discord_client = ctx.get('discord_client')
-  events = await get_webhook_events2(http_client_webhook)
-  await process_events(events, http_client, http_client_mod, discord_client)
-
-async def monitor_webhook_test(ctx):
-  http_client = ctx.get('http_client_test')
-  http_client_mod = ctx.get('http_client_test_mod')
-  http_client_webhook = ctx.get('http_client_test_webhook')
-  discord_client = ctx.get('discord_client')
-  try:
-    events = await get_webhook_events2(http_client_webhook)
-  except Exception as e:
-    print(f"Failed to get webhook events: {e}")
-    return
-  await process_events(events, http_client, http_client_mod, discord_client)
-
 
-async def handle_cargo_dumped(event, player, timestamp):
+async def handle_cargo_dumped(event, player, timestamp, batch):
   cargo = event['data']['Cargo']
   if cargo['Net_Payment'] < 0:
     raise ValueError(f"Negative payment for dumped cargo: {cargo}")
@@ -132,7 +110,7 @@ async def handle_cargo_dumped(event, player, timestamp):
   )
   subsidy, _, rule = await get_subsidy_for_cargo(log)
   if rule and subsidy > 0:
-      await SubsidyRule.objects.filter(pk=rule.pk).aupdate(spent=F('spent') + subsidy)
+      batch.add_subsidy_spend(rule.pk, subsidy)
   return log.payment + subsidy, subsidy
 
 
@@ -152,55 +130,49 @@ async def handle_contract_signed(event, player, timestamp):
 
 
 async def handle_contract_delivered(event, player, timestamp):
-  contract = event.get('data')
-  if not contract:
-      # Is this possible? logic suggests it handles cases where contract data is missing 
-      # but guid is present? Or maybe contract IS 'data'?
-      # Original code: contract = event['data']; if contract: ... else: try ...
-      # Wait, event['data'] is a dict. So contract IS the data dict apparently?
-      # "ServerContractCargoDelivered" data IS the contract?
-      # Let's assume yes based on original code usage.
-      pass
+  contracts = event['data'].get('Contracts')
+  if contracts is None:
+    contracts = [event['data']]
+  payment = await handle_contract_deliveries(contracts, player, timestamp)
+  return payment, 0
 
-  # If contract (event['data']) is present and has Item/Amount etc it's a "full" update
-  # If not, it might just be an update with GUID?
-  
-  guid = event['data'].get('ContractGuid')
-  if not guid:
+
+async def handle_contract_deliveries(contracts, player, timestamp):
+  """
+  Records a batch of contract cargo deliveries (the data of
+  ServerContractCargoDelivered events). Contracts we haven't seen are
+  created from the event data when it carries the contract details.
+  Returns the total completion payment of the contracts completed.
+  """
+  deliveries = {}
+  new_contracts = {}
+  for contract in contracts:
+    guid = contract.get('ContractGuid')
+    if not guid:
       raise ValueError("Missing ContractGuid")
-      
-  defaults = {}
-  if contract and 'Item' in contract:
-      defaults={
-        'timestamp': timestamp,
-        'player': player,
-        'cargo_key': contract['Item'],
-        'amount': contract['Amount'],
-        'payment': contract['CompletionPayment'],
-        'cost': contract.get('Cost', 0),
-        'data': contract
-      }
-      log, _created = await ServerSignContractLog.objects.aget_or_create(
-        guid=guid,
-        defaults=defaults,
-      )
-  else:
-      try:
-        log = await ServerSignContractLog.objects.aget(guid=guid)
-      except ServerSignContractLog.DoesNotExist:
-        return 0, 0
-  
-  log.finished_amount = cast(Any, F('finished_amount') + 1)
-  await log.asave(update_fields=['finished_amount'])
-  await log.arefresh_from_db()
-  
-  payment = 0
-  if log.finished_amount == log.amount and not log.delivered:
-    payment = log.payment
-    log.delivered = True
-    await log.asave(update_fields=['delivered'])
-    
-  return payment, 0
+    deliveries[guid] = deliveries.get(guid, 0) + 1
+    if 'Item' in contract:
+      new_contracts[guid] = contract
+
+  logs = [
+    ServerSignContractLog(
+      guid=guid,
+      timestamp=timestamp,
+      player=player,
+      cargo_key=contract['Item'],
+      amount=contract['Amount'],
+      payment=contract['CompletionPayment'],
+      cost=contract.get('Cost', 0),
+      data=contract,
+    )
+    for guid, contract in new_contracts.items()
+  ]
+  if logs:
+    # Contracts we, or a concurrent batch, already have are left as they are
+    await ServerSignContractLog.objects.abulk_create(logs, ignore_conflicts=True)
+
+  payments = await ServerSignContractLog.objects.arecord_deliveries(deliveries)
+  return sum(payments.values())
 
 
 async def handle_passenger_arrived(event, player, timestamp):
@@ -286,6 +258,7 @@ async def handle_cargo_arrived(
   used_shortcut,
   http_client,
   discord_client,
+  batch,
   active_term=None
 ):
   valid_cargos = []
@@ -313,6 +286,8 @@ async def handle_cargo_arrived(
 
   key_by_cargo = attrgetter('cargo_key')
   logs.sort(key=key_by_cargo)
+  groups = []
+  cargo_names = []
   for cargo_key, group in itertools.groupby(logs, key=key_by_cargo):
     group_list = list(group)
     quantity = len(group_list)
@@ -323,15 +298,14 @@ async def handle_cargo_arrived(
     cargo_subsidy = cargo_subsidy_res[0] * quantity
     rule = cargo_subsidy_res[2]
     if rule and cargo_subsidy > 0:
-        await SubsidyRule.objects.filter(pk=rule.pk).aupdate(spent=F('spent') + cargo_subsidy)
-        if active_term:
-            await record_ministry_subsidy_spend(cargo_subsidy, active_term.id)
-    cargo_name = group_list[0].get_cargo_key_display()
-
-    job = await (DeliveryJob.objects
-      .filter_active()
-      .filter_by_delivery(delivery_source, delivery_destination, cargo_key)
-    ).afirst()
+        batch.add_subsidy_spend(rule.pk, cargo_subsidy, active_term.id if active_term else None)
+    cargo_names.append(group_list[0].get_cargo_key_display())
+
+    job = await active_job_index.amatch(
+      delivery_source.pk if delivery_source else None,
+      delivery_destination.pk if delivery_destination else None,
+      cargo_key,
+    )
     if job is not None and job.rp_mode and not is_rp_mode:
       job = None
 
@@ -352,19 +326,26 @@ async def handle_cargo_arrived(
          delivery_data['subsidy'] = int((cargo_subsidy * 1.5) + (payment * quantity * 0.5))
 
     job_id = job.id if job and not used_shortcut else None
-    
-    job = await sync_to_async(atomic_process_delivery)(job_id, quantity, delivery_data)
-    
-    if job and job.quantity_fulfilled >= job.quantity_requested:
+    groups.append(DeliveryGroup(job_id, quantity, delivery_data))
+
+  # All the groups are posted in one transaction
+  await apost_deliveries(groups)
+
+  jobs = await DeliveryJob.objects.in_bulk({group.job_id for group in groups if group.job_id})
+  for group, cargo_name in zip(groups, cargo_names):
+    job = jobs.get(group.job_id) if group.job_id else None
+    if job and group.job_fulfilled:
       rows_updated = await DeliveryJob.objects.filter(
         pk=job.id,
         fulfilled_at__isnull=True
       ).aupdate(fulfilled_at=timestamp)
       
       if rows_updated > 0:
+        await sync_to_async(jobs_changed)()
         await job.arefresh_from_db()
         await on_delivery_job_fulfilled(job, http_client)
 
+    delivery_data = group.delivery_data
     delivery_subsidy = delivery_data['subsidy']
     
     if discord_client:
@@ -373,10 +354,10 @@ async def handle_cargo_arrived(
           discord_client,
           character,
           cargo_name,
-          quantity,
-          delivery_source,
-          delivery_destination,
-          payment * quantity,
+          group.quantity,
+          delivery_data['sender_point'],
+          delivery_data['destination_point'],
+          delivery_data['payment'],
           delivery_subsidy,
           vehicle_key,
           job=job,
@@ -413,6 +394,15 @@ def aggregate_homogenous_events(sorted_events):
             'Cargos': cargos,
           }
         })
+      case "ServerContractCargoDelivered":
+        aggregated_events.append({
+          'hook': key[1],
+          'timestamp': group_events[0]['timestamp'],
+          'data': {
+            'CharacterGuid': key[0],
+            'Contracts': [event['data'] for event in group_events],
+          }
+        })
       case "ServerResetVehicleAtResponse":
         aggregated_events.append({
           'hook': key[1],
@@ -455,7 +445,32 @@ async def process_events(events, http_client=None, http_client_mod=None, discord
   grouped_player_events = itertools.groupby(sorted_player_events, key=key_by_character)
 
   player_profits = []
-
+  # Subsidy spend and payouts of the whole batch, posted together at the end
+  batch = PostingBatch()
+  try:
+    await process_player_events(
+      grouped_player_events,
+      player_profits,
+      batch,
+      http_client,
+      http_client_mod,
+      discord_client,
+    )
+    if http_client_mod:
+      await on_player_profits(player_profits, http_client_mod, batch=batch)
+  finally:
+    # Also on failure, for the events processed and the money already transferred
+    await batch.aflush()
+
+
+async def process_player_events(
+  grouped_player_events,
+  player_profits,
+  batch,
+  http_client=None,
+  http_client_mod=None,
+  discord_client=None,
+):
   treasury_balance = await get_treasury_fund_balance()
   active_term = await MinistryTerm.objects.filter(is_active=True).afirst()
   for character_guid, es in grouped_player_events:
@@ -504,7 +519,8 @@ async def process_events(events, http_client=None, http_client_mod=None, discord
           http_client,
           http_client_mod,
           discord_client,
-          active_term=active_term
+          active_term=active_term,
+          batch=batch,
         )
         total_payment += payment
         total_subsidy += subsidy
@@ -521,9 +537,6 @@ async def process_events(events, http_client=None, http_client_mod=None, discord
 
     player_profits.append((character, total_subsidy, total_payment))
 
-  if http_client_mod:
-    await on_player_profits(player_profits, http_client_mod)
-
 async def process_cargo_log(cargo, player, character, timestamp):
   sender_coord_raw = cargo['Net_SenderAbsoluteLocation']
   sender_coord = Point(
@@ -556,39 +569,22 @@ def atomic_process_delivery(job_id, quantity, delivery_data):
   """
    atomically updates the job and creates the delivery log
   """
-  from amc.models import DeliveryJob # import here to avoid circular if any
-  with transaction.atomic():
-    job = None
-    quantity_to_add = 0
-    if job_id:
-      job = DeliveryJob.objects.select_for_update().get(pk=job_id)
-      requested_remaining = job.quantity_requested - job.quantity_fulfilled
-      quantity_to_add = min(requested_remaining, quantity)
-      if quantity_to_add > 0:
-        job.quantity_fulfilled = cast(Any, F('quantity_fulfilled') + quantity_to_add)
-        job.save(update_fields=['quantity_fulfilled'])
-        job.refresh_from_db(fields=['quantity_fulfilled'])
-    
-    bonus = 0
-    if job and quantity_to_add > 0:
-       # Correct multiplier logic: (multiplier - 1) * portion_of_payment
-       # portion_of_payment = (quantity_to_add / delivery_data['quantity']) * delivery_data['payment']
-       # but usually quantity_to_add == delivery_data['quantity']
-       
-       multiplier = max(0, job.bonus_multiplier - 1)
-       bonus = int(delivery_data['payment'] * (quantity_to_add / delivery_data['quantity']) * multiplier + 0.5)
-       if bonus > delivery_data['subsidy']:
-         delivery_data['subsidy'] = bonus
-       
-    Delivery.objects.create(
-      job=job,
-      **delivery_data
-    )
-    return job
+  [group] = post_deliveries([DeliveryGroup(job_id, quantity, delivery_data)])
+  return DeliveryJob.objects.filter(pk=group.job_id).first() if group.job_id else None
+
 
 
+async def process_event(event, player, character, is_rp_mode=False, used_shortcut=False, treasury_balance=None, http_client=None, http_client_mod=None, discord_client=None, active_term=None, batch=None):
+  if batch is None:
+    batch = PostingBatch()
+    try:
+      return await process_event(
+        event, player, character, is_rp_mode, used_shortcut, treasury_balance,
+        http_client, http_client_mod, discord_client, active_term, batch=batch,
+      )
+    finally:
+      await batch.aflush()
 
-async def process_event(event, player, character, is_rp_mode=False, used_shortcut=False, treasury_balance=None, http_client=None, http_client_mod=None, discord_client=None, active_term=None):
   print(event)
   total_payment = 0
   subsidy = 0
@@ -615,13 +611,14 @@ async def process_event(event, player, character, is_rp_mode=False, used_shortcu
         used_shortcut,
         http_client,
         discord_client,
+        batch,
         active_term=active_term
       )
       total_payment += payment
 
 
     case "ServerCargoDumped":
-      payment, subsidy = await handle_cargo_dumped(event, player, timestamp)
+      payment, subsidy = await handle_cargo_dumped(event, player, timestamp, batch)
       total_payment += payment
 
 
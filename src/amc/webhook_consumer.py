@@ -0,0 +1,164 @@
+import time
+import asyncio
+import logging
+from amc.mod_server import get_webhook_events2
+from amc.webhook import process_events
+from amc.metrics import WEBHOOK_LAG
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE_SIZE = 20 # batches
+WEBHOOK_MIN_POLL_INTERVAL = 0.5 # seconds
+WEBHOOK_MAX_POLL_INTERVAL = 8 # seconds
+WEBHOOK_MAX_EVENTS_PER_BATCH = 500
+
+
+class WebhookConsumer:
+  """
+  Long-running consumer of a webhook server's event buffer.
+
+  A fetch task polls `/events` and puts each non-empty batch on a bounded
+  queue; a process task takes batches off the queue and runs
+  `process_events` on them, one at a time, so batches never overlap.
+
+  Polling adapts to traffic: while events keep arriving the fetcher polls
+  again right away, and when the buffer is empty (or the server errors)
+  it backs off up to `max_poll_interval`. When the processor falls
+  behind, the full queue blocks the fetcher, leaving events buffered on
+  the webhook server rather than in memory.
+
+  Reading `/events` drains the server's buffer, so a fetched batch is
+  acknowledged by the read. The cursor, the timestamp of the newest event
+  processed, is persisted to Redis when available, and lag (processing
+  time minus event time) is tracked for every batch.
+  """
+
+  def __init__(
+    self,
+    name,
+    http_client_webhook,
+    http_client=None,
+    http_client_mod=None,
+    discord_client=None,
+    redis=None,
+    queue_size=WEBHOOK_QUEUE_SIZE,
+    min_poll_interval=WEBHOOK_MIN_POLL_INTERVAL,
+    max_poll_interval=WEBHOOK_MAX_POLL_INTERVAL,
+  ):
+    self.name = name
+    self.http_client_webhook = http_client_webhook
+    self.http_client = http_client
+    self.http_client_mod = http_client_mod
+    self.discord_client = discord_client
+    self.redis = redis
+    self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    self.min_poll_interval = min_poll_interval
+    self.max_poll_interval = max_poll_interval
+    self.poll_interval = min_poll_interval
+    self._fetch_task: asyncio.Task | None = None
+    self._process_task: asyncio.Task | None = None
+
+    self.cursor: float | None = None
+    self.fetched_events = 0
+    self.processed_events = 0
+    self.failed_batches = 0
+    self.last_lag_seconds: float | None = None
+    self.max_lag_seconds: float | None = None
+
+  @property
+  def cursor_key(self):
+    return f"webhook_consumer:{self.name}:cursor"
+
+  async def start(self):
+    if self.redis is not None:
+      cursor = await self.redis.get(self.cursor_key)
+      if cursor is not None:
+        self.cursor = float(cursor)
+    self._fetch_task = asyncio.create_task(self.fetch_loop())
+    self._process_task = asyncio.create_task(self.process_loop())
+
+  async def stop(self, timeout=30):
+    """Stops fetching, then gives the processor time to finish the queued batches"""
+    if self._fetch_task:
+      self._fetch_task.cancel()
+    try:
+      await asyncio.wait_for(self.queue.join(), timeout)
+    except asyncio.TimeoutError:
+      logger.error(f"Webhook consumer {self.name} stopped with {self.queue.qsize()} batches unprocessed")
+    if self._process_task:
+      self._process_task.cancel()
+
+  def next_poll_interval(self, event_count):
+    if event_count:
+      return 0
+    return min(max(self.poll_interval * 2, self.min_poll_interval), self.max_poll_interval)
+
+  async def fetch(self):
+    try:
+      events = await get_webhook_events2(self.http_client_webhook)
+    except Exception as e:
+      print(f"Failed to get webhook events ({self.name}): {e}")
+      events = []
+    if events:
+      self.fetched_events += len(events)
+      await self.queue.put(events)
+    self.poll_interval = self.next_poll_interval(len(events))
+
+  async def fetch_loop(self):
+    while True:
+      await self.fetch()
+      if self.poll_interval:
+        await asyncio.sleep(self.poll_interval)
+
+  def next_batch(self, events):
+    """Merges batches that queued up behind `events`, up to WEBHOOK_MAX_EVENTS_PER_BATCH"""
+    batch_count = 1
+    while len(events) < WEBHOOK_MAX_EVENTS_PER_BATCH and not self.queue.empty():
+      events = events + self.queue.get_nowait()
+      batch_count += 1
+    return events, batch_count
+
+  async def process_batch(self, events):
+    try:
+      await process_events(events, self.http_client, self.http_client_mod, self.discord_client)
+    except Exception:
+      self.failed_batches += 1
+      logger.exception(f"Failed to process webhook events ({self.name})")
+    self.record_processed(events)
+
+  def record_processed(self, events, now=None):
+    if now is None:
+      now = time.time()
+    self.processed_events += len(events)
+    timestamps = [event['timestamp'] for event in events if event.get('timestamp')]
+    if not timestamps:
+      return
+    self.last_lag_seconds = now - min(timestamps)
+    self.max_lag_seconds = max(self.max_lag_seconds or 0, self.last_lag_seconds)
+    WEBHOOK_LAG.labels(self.name).set(self.last_lag_seconds)
+    self.cursor = max(self.cursor or 0, max(timestamps))
+
+  async def process_loop(self):
+    while True:
+      events, batch_count = self.next_batch(await self.queue.get())
+      try:
+        await self.process_batch(events)
+        if self.redis is not None and self.cursor is not None:
+          await self.redis.set(self.cursor_key, self.cursor)
+      except Exception:
+        logger.exception(f"Failed to persist webhook cursor ({self.name})")
+      finally:
+        for _ in range(batch_count):
+          self.queue.task_done()
+
+  def stats(self):
+    return {
+      'queued_batches': self.queue.qsize(),
+      'poll_interval': self.poll_interval,
+      'cursor': self.cursor,
+      'fetched_events': self.fetched_events,
+      'processed_events': self.processed_events,
+      'failed_batches': self.failed_batches,
+      'last_lag_seconds': self.last_lag_seconds,
+      'max_lag_seconds': self.max_lag_seconds,
+    }
@@ -70,6 +70,9 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    'amc.metrics.request_metrics_middleware',
+    'amc.query_budget.query_budget_middleware',
+    'amc.api.responses.compression_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -192,6 +195,29 @@ TEST_GAME_SERVER_API_URL = os.environ.get("TEST_GAME_SERVER_API_URL", "http://12
 TEST_MOD_SERVER_API_URL = os.environ.get("TEST_MOD_SERVER_API_URL", "http://127.0.0.1:55001")
 TEST_WEBHOOK_SERVER_API_URL = os.environ.get("TEST_WEBHOOK_SERVER_API_URL", "http://127.0.0.1:55000")
 REDIS_SETTINGS = {}
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 9108))
+# /metrics needs `Authorization: Bearer <METRICS_TOKEN>` when set, otherwise
+# it only answers unproxied requests from these addresses
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1 ::1').split()
+# Requests and jobs making more queries than this are logged
+QUERY_BUDGET_REQUEST = int(os.environ.get('QUERY_BUDGET_REQUEST', 30))
+QUERY_BUDGET_JOB = int(os.environ.get('QUERY_BUDGET_JOB', 200))
+# Async connections for posting deliveries per process, 0 posts them through the ORM
+DELIVERY_POSTING_CONNECTIONS = int(os.environ.get('DELIVERY_POSTING_CONNECTIONS', 4))
+# Redis for the shared cache of the API processes
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+if CACHE_REDIS_URL:
+  CACHES = {
+    'default': {
+      'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+      'LOCATION': CACHE_REDIS_URL,
+    }
+  }
+# Seconds the subsidies catalogue is kept in Redis, 0 renders it on every request
+SUBSIDY_CATALOGUE_TTL = int(os.environ.get('SUBSIDY_CATALOGUE_TTL', 60 * 60))
+# Applies amc_backend.test_runner.TEST_SETTINGS
+TEST_RUNNER = 'amc_backend.test_runner.TestRunner'
 
 # Discord settings
 DISCORD_TOKEN = os.environ.get("DISCORD_TOKEN")
@@ -0,0 +1,28 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+  # Tests run in transactions that only the ORM's connection can see
+  'DELIVERY_POSTING_CONNECTIONS': 0,
+  # No Redis for the shared and subsidies caches
+  'CACHE_REDIS_URL': '',
+  'CACHES': {
+    'default': {
+      'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+  },
+  'SUBSIDY_CATALOGUE_TTL': 0,
+}
+
+
+class TestRunner(DiscoverRunner):
+  """Runs the tests with TEST_SETTINGS"""
+
+  def setup_test_environment(self, **kwargs):
+    super().setup_test_environment(**kwargs)
+    self._test_settings = override_settings(**TEST_SETTINGS)
+    self._test_settings.enable()
+
+  def teardown_test_environment(self, **kwargs):
+    self._test_settings.disable()
+    super().teardown_test_environment(**kwargs)
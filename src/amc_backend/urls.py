@@ -20,12 +20,14 @@ from django.conf import settings
 from django.conf.urls.static import static
 from .api import api
 from amc.views import login_with_token
+from amc.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('login/token/', login_with_token, name='token_login'),
     path('api/login/token/', login_with_token, name='token_login_api'),
     path('api/', api.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
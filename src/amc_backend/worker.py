@@ -3,6 +3,8 @@ import aiohttp
 from concurrent.futures import ThreadPoolExecutor
 from arq.connections import RedisSettings
 from arq import cron
+from arq.constants import default_queue_name
+from prometheus_client import start_http_server
 import django
 django.setup()
 from django.conf import settings  # noqa: E402
@@ -12,14 +14,22 @@ import amc.tasks as tasks_module  # noqa: E402
 from necesse.tasks import process_necesse_log  # noqa: E402
 from amc.events import monitor_events, send_event_embeds  # noqa: E402
 from amc.locations import monitor_locations  # noqa: E402
-from amc.webhook import monitor_webhook, monitor_webhook_test  # noqa: E402
+from amc.webhook_consumer import WebhookConsumer  # noqa: E402
+from amc.job_index import active_job_index  # noqa: E402
+from amc.delivery_posting import delivery_connection_pool  # noqa: E402
 from amc.ubi import handout_ubi, TASK_FREQUENCY as UBI_TASK_FREQUENCY  # noqa: E402
-from amc.deliverypoints import monitor_deliverypoints  # noqa: E402
+from amc.deliverypoints import monitor_deliverypoints, rollup_storage_levels  # noqa: E402
 from amc.jobs import monitor_jobs  # noqa: E402
 from amc.status import monitor_server_status  # noqa: E402
 import discord  # noqa: E402
 from amc.discord_client import bot as discord_client  # noqa: E402
-from amc_finance.services import apply_interest_to_bank_accounts  # noqa: E402
+from amc_finance.services import apply_interest_to_bank_accounts, compact_account_balances  # noqa: E402
+from amc.metrics import (  # noqa: E402
+  instrument_job,
+  http_trace_config,
+  monitor_event_loop_lag,
+  QUEUE_DEPTH,
+)
 
 REDIS_SETTINGS = RedisSettings(**settings.REDIS_SETTINGS)
 
@@ -46,17 +56,36 @@ async def run_discord():
   )
 
 
+def http_session(base_url, service):
+  return aiohttp.ClientSession(base_url=base_url, trace_configs=[http_trace_config(service)])
+
+
+async def record_queue_depths(ctx):
+  QUEUE_DEPTH.labels('discord').set(len(tasks_module._discord_queue))
+  if redis := ctx.get('redis'):
+    QUEUE_DEPTH.labels('arq').set(await redis.zcard(default_queue_name))
+  for consumer in ctx.get('webhook_consumers', []):
+    QUEUE_DEPTH.labels(f"webhook_{consumer.name}").set(consumer.queue.qsize())
+
+
 async def startup(ctx):
   global bot_task_handle
   ctx['startup_time'] = timezone.now()
-  ctx['http_client'] = aiohttp.ClientSession(base_url=settings.GAME_SERVER_API_URL)
-  ctx['http_client_mod'] = aiohttp.ClientSession(base_url=settings.MOD_SERVER_API_URL)
-  ctx['http_client_webhook'] = aiohttp.ClientSession(base_url=settings.WEBHOOK_SERVER_API_URL)
-  ctx['http_client_event'] = aiohttp.ClientSession(base_url=settings.EVENT_GAME_SERVER_API_URL)
-  ctx['http_client_event_mod'] = aiohttp.ClientSession(base_url=settings.EVENT_MOD_SERVER_API_URL)
-  ctx['http_client_test'] = aiohttp.ClientSession(base_url=settings.TEST_GAME_SERVER_API_URL)
-  ctx['http_client_test_mod'] = aiohttp.ClientSession(base_url=settings.TEST_MOD_SERVER_API_URL)
-  ctx['http_client_test_webhook'] = aiohttp.ClientSession(base_url=settings.TEST_WEBHOOK_SERVER_API_URL)
+  if settings.WORKER_METRICS_PORT:
+    try:
+      start_http_server(settings.WORKER_METRICS_PORT)
+    except OSError as e:
+      print(f"Failed to start metrics server: {e}")
+  ctx['event_loop_lag_task'] = asyncio.create_task(monitor_event_loop_lag('worker'))
+  ctx['job_index_listener'] = asyncio.create_task(active_job_index.listen())
+  ctx['http_client'] = http_session(settings.GAME_SERVER_API_URL, 'game')
+  ctx['http_client_mod'] = http_session(settings.MOD_SERVER_API_URL, 'mod')
+  ctx['http_client_webhook'] = http_session(settings.WEBHOOK_SERVER_API_URL, 'webhook')
+  ctx['http_client_event'] = http_session(settings.EVENT_GAME_SERVER_API_URL, 'event_game')
+  ctx['http_client_event_mod'] = http_session(settings.EVENT_MOD_SERVER_API_URL, 'event_mod')
+  ctx['http_client_test'] = http_session(settings.TEST_GAME_SERVER_API_URL, 'test_game')
+  ctx['http_client_test_mod'] = http_session(settings.TEST_MOD_SERVER_API_URL, 'test_mod')
+  ctx['http_client_test_webhook'] = http_session(settings.TEST_WEBHOOK_SERVER_API_URL, 'test_webhook')
 
   if settings.DISCORD_TOKEN:
     ctx['discord_client'] = discord_client
@@ -64,8 +93,39 @@ async def startup(ctx):
     # Set Discord client reference for the message queue
     tasks_module._discord_client_ref = discord_client
 
+  ctx['webhook_consumers'] = [
+    WebhookConsumer(
+      'main',
+      ctx['http_client_webhook'],
+      ctx['http_client'],
+      ctx['http_client_mod'],
+      ctx.get('discord_client'),
+      redis=ctx.get('redis'),
+    ),
+    WebhookConsumer(
+      'test',
+      ctx['http_client_test_webhook'],
+      ctx['http_client_test'],
+      ctx['http_client_test_mod'],
+      ctx.get('discord_client'),
+      redis=ctx.get('redis'),
+    ),
+  ]
+  for consumer in ctx['webhook_consumers']:
+    await consumer.start()
+
 
 async def shutdown(ctx):
+  if event_loop_lag_task := ctx.get('event_loop_lag_task'):
+    event_loop_lag_task.cancel()
+
+  if job_index_listener := ctx.get('job_index_listener'):
+    job_index_listener.cancel()
+
+  for consumer in ctx.get('webhook_consumers', []):
+    await consumer.stop()
+
+  await delivery_connection_pool.close()
 
   if http_client := ctx.get('http_client'):
     await http_client.close()
@@ -106,35 +166,37 @@ async def monitor_events_event(ctx):
 
 class WorkerSettings:
     functions = [
-      process_log_line,
-      process_necesse_log,
+      instrument_job(process_log_line),
+      instrument_job(process_necesse_log),
     ]
     cron_jobs = [
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_webhook, second=set(range(0, 60, 4))),
-        # pyrefly: ignore [bad-argument-type]
-        cron(monitor_webhook_test, second=set(range(0, 60, 4))),
+        cron(instrument_job(monitor_locations), second=None),
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_locations, second=None),
+        cron(instrument_job(handout_ubi), minute=set(range(0, 60, UBI_TASK_FREQUENCY)), second=37),
         # pyrefly: ignore [bad-argument-type]
-        cron(handout_ubi, minute=set(range(0, 60, UBI_TASK_FREQUENCY)), second=37),
+        cron(instrument_job(apply_interest_to_bank_accounts), hour=None, minute=0, second=0),
         # pyrefly: ignore [bad-argument-type]
-        cron(apply_interest_to_bank_accounts, hour=None, minute=0, second=0),
+        cron(instrument_job(compact_account_balances), second=47),
         # cron(monitor_events_main, second=None),
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_events_event, second=None),
+        cron(instrument_job(monitor_events_event), second=None),
         # pyrefly: ignore [bad-argument-type]
-        cron(send_event_embeds, second=set(range(0, 60, 10))),
+        cron(instrument_job(send_event_embeds), second=set(range(0, 60, 10))),
         # cron(monitor_event_locations, second=None),
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_deliverypoints, second=set(range(0, 60, 7))),
+        cron(instrument_job(monitor_deliverypoints), second=set(range(0, 60, 7))),
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_jobs, second=37),
+        cron(instrument_job(rollup_storage_levels), minute=2, second=0),
+        # pyrefly: ignore [bad-argument-type]
+        cron(instrument_job(monitor_jobs), second=37),
         #cron(monitor_corporations, second=23),
         # pyrefly: ignore [bad-argument-type]
-        cron(monitor_server_status, second=set(range(3, 60, 10))),
+        cron(instrument_job(monitor_server_status), second=set(range(3, 60, 10))),
         # cron(monitor_server_condition, minute=set(range(3, 60, 5))),
         # cron(monitor_rp_mode, second=set(range(7, 60, 13))),
+        # pyrefly: ignore [bad-argument-type]
+        cron(record_queue_depths, second=set(range(0, 60, 15))),
     ]
     on_startup = startup
     on_shutdown = shutdown
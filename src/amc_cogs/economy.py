@@ -23,6 +23,7 @@ from .utils import create_player_autocomplete
 from amc.utils import get_timespan
 from amc_finance.services import send_fund_to_player
 from amc_finance.models import Account, LedgerEntry
+from amc_finance.accounts import account_registry, aget_account_balance
 from amc_finance.services import (
   get_player_bank_balance,
   get_player_loan_balance,
@@ -302,25 +303,15 @@ Tow Requests: {tow_requests_aggregates['total_payments']:,}
   async def treasury_stats(self, interaction):
     await interaction.response.defer()
     today = timezone.now().date()
-    treasury_fund, _ = await Account.objects.aget_or_create(
-      account_type=Account.AccountType.ASSET,
-      book=Account.Book.GOVERNMENT,
-      character=None,
-      name='Treasury Fund',
-    )
-    treasury_fund_in_bank, _ = await Account.objects.aget_or_create(
-      account_type=Account.AccountType.ASSET,
-      book=Account.Book.GOVERNMENT,
-      character=None,
-      name='Treasury Fund (in Bank)',
-    )
-    bank_assets_aggregate = await Account.objects.filter(
+    treasury_fund_balance = await aget_account_balance(await account_registry.aget('treasury_fund'))
+    treasury_fund_in_bank_balance = await aget_account_balance(await account_registry.aget('treasury_fund_in_bank'))
+    bank_assets_aggregate = await Account.objects.with_current_balance().filter(
       account_type=Account.AccountType.ASSET,
       book=Account.Book.BANK,
     ).aaggregate(
-      total_assets=Sum('balance', default=0),
-      total_loans=Sum('balance', default=0, filter=Q(character__isnull=False)),
-      total_vault=Sum('balance', default=0, filter=Q(character__isnull=True)),
+      total_assets=Sum('current_balance', default=0),
+      total_loans=Sum('current_balance', default=0, filter=Q(character__isnull=False)),
+      total_vault=Sum('current_balance', default=0, filter=Q(character__isnull=True)),
     )
 
     subsidies_agg = await (LedgerEntry.objects.filter_subsidies()
@@ -351,8 +342,8 @@ Tow Requests: {tow_requests_aggregates['total_payments']:,}
 
     # Add Treasury field
     treasury_value = (
-      f"**Vault Balance:** `{treasury_fund.balance:,}`\n"
-      f"**Bank Deposit:** `{treasury_fund_in_bank.balance:,}`"
+      f"**Vault Balance:** `{treasury_fund_balance:,}`\n"
+      f"**Bank Deposit:** `{treasury_fund_in_bank_balance:,}`"
     )
     embed.add_field(name="💰 Government Treasury", value=treasury_value, inline=False)
     
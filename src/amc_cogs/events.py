@@ -19,6 +19,8 @@ from amc.models import (
   Player,
   Championship,
   ChampionshipPoint,
+  ChampionshipPersonalStanding,
+  ChampionshipTeamStanding,
 )
 from amc_finance.services import send_fund_to_player
 
@@ -332,8 +334,8 @@ class EventsCog(commands.Cog):
     championship = await Championship.objects.alast()
     if not championship:
       return
-    personal_standings = [s async for s in ChampionshipPoint.objects.personal_standings(championship)]
-    team_standings = [s async for s in ChampionshipPoint.objects.team_standings(championship)]
+    personal_standings = [s async for s in ChampionshipPersonalStanding.objects.for_championship(championship)]
+    team_standings = [s async for s in ChampionshipTeamStanding.objects.for_championship(championship)]
     
     embed = discord.Embed(
       title=f"{championship.name} Standings",
@@ -482,7 +484,7 @@ class EventsCog(commands.Cog):
         )
         for i, (participant, team) in enumerate(zip(participants, teams))
       ]
-      await ChampionshipPoint.objects.abulk_create(cps)
+      await ChampionshipPoint.objects.aaward(cps)
 
     for i, participant in enumerate(participants):
       await send_fund_to_player(
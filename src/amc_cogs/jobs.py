@@ -1,6 +1,7 @@
+import asyncio
 import discord
 from django.utils import timezone
-from django.db.models import Prefetch
+from django.db.models import Sum
 from discord import app_commands
 from discord.ext import commands, tasks
 from django.conf import settings
@@ -10,6 +11,7 @@ from amc.models import (
   Delivery
 )
 from amc.webhook import on_delivery_job_fulfilled
+from amc.embed_sync import embed_sync
 from typing import TYPE_CHECKING, Optional
 
 if TYPE_CHECKING:
@@ -31,7 +33,20 @@ class JobsCog(commands.Cog):
   async def cog_unload(self):
     self.update_loop.cancel()
 
-  def _build_job_embed(self, job, stale=False) -> discord.Embed:
+  @staticmethod
+  async def get_job_contributors(job_ids) -> dict[int, dict[str, int]]:
+    """Delivered quantity per character name for each job, in one aggregate query"""
+    contributors: dict[int, dict[str, int]] = {}
+    qs = (Delivery.objects
+      .filter(job__in=job_ids, character__isnull=False)
+      .values('job_id', 'character__name')
+      .annotate(quantity=Sum('quantity'))
+    )
+    async for row in qs:
+      contributors.setdefault(row['job_id'], {})[row['character__name']] = row['quantity']
+    return contributors
+
+  def _build_job_embed(self, job, contributors=None, stale=False) -> discord.Embed:
     """Builds a Discord Embed for a single DeliveryJob object."""
 
     # --- Create the title and description (value part of the field) ---
@@ -67,24 +82,16 @@ class JobsCog(commands.Cog):
     if job.description:
         description += f'\n**Description**: {job.description}'
 
-    if deliveries := list(job.deliveries.all()):
-      contributors = {}
-      for delivery in deliveries:
-        if delivery.character: 
-          name = delivery.character.name
-          contributors[name] = contributors.get(name, 0) + delivery.quantity
-
-      if contributors:
-        description += '\n\n**Contributors**:'
-        sorted_contributors = sorted(
-          contributors.items(), 
-          key=lambda item: item[1], 
-          reverse=True
-        )
+    if contributors:
+      description += '\n\n**Contributors**:'
+      sorted_contributors = sorted(
+        contributors.items(),
+        key=lambda item: (-item[1], item[0]),
+      )
 
-        for name, quantity in sorted_contributors:
-          bonus = int(job.completion_bonus * quantity / job.quantity_requested)
-          description += f'\n**{name}**: {quantity} ({bonus:,} bonus upon completion)'
+      for name, quantity in sorted_contributors:
+        bonus = int(job.completion_bonus * quantity / job.quantity_requested)
+        description += f'\n**{name}**: {quantity} ({bonus:,} bonus upon completion)'
 
     color = discord.Color.blue()
     if stale:
@@ -177,57 +184,50 @@ class JobsCog(commands.Cog):
         print(f"Error: Could not find messageable channel with ID {self.channel_id}")
         return
 
-    active_jobs = DeliveryJob.objects.prefetch_related(
+    active_jobs = [
+      job
+      async for job in DeliveryJob.objects.prefetch_related(
         'source_points', 'destination_points', 'cargos',
-    ).prefetch_related(
-      Prefetch('deliveries', queryset=Delivery.objects.select_related('character'))
-    ).filter_active()
-    
-    active_job_ids = set()
-
-    async for job in active_jobs:
-        active_job_ids.add(job.id)
-        embed = self._build_job_embed(job)
-        print('Embed CREATED')
-        
-        # UPDATE path
-        if job.discord_message_id:
-            try:
-                message = await channel.fetch_message(job.discord_message_id)
-                await message.edit(embed=embed)
-            except discord.NotFound:
-                # Message was deleted in Discord. Clear the invalid ID.
-                # It will be recreated in the CREATE path below.
-                job.discord_message_id = None
-            except Exception as e:
-                print(f"Error updating message for job {job.id}: {e}")
-
-        # CREATE path
-        if not job.discord_message_id:
-            new_message = await channel.send(embed=embed)
-            job.discord_message_id = new_message.id
-            await job.asave(update_fields=['discord_message_id'])
-        print('Embed CREATED done')
-
-    # --- 2. CLEAN UP STALE MESSAGES (DELETE) ---
+      ).filter_active()
+    ]
+    active_job_ids = {job.id for job in active_jobs}
+
     # Find jobs that have a message ID but are no longer active
-    stale_jobs = DeliveryJob.objects.filter(
-      discord_message_id__isnull=False
-    ).exclude(
-      id__in=active_job_ids
-    ).prefetch_related(
+    stale_jobs = [
+      job
+      async for job in DeliveryJob.objects.filter(
+        discord_message_id__isnull=False
+      ).exclude(
+        id__in=active_job_ids
+      ).prefetch_related(
         'source_points', 'destination_points', 'cargos',
-    ).prefetch_related(
-      Prefetch('deliveries', queryset=Delivery.objects.select_related('character'))
+      )
+    ]
+    contributors = await self.get_job_contributors(
+      [job.id for job in active_jobs] + [job.id for job in stale_jobs]
     )
 
-    async for job in stale_jobs:
-      embed = self._build_job_embed(job, stale=True)
+    # --- 1. CREATE OR UPDATE ACTIVE JOB MESSAGES ---
+    # Unchanged embeds are skipped by embed_sync without touching Discord,
+    # the others are edited concurrently, up to its concurrency limit
+    async def sync_job(job):
+      embed = self._build_job_embed(job, contributors.get(job.id))
+      try:
+        message_id = await embed_sync.sync(channel, job.discord_message_id, embed)
+      except Exception as e:
+        print(f"Error updating message for job {job.id}: {e}")
+        return
+      if message_id != job.discord_message_id:
+        job.discord_message_id = message_id
+        await job.asave(update_fields=['discord_message_id'])
+
+    await asyncio.gather(*[sync_job(job) for job in active_jobs])
+
+    # --- 2. MARK STALE MESSAGES ---
+    async def finalize_job(job):
+      embed = self._build_job_embed(job, contributors.get(job.id), stale=True)
       try:
-        if not channel:
-            continue
-        message = await channel.fetch_message(job.discord_message_id)
-        await message.edit(embed=embed)
+        await embed_sync.finalize(channel, job.discord_message_id, embed)
         print(f"Updated message for stale job {job.id}")
       except discord.NotFound:
         # Message already gone, which is fine.
@@ -239,6 +239,8 @@ class JobsCog(commands.Cog):
         job.discord_message_id = None
         await job.asave(update_fields=['discord_message_id'])
 
+    await asyncio.gather(*[finalize_job(job) for job in stale_jobs])
+
     return active_job_ids, stale_jobs
 
   @tasks.loop(minutes=1) # Reduced loop time for better responsiveness
@@ -458,6 +458,14 @@ This notice was issued by Officer {interaction.user.display_name}. If you wish t
 
     # Section 2: Characters (Alts)
     alts_lines = []
+    # Bank balances of every character in one query
+    bank_balances = {
+        row['character']: row['total']
+        async for row in Account.objects.filter(
+            character__player=player,
+            book=Account.Book.BANK
+        ).values('character').annotate(total=Sum('balance'))
+    }
     chars = player.characters.all().with_last_login().order_by('-last_login')
     async for char in chars:
         lvls = (
@@ -468,12 +476,7 @@ This notice was issued by Officer {interaction.user.display_name}. If you wish t
         )
         rp = " (RP)" if char.rp_mode else ""
         
-        # Fetch bank balance from amc_finance.Account
-        bank_balance = await Account.objects.filter(
-            character=char, 
-            book=Account.Book.BANK
-        ).aaggregate(total=Sum('balance', default=0))
-        bank_val = bank_balance['total']
+        bank_val = bank_balances.get(char.id) or 0
         
         alts_lines.append(
             f"• **{char.name}**{rp}\n"
@@ -1,9 +1,6 @@
 import logging
-import asyncio
 import discord
 import io
-# pyrefly: ignore [untyped-import]
-import matplotlib.pyplot as plt
 from datetime import time as dt_time, timedelta, timezone as dt_timezone
 from django.utils import timezone
 from django.db.models import Count, Q
@@ -15,6 +12,7 @@ if TYPE_CHECKING:
     from amc.discord_client import AMCDiscordBot
 from django.conf import settings
 from amc.game_server import get_players
+from amc.charts import chart_renderer
 from amc.models import Character, ServerStatus
 
 logger = logging.getLogger(__name__)
@@ -32,53 +30,36 @@ class StatusCog(commands.Cog):
     self.last_embed_message = None
     self.fps_data = []
     self.memory_data = []
+    self.chart_renderer = chart_renderer
 
   async def cog_load(self):
+    await self.chart_renderer.start()
     self.update_status_embed.start()
     self.daily_top_restockers_task.start()
 
   async def cog_unload(self):
     self.update_status_embed.cancel()
-
-  def generate_graph_image(self, fps_data: list, memory_data: list) -> io.BytesIO:
-    """Generates the dual-axis line graph image using Matplotlib."""
-    plt.style.use('dark_background') # type: ignore[attr-defined]
-    fig, ax1 = plt.subplots()
-
-    # Plot FPS data on the primary y-axis (left)
-    color_fps = 'cyan'
-    ax1.set_xlabel("Time (Updates)", color='white')
-    ax1.set_ylabel("FPS", color=color_fps)
-    ax1.plot(fps_data, color=color_fps, marker='o', label='FPS')
-    ax1.tick_params(axis='y', labelcolor=color_fps)
-    ax1.set_ylim(0, 120)
-    ax1.grid(True, linestyle='--', alpha=0.6)
-
-    # Create a second y-axis for memory data that shares the x-axis
-    ax2 = ax1.twinx()
-    color_mem = 'lime'
-    ax2.set_ylabel("Used Memory (GB)", color=color_mem)
-    ax2.plot(memory_data, color=color_mem, marker='x', label='Memory (GB)')
-    ax2.tick_params(axis='y', labelcolor=color_mem)
-    ax2.set_ylim(0, 32)
-    # You might want to set a ylim for memory as well, e.g., ax2.set_ylim(0, 8192)
-
-    # Add a title and adjust layout
-    fig.suptitle("Live Server Status", color='white')
-    fig.tight_layout(rect=(0, 0.03, 1, 0.95)) # Adjust rect to make space for title
-
-    # Create a combined legend for both lines
-    lines, labels = ax1.get_legend_handles_labels()
-    lines2, labels2 = ax2.get_legend_handles_labels()
-    ax1.legend(lines + lines2, labels + labels2, loc='upper left')
-
-    # Save the plot to a BytesIO buffer
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', transparent=True)
-    buffer.seek(0)
-    plt.close(fig) # Close the figure to free up memory
-
-    return buffer
+    self.chart_renderer.shutdown()
+
+  @staticmethod
+  def status_chart(fps_data: list, memory_data: list) -> tuple[dict, dict]:
+    """Spec and series of the dual-axis FPS/memory chart"""
+    spec = {
+      'title': "Live Server Status",
+      'xlabel': "Time (Updates)",
+      'axes': [
+        {'series': 'fps', 'label': "FPS", 'color': 'cyan', 'marker': 'o', 'ylim': (0, 120)},
+        {
+          'series': 'memory',
+          'label': "Used Memory (GB)",
+          'legend': "Memory (GB)",
+          'color': 'lime',
+          'marker': 'x',
+          'ylim': (0, 32),
+        },
+      ],
+    }
+    return spec, {'fps': fps_data, 'memory': memory_data}
 
   @tasks.loop(seconds=30)
   async def update_status_embed(self):
@@ -117,16 +98,10 @@ class StatusCog(commands.Cog):
         if not hasattr(self, 'memory_data'):
           self.memory_data = []
 
-      # 3. Non-Blocking Graph Generation (CRITICAL FIX: Offload sync code)
-      # Uses the default executor (thread pool) to prevent blocking the event loop.
-      graph_buffer = await asyncio.to_thread(
-        self.generate_graph_image, 
-        self.fps_data, 
-        self.memory_data
-      )
-      
-      graph_buffer.seek(0) # Reset pointer to start of buffer
-      graph_file = discord.File(graph_buffer, filename="status_graph.png")
+      # 3. Non-Blocking Graph Generation
+      # Rendered in a worker process; unchanged data reuses the last PNG.
+      graph_png = await self.chart_renderer.render(*self.status_chart(self.fps_data, self.memory_data))
+      graph_file = discord.File(io.BytesIO(graph_png), filename="status_graph.png")
 
       # 4. Build Embed
       embed = discord.Embed(
@@ -0,0 +1,160 @@
+from functools import partial
+from typing import Any, Callable
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, transaction
+from amc_finance.models import Account
+
+# The singleton accounts of each book: lookup fields, and defaults when created.
+# The bank's accounts are looked up by type only.
+SYSTEM_ACCOUNTS: dict[str, tuple[dict[str, Any], dict[str, Any]]] = {
+    "treasury_fund": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.GOVERNMENT, "name": "Treasury Fund"},
+        {"uses_balance_deltas": True},
+    ),
+    "treasury_fund_in_bank": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.GOVERNMENT, "name": "Treasury Fund (in Bank)"},
+        {},
+    ),
+    "treasury_expenses": (
+        {"account_type": Account.AccountType.EXPENSE, "book": Account.Book.GOVERNMENT, "name": "Treasury Expenses"},
+        {"uses_balance_deltas": True},
+    ),
+    "treasury_revenue": (
+        {"account_type": Account.AccountType.REVENUE, "book": Account.Book.GOVERNMENT, "name": "Treasury Revenue"},
+        {},
+    ),
+    "ministry_budget": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.GOVERNMENT, "name": "Ministry of Commerce Budget"},
+        {},
+    ),
+    "ministry_escrow": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.GOVERNMENT, "name": "Ministry of Commerce Escrow"},
+        {},
+    ),
+    "ministry_expense": (
+        {"account_type": Account.AccountType.EXPENSE, "book": Account.Book.GOVERNMENT, "name": "Ministry of Commerce Expenses"},
+        {},
+    ),
+    "bank_vault": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.BANK},
+        {"name": "Bank Vault", "uses_balance_deltas": True},
+    ),
+    "bank_revenue": (
+        {"account_type": Account.AccountType.REVENUE, "book": Account.Book.BANK},
+        {"name": "Bank Revenue"},
+    ),
+    "bank_expense": (
+        {"account_type": Account.AccountType.EXPENSE, "book": Account.Book.BANK},
+        {"name": "Bank Expense", "uses_balance_deltas": True},
+    ),
+    "bank_equity": (
+        {"account_type": Account.AccountType.EQUITY, "book": Account.Book.BANK},
+        {"name": "Bank Equity"},
+    ),
+}
+
+# The bank accounts every character can have: lookup fields, and the name when created
+CHARACTER_ACCOUNTS: dict[str, tuple[dict[str, Any], Callable[[Any], str]]] = {
+    "checking": (
+        {"account_type": Account.AccountType.LIABILITY, "book": Account.Book.BANK},
+        lambda character: "Checking Account",
+    ),
+    "loan": (
+        {"account_type": Account.AccountType.ASSET, "book": Account.Book.BANK},
+        lambda character: f"Loan #{character.id} - {character.name}",
+    ),
+}
+
+ACCOUNT_FIELDS = (
+    "id",
+    "book",
+    "character_id",
+    "name",
+    "account_type",
+    "uses_balance_deltas",
+)
+
+
+def account_from_values(values) -> Account:
+    """
+    An Account loaded with everything but its balance. Postings update
+    balances with F() expressions, so they never need it; reading it
+    would be stale anyway, use `get_account_balance` instead.
+    """
+    return Account.from_db(DEFAULT_DB_ALIAS, list(ACCOUNT_FIELDS), list(values))
+
+
+class AccountRegistry:
+    """
+    Resolves the system accounts (Treasury Fund, Bank Vault, the Ministry
+    of Commerce accounts...) and the checking and loan accounts of each
+    character, creating them when missing.
+
+    The ids of resolved accounts are kept for the life of the process, so
+    a posting only pays for its inserts and balance updates. An id is only
+    kept once the transaction that found or created it has committed, so
+    an account that is rolled back is never cached. Deleted accounts are
+    forgotten through `forget_account`.
+    """
+
+    def __init__(self):
+        self._accounts: dict[tuple, tuple[Any, ...]] = {}
+
+    def _resolve(self, key, lookup, defaults):
+        values = self._accounts.get(key)
+        if values is None:
+            account, _ = Account.objects.get_or_create(**lookup, defaults=defaults)
+            values = tuple(getattr(account, field) for field in ACCOUNT_FIELDS)
+            transaction.on_commit(partial(self._accounts.__setitem__, key, values))
+        return account_from_values(values)
+
+    def get(self, name: str) -> Account:
+        lookup, defaults = SYSTEM_ACCOUNTS[name]
+        return self._resolve(("system", name), {**lookup, "character": None}, defaults)
+
+    def get_character_account(self, character, kind: str) -> Account:
+        lookup, get_name = CHARACTER_ACCOUNTS[kind]
+        return self._resolve(
+            ("character", kind, character.id),
+            {**lookup, "character": character},
+            {"name": get_name(character)},
+        )
+
+    async def aget(self, name: str) -> Account:
+        if (values := self._accounts.get(("system", name))) is not None:
+            return account_from_values(values)
+        return await sync_to_async(self.get)(name)
+
+    async def aget_character_account(self, character, kind: str) -> Account:
+        if (values := self._accounts.get(("character", kind, character.id))) is not None:
+            return account_from_values(values)
+        return await sync_to_async(self.get_character_account)(character, kind)
+
+    def forget_account(self, sender, instance, **kwargs):
+        """Drops a deleted account; connected to Account's post_delete"""
+        for key, values in list(self._accounts.items()):
+            if values[0] == instance.pk:
+                self._accounts.pop(key, None)
+
+    def clear(self):
+        self._accounts.clear()
+
+
+account_registry = AccountRegistry()
+
+
+def get_account_balance(account):
+    """The account's balance, including the deltas not compacted yet"""
+    return (
+        Account.objects.with_current_balance()
+        .values_list("current_balance", flat=True)
+        .get(pk=account.pk)
+    )
+
+
+async def aget_account_balance(account):
+    return await (
+        Account.objects.with_current_balance()
+        .values_list("current_balance", flat=True)
+        .aget(pk=account.pk)
+    )
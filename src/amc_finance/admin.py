@@ -1,5 +1,6 @@
+from typing import cast
 from django.contrib import admin
-from .models import Account, JournalEntry, LedgerEntry
+from .models import Account, AccountQuerySet, JournalEntry, LedgerEntry
 
 class AccountInlineAdmin(admin.TabularInline):
   model = Account
@@ -10,11 +11,18 @@ class LedgerEntryInlineAdmin(admin.TabularInline):
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
-  list_display = ['id', 'account_type', 'book', 'name', 'character', 'balance']
+  list_display = ['id', 'account_type', 'book', 'name', 'character', 'balance', 'current_balance']
   list_select_related = ['character']
   search_fields = ['character__name', 'name']
   autocomplete_fields = ['character']
-  list_filter = ['account_type', 'book']
+  list_filter = ['account_type', 'book', 'uses_balance_deltas']
+
+  def get_queryset(self, request):
+    return cast(AccountQuerySet, super().get_queryset(request)).with_current_balance()
+
+  @admin.display(ordering='current_balance')
+  def current_balance(self, account):
+    return account.current_balance
 
 @admin.register(JournalEntry)
 class JournalEntryAdmin(admin.ModelAdmin):
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AmcFinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'amc_finance'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from amc_finance.accounts import account_registry
+        from amc_finance.models import Account
+        post_delete.connect(account_registry.forget_account, sender=Account)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def flag_high_traffic_accounts(apps, schema_editor):
+    Account = apps.get_model('amc_finance', 'Account')
+    Account.objects.filter(
+        book='GOVERNMENT',
+        character=None,
+        name__in=['Treasury Fund', 'Treasury Expenses'],
+    ).update(uses_balance_deltas=True)
+    Account.objects.filter(
+        book='BANK',
+        character=None,
+        account_type__in=['ASSET', 'EXPENSE'],
+    ).update(uses_balance_deltas=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('amc_finance', '0002_remove_account_player_account_character'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='uses_balance_deltas',
+            field=models.BooleanField(default=False, help_text='Postings add balance deltas, compacted into the balance periodically, instead of locking this row'),
+        ),
+        migrations.CreateModel(
+            name='AccountBalanceDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balance_deltas', to='amc_finance.account')),
+            ],
+        ),
+        migrations.RunPython(flag_high_traffic_accounts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,34 @@
+from decimal import Decimal
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Sum, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from typing import ClassVar, TYPE_CHECKING
 
+class AccountQuerySet(models.QuerySet):
+  def with_current_balance(self):
+    """
+    Annotates `current_balance`: the balance plus the deltas that have
+    not been compacted into it yet. Read in one statement, so it is exact
+    even while a compaction commits.
+    """
+    pending = (AccountBalanceDelta.objects
+      .filter(account=OuterRef('pk'))
+      .values('account')
+      .annotate(total=Sum('amount'))
+      .values('total')
+    )
+    return self.annotate(
+      current_balance=F('balance') + Coalesce(
+        Subquery(pending),
+        Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+      )
+    )
+
+class AccountManager(models.Manager.from_queryset(AccountQuerySet)): # type: ignore[misc]
+    pass
+
 class Account(models.Model):
   """
   Represents an account in a ledger
@@ -31,6 +57,11 @@ class Account(models.Model):
   name = models.CharField(max_length=100)
   account_type = models.CharField(max_length=10, choices=AccountType.choices)
   balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+  uses_balance_deltas = models.BooleanField(
+    default=False,
+    help_text='Postings add balance deltas, compacted into the balance periodically, instead of locking this row',
+  )
+  objects: ClassVar[AccountManager] = AccountManager()
 
   def __str__(self):
     if self.character:
@@ -38,6 +69,19 @@ class Account(models.Model):
     return f"{self.name} (Internal)"
 
 
+class AccountBalanceDelta(models.Model):
+  """
+  A balance change to an account with `uses_balance_deltas`, pending
+  until it is compacted into the account's balance.
+  """
+  account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='balance_deltas')
+  amount = models.DecimalField(max_digits=12, decimal_places=2)
+  created_at = models.DateTimeField(auto_now_add=True)
+
+  def __str__(self):
+    return f"{self.account_id}: {self.amount}"
+
+
 class JournalEntry(models.Model):
   """
   A single financial transaction, composed of multiple balanced ledger entries.
@@ -1,15 +1,20 @@
+from collections import defaultdict
 from datetime import timedelta
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import F, Sum
+from django.db.models import F, Subquery, Sum
 from asgiref.sync import sync_to_async
-from amc.models import Player, Delivery, CharacterLocation
-from amc_finance.models import Account, JournalEntry, LedgerEntry
+from amc.models import Player, CharacterLocation
+from amc_finance.models import Account, AccountBalanceDelta, JournalEntry, LedgerEntry
+from amc_finance.accounts import (
+    account_registry,
+    aget_account_balance,
+)
 
 
 from enum import Enum
-from typing import Optional, Tuple, Any, cast
+from typing import Optional, Tuple
 
 
 class LoanLimitReason(Enum):
@@ -39,9 +44,6 @@ async def get_character_max_loan(character) -> Tuple[int, Optional[LoanLimitReas
     BANK_POLICY_CAP = 6_000_000
 
     player = await Player.objects.aget(characters=character)
-    deliveries_agg = await Delivery.objects.filter(character__player=player).aaggregate(
-        total_payment=Sum("payment", default=0) + Sum("subsidy", default=0),
-    )
 
     if player.discord_user_id is None:
         return 0, LoanLimitReason.UNVERIFIED
@@ -78,7 +80,7 @@ async def get_character_max_loan(character) -> Tuple[int, Optional[LoanLimitReas
     # 4. Apply the cap based on earnings history
     # This check comes after the bank policy cap, so it will correctly
     # become the reason if it's an even more restrictive limit.
-    earnings_cap = deliveries_agg["total_payment"] * 5
+    earnings_cap = player.lifetime_earnings * 5
     if max_loan > earnings_cap:
         max_loan = earnings_cap
         reason = LoanLimitReason.EARNINGS_HISTORY
@@ -91,37 +93,18 @@ async def get_character_max_loan(character) -> Tuple[int, Optional[LoanLimitReas
 
 
 async def get_player_bank_balance(character):
-    account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.LIABILITY,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": "Checking Account",
-        },
-    )
-    return account.balance
+    account = await account_registry.aget_character_account(character, "checking")
+    return await aget_account_balance(account)
 
 
 async def get_player_loan_balance(character):
-    loan_account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": f"Loan #{character.id} - {character.name}",
-        },
-    )
-    return loan_account.balance
+    loan_account = await account_registry.aget_character_account(character, "loan")
+    return await aget_account_balance(loan_account)
 
 
 async def get_treasury_fund_balance():
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    return treasury_fund.balance
+    treasury_fund = await account_registry.aget("treasury_fund")
+    return await aget_account_balance(treasury_fund)
 
 
 async def get_character_total_donations(character, start_time):
@@ -140,23 +123,8 @@ async def get_character_total_interest(character, start_time):
 async def register_player_deposit(
     amount, character, player, description="Player Deposit"
 ):
-    account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.LIABILITY,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": "Checking Account",
-        },
-    )
-
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
+    account = await account_registry.aget_character_account(character, "checking")
+    bank_vault = await account_registry.aget("bank_vault")
 
     return await sync_to_async(create_journal_entry)(
         timezone.now(),
@@ -178,24 +146,9 @@ async def register_player_deposit(
 
 
 async def register_player_withdrawal(amount, character, player):
-    account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.LIABILITY,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": "Checking Account",
-        },
-    )
-
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
-    if amount > account.balance:
+    account = await account_registry.aget_character_account(character, "checking")
+    bank_vault = await account_registry.aget("bank_vault")
+    if amount > await aget_account_balance(account):
         raise ValueError("Unable to withdraw more than balance")
 
     return await sync_to_async(create_journal_entry)(
@@ -243,32 +196,9 @@ async def register_player_take_loan(amount, character):
     fee = calc_loan_fee(amount, character, max_loan)
     principal = Decimal(amount) + Decimal(fee)
 
-    loan_account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": f"Loan #{character.id} - {character.name}",
-        },
-    )
-
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
-
-    bank_revenue, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.REVENUE,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Revenue",
-        },
-    )
+    loan_account = await account_registry.aget_character_account(character, "loan")
+    bank_vault = await account_registry.aget("bank_vault")
+    bank_revenue = await account_registry.aget("bank_revenue")
 
     await sync_to_async(create_journal_entry)(
         timezone.now(),
@@ -296,24 +226,9 @@ async def register_player_take_loan(amount, character):
 
 
 async def register_player_repay_loan(amount, character):
-    loan_account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": f"Loan #{character.id} - {character.name}",
-        },
-    )
-
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
-    if loan_account.balance < amount:
+    loan_account = await account_registry.aget_character_account(character, "loan")
+    bank_vault = await account_registry.aget("bank_vault")
+    if await aget_account_balance(loan_account) < amount:
         raise ValueError("You are repaying more than you owe")
 
     return await sync_to_async(create_journal_entry)(
@@ -336,18 +251,8 @@ async def register_player_repay_loan(amount, character):
 
 
 async def player_donation(amount, character):
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    treasury_revenue, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.REVENUE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Revenue"
-    )
+    treasury_fund = await account_registry.aget("treasury_fund")
+    treasury_revenue = await account_registry.aget("treasury_revenue")
 
     await sync_to_async(create_journal_entry, thread_sensitive=True)(
         timezone.now(),
@@ -369,18 +274,8 @@ async def player_donation(amount, character):
 
 
 async def send_fund_to_player_wallet(amount, character, description):
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    treasury_expenses, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Expenses"
-    )
+    treasury_fund = await account_registry.aget("treasury_fund")
+    treasury_expenses = await account_registry.aget("treasury_expenses")
 
     await sync_to_async(create_journal_entry)(
         timezone.now(),
@@ -401,73 +296,114 @@ async def send_fund_to_player_wallet(amount, character, description):
     )
 
 
-async def send_fund_to_player(amount, character, reason):
-    account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.LIABILITY,
-        book=Account.Book.BANK,
-        character=character,
-        defaults={
-            "name": "Checking Account",
-        },
-    )
+def create_wallet_payout_entries(treasury_fund, treasury_expenses, amounts, description):
+    """
+    Records many treasury-to-wallet payouts in one transaction: one
+    journal entry per payout, as send_fund_to_player_wallet would, with
+    the two account balances updated once by the total.
+    """
+    amounts = [
+        amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) for amount in amounts
+    ]
+    amounts = [amount for amount in amounts if amount > 0]
+    if not amounts:
+        return []
 
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
+    now = timezone.now()
+    with transaction.atomic():
+        journal_entries = JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(date=now, description=description, creator=None)
+                for _ in amounts
+            ]
+        )
+        LedgerEntry.objects.bulk_create(
+            [
+                ledger_entry
+                for journal_entry, amount in zip(journal_entries, amounts)
+                for ledger_entry in (
+                    LedgerEntry(
+                        journal_entry=journal_entry,
+                        account=treasury_expenses,
+                        debit=amount,
+                        credit=0,
+                    ),
+                    LedgerEntry(
+                        journal_entry=journal_entry,
+                        account=treasury_fund,
+                        debit=0,
+                        credit=amount,
+                    ),
+                )
+            ]
+        )
+        total = sum(amounts)
+        update_account_balance(treasury_expenses, total)
+        update_account_balance(treasury_fund, -total)
+    return journal_entries
 
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
 
-    treasury_expenses, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Expenses",
-    )
+async def send_funds_to_player_wallets(payouts, description):
+    """Batched send_fund_to_player_wallet for a list of (amount, character) pairs"""
+    treasury_fund = await account_registry.aget("treasury_fund")
+    treasury_expenses = await account_registry.aget("treasury_expenses")
 
-    await sync_to_async(create_journal_entry, thread_sensitive=True)(
-        timezone.now(),
-        f"Government Funding: {reason}",
-        None,
-        [
-            {
-                "account": treasury_expenses,
-                "debit": amount,
-                "credit": 0,
-            },
-            {
-                "account": treasury_fund,
-                "debit": 0,
-                "credit": amount,
-            },
-        ],
+    return await sync_to_async(create_wallet_payout_entries)(
+        treasury_fund,
+        treasury_expenses,
+        [amount for amount, _character in payouts],
+        description,
     )
 
-    await sync_to_async(create_journal_entry, thread_sensitive=True)(
-        timezone.now(),
-        f"Government Funding: {reason}",
-        None,
-        [
-            {
-                "account": account,
-                "debit": 0,
-                "credit": amount,
-            },
-            {
-                "account": bank_vault,
-                "debit": amount,
-                "credit": 0,
-            },
-        ],
+
+def _send_fund_to_player(amount, character, reason):
+    account = account_registry.get_character_account(character, "checking")
+    bank_vault = account_registry.get("bank_vault")
+    treasury_fund = account_registry.get("treasury_fund")
+    treasury_expenses = account_registry.get("treasury_expenses")
+
+    description = f"Government Funding: {reason}"
+    with transaction.atomic():
+        create_journal_entry(
+            timezone.now(),
+            description,
+            None,
+            [
+                {
+                    "account": treasury_expenses,
+                    "debit": amount,
+                    "credit": 0,
+                },
+                {
+                    "account": treasury_fund,
+                    "debit": 0,
+                    "credit": amount,
+                },
+            ],
+        )
+        create_journal_entry(
+            timezone.now(),
+            description,
+            None,
+            [
+                {
+                    "account": account,
+                    "debit": 0,
+                    "credit": amount,
+                },
+                {
+                    "account": bank_vault,
+                    "debit": amount,
+                    "credit": 0,
+                },
+            ],
+        )
+
+
+async def send_fund_to_player(amount, character, reason):
+    """Pays from the Treasury into the character's bank account, in one transaction"""
+    await sync_to_async(_send_fund_to_player, thread_sensitive=True)(
+        amount, character, reason
     )
 
 
@@ -525,12 +461,60 @@ def create_journal_entry(date, description, creator_character, entries_data):
             else:
                 balance_change = credit - debit
 
-            account.balance = cast(Any, F("balance") + balance_change)
-            account.save(update_fields=["balance"])
+            update_account_balance(account, balance_change)
 
     return journal_entry
 
 
+def update_account_balance(account, balance_change):
+    """
+    Adds `balance_change` to the account's balance. Accounts with
+    `uses_balance_deltas` get a pending delta row instead, so concurrent
+    postings to them don't queue on the account's row lock.
+    """
+    if account.uses_balance_deltas:
+        AccountBalanceDelta.objects.create(account=account, amount=balance_change)
+    else:
+        Account.objects.filter(pk=account.pk).update(
+            balance=F("balance") + balance_change
+        )
+
+
+def _compact_account_balances():
+    account_ids = list(
+        AccountBalanceDelta.objects.values_list("account_id", flat=True).distinct()
+    )
+    compacted = 0
+    for account_id in account_ids:
+        with transaction.atomic():
+            # Locked deltas belong to a concurrent compaction
+            deltas = list(
+                AccountBalanceDelta.objects.select_for_update(skip_locked=True)
+                .filter(account_id=account_id)
+                .values_list("id", "amount")
+            )
+            if not deltas:
+                continue
+            AccountBalanceDelta.objects.filter(
+                id__in=[delta_id for delta_id, _ in deltas]
+            ).delete()
+            Account.objects.filter(pk=account_id).update(
+                balance=F("balance") + sum(amount for _, amount in deltas)
+            )
+        compacted += len(deltas)
+    return compacted
+
+
+async def compact_account_balances(ctx):
+    """
+    Folds the pending balance deltas into their accounts' balances, one
+    short transaction per account. Deltas committed while it runs are
+    left for the next run.
+    """
+    compacted = await sync_to_async(_compact_account_balances)()
+    return {"compacted_deltas": compacted}
+
+
 INTEREST_RATE = 0.022
 ONLINE_INTEREST_MULTIPLIER = 2.0
 
@@ -541,14 +525,7 @@ async def apply_interest_to_bank_accounts(
     online_interest_multiplier=ONLINE_INTEREST_MULTIPLIER,
     compounding_hours=1,
 ):
-    bank_expense_account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Expense",
-        },
-    )
+    bank_expense_account = await account_registry.aget("bank_expense")
 
     accounts_qs = Account.objects.select_related(
         "character", "character__player"
@@ -612,85 +589,58 @@ async def apply_interest_to_bank_accounts(
             )
 
 
-async def make_treasury_bank_deposit(amount, description):
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    treasury_fund_in_bank, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund (in Bank)",
-    )
-    bank_vault, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Vault",
-        },
-    )
-    bank_treasury_account, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EQUITY,
-        book=Account.Book.BANK,
-        character=None,
-        defaults={
-            "name": "Bank Equity",
-        },
-    )
+def _make_treasury_bank_deposit(amount, description):
+    treasury_fund = account_registry.get("treasury_fund")
+    treasury_fund_in_bank = account_registry.get("treasury_fund_in_bank")
+    bank_vault = account_registry.get("bank_vault")
+    bank_treasury_account = account_registry.get("bank_equity")
 
-    await sync_to_async(create_journal_entry)(
-        timezone.now(),
-        description,
-        None,
-        [
-            {
-                "account": treasury_fund_in_bank,
-                "debit": amount,
-                "credit": 0,
-            },
-            {
-                "account": treasury_fund,
-                "debit": 0,
-                "credit": amount,
-            },
-        ],
-    )
-    await sync_to_async(create_journal_entry)(
-        timezone.now(),
-        description,
-        None,
-        [
-            {
-                "account": bank_vault,
-                "debit": amount,
-                "credit": 0,
-            },
-            {
-                "account": bank_treasury_account,
-                "debit": 0,
-                "credit": amount,
-            },
-        ],
+    with transaction.atomic():
+        create_journal_entry(
+            timezone.now(),
+            description,
+            None,
+            [
+                {
+                    "account": treasury_fund_in_bank,
+                    "debit": amount,
+                    "credit": 0,
+                },
+                {
+                    "account": treasury_fund,
+                    "debit": 0,
+                    "credit": amount,
+                },
+            ],
+        )
+        create_journal_entry(
+            timezone.now(),
+            description,
+            None,
+            [
+                {
+                    "account": bank_vault,
+                    "debit": amount,
+                    "credit": 0,
+                },
+                {
+                    "account": bank_treasury_account,
+                    "debit": 0,
+                    "credit": amount,
+                },
+            ],
+        )
+
+
+async def make_treasury_bank_deposit(amount, description):
+    await sync_to_async(_make_treasury_bank_deposit, thread_sensitive=True)(
+        amount, description
     )
 
 
 async def allocate_ministry_budget(amount, term):
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    ministry_budget, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,  # Ministry is an org, not a character account
-        name="Ministry of Commerce Budget",
-    )
+    treasury_fund = await account_registry.aget("treasury_fund")
+    ministry_budget = await account_registry.aget("ministry_budget")
 
     await sync_to_async(create_journal_entry)(
         timezone.now(),
@@ -711,32 +661,35 @@ async def allocate_ministry_budget(amount, term):
     )
 
     # Sync model
-    term.current_budget = (
-        ministry_budget.balance
-    )  # Should be updated by journal entry logic but we read it back or trust the flow
-    # Since create_journal_entry updates balance in-memory on the account object, we can use that if returned, but here we re-fetch or assume correctness.
-    # Actually, create_journal_entry updates the passed account objects.
-    # Since create_journal_entry updates the passed account objects with F expressions, we must refresh.
-    await ministry_budget.arefresh_from_db()
-    term.current_budget = ministry_budget.balance
+    term.current_budget = await aget_account_balance(ministry_budget)
     await term.asave()
 
 
-async def escrow_ministry_funds(amount, job):
-    ministry_budget, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Budget",
-    )
-    ministry_escrow, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Escrow",
+def update_term_budget(term_id, **updates):
+    """
+    Copies the Ministry budget balance onto the term, along with `updates`,
+    in a single UPDATE
+    """
+    from amc.models import MinistryTerm
+
+    ministry_budget = account_registry.get("ministry_budget")
+    MinistryTerm.objects.filter(pk=term_id).update(
+        current_budget=Subquery(
+            Account.objects.filter(pk=ministry_budget.pk).values("balance")[:1]
+        ),
+        **updates,
     )
 
-    if ministry_budget.balance < amount:
+
+async def aupdate_term_budget(term_id, **updates):
+    await sync_to_async(update_term_budget)(term_id, **updates)
+
+
+async def escrow_ministry_funds(amount, job):
+    ministry_budget = await account_registry.aget("ministry_budget")
+    ministry_escrow = await account_registry.aget("ministry_escrow")
+
+    if await aget_account_balance(ministry_budget) < amount:
         return False
 
     await sync_to_async(create_journal_entry)(
@@ -759,13 +712,9 @@ async def escrow_ministry_funds(amount, job):
 
     # Update Funding Term Budget
     if job.funding_term_id:
-        from amc.models import MinistryTerm
-
-        term = await MinistryTerm.objects.aget(id=job.funding_term_id)
-        await ministry_budget.arefresh_from_db()
-        term.current_budget = ministry_budget.balance
-        term.created_jobs_count = cast(Any, F("created_jobs_count") + 1)
-        await term.asave()
+        await aupdate_term_budget(
+            job.funding_term_id, created_jobs_count=F("created_jobs_count") + 1
+        )
 
     return True
 
@@ -776,18 +725,8 @@ async def process_ministry_completion(job, bonus_amount):
     1. Clears Escrow (Funds moved to Expense)
     2. Receives Performance Grant (Rebate)
     """
-    ministry_escrow, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Escrow",
-    )
-    ministry_expense, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Expenses",
-    )
+    ministry_escrow = await account_registry.aget("ministry_escrow")
+    ministry_expense = await account_registry.aget("ministry_expense")
 
     # 1. Clear Escrow -> Expense
     # We move the *escrowed* amount (which should equal bonus_amount usually, but let's use job.escrowed_amount)
@@ -814,18 +753,8 @@ async def process_ministry_completion(job, bonus_amount):
     # 2. Performance Grant (20% Rebate)
     rebate_amount = int(escrowed * 0.20)
     if rebate_amount > 0:
-        ministry_budget, _ = await Account.objects.aget_or_create(
-            account_type=Account.AccountType.ASSET,
-            book=Account.Book.GOVERNMENT,
-            character=None,
-            name="Ministry of Commerce Budget",
-        )
-        treasury_revenue, _ = await Account.objects.aget_or_create(
-            account_type=Account.AccountType.REVENUE,
-            book=Account.Book.GOVERNMENT,
-            character=None,
-            name="Treasury Revenue",
-        )
+        ministry_budget = await account_registry.aget("ministry_budget")
+        treasury_revenue = await account_registry.aget("treasury_revenue")
 
         await sync_to_async(create_journal_entry)(
             timezone.now(),
@@ -846,13 +775,10 @@ async def process_ministry_completion(job, bonus_amount):
         )
 
         if job.funding_term_id:
-            from amc.models import MinistryTerm
-
-            term = await MinistryTerm.objects.aget(id=job.funding_term_id)
-            await ministry_budget.arefresh_from_db()
-            term.current_budget = ministry_budget.balance
-            term.total_spent = cast(Any, F("total_spent") + (escrowed - rebate_amount))
-            await term.asave()
+            await aupdate_term_budget(
+                job.funding_term_id,
+                total_spent=F("total_spent") + (escrowed - rebate_amount),
+            )
 
 
 async def process_ministry_expiration(job):
@@ -862,24 +788,9 @@ async def process_ministry_expiration(job):
     - 50% Burned (Expense)
     - 100% Cleared from Escrow
     """
-    ministry_budget, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Budget",
-    )
-    ministry_escrow, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Escrow",
-    )
-    ministry_expense, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Expenses",
-    )
+    ministry_budget = await account_registry.aget("ministry_budget")
+    ministry_escrow = await account_registry.aget("ministry_escrow")
+    ministry_expense = await account_registry.aget("ministry_expense")
 
     escrowed = job.escrowed_amount
     refund_amount = int(escrowed * 0.50)
@@ -909,65 +820,105 @@ async def process_ministry_expiration(job):
     )
 
     if job.funding_term_id:
-        from amc.models import MinistryTerm
-
-        term = await MinistryTerm.objects.aget(id=job.funding_term_id)
-        await ministry_budget.arefresh_from_db()
-        term.current_budget = ministry_budget.balance
-        term.expired_jobs_count = cast(Any, F("expired_jobs_count") + 1)
-        term.total_spent = cast(Any, F("total_spent") + burn_amount)
-        await term.asave()
+        await aupdate_term_budget(
+            job.funding_term_id,
+            expired_jobs_count=F("expired_jobs_count") + 1,
+            total_spent=F("total_spent") + burn_amount,
+        )
 
     # Clear escrow on job to prevent double refund
     job.escrowed_amount = 0
     await job.asave(update_fields=["escrowed_amount"])
 
 
+def _record_ministry_subsidy_spend(amount, term_id):
+    ministry_budget = account_registry.get("ministry_budget")
+    ministry_expense = account_registry.get("ministry_expense")
+
+    with transaction.atomic():
+        create_journal_entry(
+            timezone.now(),
+            "Ministry Subsidy Payment",
+            None,
+            [
+                {
+                    "account": ministry_budget,
+                    "debit": 0,
+                    "credit": amount,
+                },
+                {
+                    "account": ministry_expense,
+                    "debit": amount,
+                    "credit": 0,
+                },
+            ],
+        )
+
+        if term_id:
+            update_term_budget(term_id, total_spent=F("total_spent") + amount)
+
+
 async def record_ministry_subsidy_spend(amount, term_id):
     """
     Records Ministry subsidy spend:
     1. Dr. Ministry Expense / Cr. Ministry Budget
     2. Updates term.current_budget and term.total_spent
     """
-    ministry_budget, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Budget",
-    )
-    ministry_expense, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Ministry of Commerce Expenses",
-    )
+    await sync_to_async(_record_ministry_subsidy_spend)(amount, term_id)
 
-    await sync_to_async(create_journal_entry)(
-        timezone.now(),
-        "Ministry Subsidy Payment",
-        None,
-        [
-            {
-                "account": ministry_budget,
-                "debit": 0,
-                "credit": amount,
-            },
-            {
-                "account": ministry_expense,
-                "debit": amount,
-                "credit": 0,
-            },
-        ],
-    )
 
-    if term_id:
-        from amc.models import MinistryTerm
+class PostingBatch:
+    """
+    Collects the financial side effects of a batch of webhook events:
+    subsidy rule spend, Ministry subsidy spend, and Treasury payouts to
+    player wallets. `aflush` posts them all in one transaction.
+
+    The totals are the same as posting each one as it happens. Spend is
+    summed per subsidy rule and per Ministry term, with one journal entry
+    per term. Each wallet payout still gets its own journal entry.
+    """
 
-        term = await MinistryTerm.objects.aget(id=term_id)
-        await ministry_budget.arefresh_from_db()
-        term.current_budget = ministry_budget.balance
-        term.total_spent = cast(Any, F("total_spent") + amount)
-        await term.asave()
+    def __init__(self):
+        self.rule_spend = defaultdict(int)
+        self.term_spend = defaultdict(int)
+        self.wallet_payouts = defaultdict(list)
+
+    def __bool__(self):
+        return bool(self.rule_spend or self.term_spend or self.wallet_payouts)
+
+    def add_subsidy_spend(self, rule_id, amount, term_id=None):
+        self.rule_spend[rule_id] += amount
+        if term_id:
+            self.term_spend[term_id] += amount
+
+    def add_wallet_payout(self, amount, description):
+        self.wallet_payouts[description].append(Decimal(str(amount)))
+
+    def flush(self):
+        from amc.models import SubsidyRule
+
+        with transaction.atomic():
+            # In id order, so concurrent flushes lock the rules in the same order
+            for rule_id, amount in sorted(self.rule_spend.items()):
+                SubsidyRule.objects.filter(pk=rule_id).update(
+                    spent=F("spent") + amount
+                )
+            for term_id, amount in sorted(self.term_spend.items()):
+                _record_ministry_subsidy_spend(amount, term_id)
+            if self.wallet_payouts:
+                treasury_fund = account_registry.get("treasury_fund")
+                treasury_expenses = account_registry.get("treasury_expenses")
+                for description, amounts in self.wallet_payouts.items():
+                    create_wallet_payout_entries(
+                        treasury_fund, treasury_expenses, amounts, description
+                    )
+        self.rule_spend.clear()
+        self.term_spend.clear()
+        self.wallet_payouts.clear()
+
+    async def aflush(self):
+        if self:
+            await sync_to_async(self.flush)()
 
 
 async def process_treasury_expiration_penalty(job):
@@ -981,18 +932,8 @@ async def process_treasury_expiration_penalty(job):
 
     penalty_amount = int(job.completion_bonus * 0.50)
 
-    treasury_fund, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.ASSET,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Fund",
-    )
-    treasury_expenses, _ = await Account.objects.aget_or_create(
-        account_type=Account.AccountType.EXPENSE,
-        book=Account.Book.GOVERNMENT,
-        character=None,
-        name="Treasury Expenses",
-    )
+    treasury_fund = await account_registry.aget("treasury_fund")
+    treasury_expenses = await account_registry.aget("treasury_expenses")
 
     await sync_to_async(create_journal_entry)(
         timezone.now(),
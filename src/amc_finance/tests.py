@@ -1,12 +1,17 @@
 from datetime import timedelta
+from decimal import Decimal
 from django.test import TestCase
 from django.utils import timezone
 from django.contrib.gis.geos import Point
 from asgiref.sync import sync_to_async
 from amc.factories import CharacterFactory
-from amc.models import CharacterLocation
-from amc_finance.models import Account
+from amc.models import CharacterLocation, MinistryTerm, Player, SubsidyRule
+from amc_finance.models import Account, AccountBalanceDelta, JournalEntry
+from .accounts import account_registry, get_account_balance, aget_account_balance
 from .services import (
+  PostingBatch,
+  allocate_ministry_budget,
+  compact_account_balances,
   get_player_bank_balance,
   register_player_deposit,
   register_player_withdrawal,
@@ -41,6 +46,120 @@ class BankAccountTestCase(TestCase):
     with self.assertRaises(Exception):
       await register_player_withdrawal(1000, character, player)
 
+class AccountRegistryTestCase(TestCase):
+  def setUp(self):
+    account_registry.clear()
+
+  def tearDown(self):
+    account_registry.clear()
+
+  def test_system_account_cached_after_commit(self):
+    with self.captureOnCommitCallbacks(execute=True):
+      bank_vault = account_registry.get('bank_vault')
+    self.assertEqual(bank_vault.name, 'Bank Vault')
+    with self.assertNumQueries(0):
+      self.assertEqual(account_registry.get('bank_vault').pk, bank_vault.pk)
+
+  def test_system_account_not_cached_before_commit(self):
+    bank_vault = account_registry.get('bank_vault')
+    with self.assertNumQueries(1):
+      self.assertEqual(account_registry.get('bank_vault').pk, bank_vault.pk)
+
+  def test_character_accounts(self):
+    character = CharacterFactory()
+    with self.captureOnCommitCallbacks(execute=True):
+      checking = account_registry.get_character_account(character, 'checking')
+      loan = account_registry.get_character_account(character, 'loan')
+    self.assertNotEqual(checking.pk, loan.pk)
+    self.assertEqual(checking.account_type, Account.AccountType.LIABILITY)
+    self.assertEqual(loan.name, f"Loan #{character.id} - {character.name}")
+    with self.assertNumQueries(0):
+      self.assertEqual(account_registry.get_character_account(character, 'loan').pk, loan.pk)
+
+  def test_deleted_account_forgotten(self):
+    with self.captureOnCommitCallbacks(execute=True):
+      treasury_fund = account_registry.get('treasury_fund')
+    Account.objects.filter(pk=treasury_fund.pk).delete()
+    self.assertNotEqual(account_registry.get('treasury_fund').pk, treasury_fund.pk)
+
+  def test_balance_read_from_database(self):
+    with self.captureOnCommitCallbacks(execute=True):
+      bank_vault = account_registry.get('bank_vault')
+    Account.objects.filter(pk=bank_vault.pk).update(balance=500)
+    self.assertEqual(get_account_balance(account_registry.get('bank_vault')), 500)
+
+
+class BalanceDeltaTestCase(TestCase):
+  async def test_posting_adds_pending_delta(self):
+    character = await sync_to_async(CharacterFactory)()
+    player = await sync_to_async(lambda: character.player)()
+    await register_player_deposit(1000, character, player)
+    await register_player_deposit(500, character, player)
+
+    bank_vault = await account_registry.aget('bank_vault')
+    self.assertEqual(await AccountBalanceDelta.objects.filter(account=bank_vault).acount(), 2)
+    self.assertEqual((await Account.objects.aget(pk=bank_vault.pk)).balance, 0)
+    self.assertEqual(await aget_account_balance(bank_vault), 1500)
+    # Character accounts are updated in place
+    self.assertEqual(await AccountBalanceDelta.objects.filter(account__character=character).acount(), 0)
+    self.assertEqual(await get_player_bank_balance(character), 1500)
+
+  async def test_compact_account_balances(self):
+    character = await sync_to_async(CharacterFactory)()
+    player = await sync_to_async(lambda: character.player)()
+    await register_player_deposit(1000, character, player)
+    await register_player_withdrawal(300, character, player)
+
+    result = await compact_account_balances({})
+    self.assertEqual(result, {'compacted_deltas': 2})
+    bank_vault = await account_registry.aget('bank_vault')
+    self.assertFalse(await AccountBalanceDelta.objects.aexists())
+    self.assertEqual((await Account.objects.aget(pk=bank_vault.pk)).balance, 700)
+    self.assertEqual(await aget_account_balance(bank_vault), 700)
+
+    self.assertEqual(await compact_account_balances({}), {'compacted_deltas': 0})
+
+
+class PostingBatchTestCase(TestCase):
+  async def test_flush(self):
+    player = await Player.objects.acreate(unique_id=12345)
+    term = await MinistryTerm.objects.acreate(
+      minister=player,
+      start_date=timezone.now(),
+      end_date=timezone.now() + timedelta(days=7),
+      initial_budget=1_000_000,
+      current_budget=0,
+    )
+    await allocate_ministry_budget(1_000_000, term)
+    rule = await SubsidyRule.objects.acreate(
+      name='Batch Subsidy',
+      reward_type=SubsidyRule.RewardType.PERCENTAGE,
+      reward_value=1,
+      allocation=100_000,
+    )
+
+    batch = PostingBatch()
+    batch.add_subsidy_spend(rule.pk, 1_000, term.id)
+    batch.add_subsidy_spend(rule.pk, 2_000, term.id)
+    batch.add_subsidy_spend(rule.pk, 500)
+    batch.add_wallet_payout(3_000, 'ASEAN Subsidy')
+    batch.add_wallet_payout(2_500.5, 'ASEAN Subsidy')
+    await batch.aflush()
+    self.assertFalse(batch)
+
+    await rule.arefresh_from_db()
+    self.assertEqual(rule.spent, 3_500)
+    await term.arefresh_from_db()
+    self.assertEqual(term.total_spent, 3_000)
+    self.assertEqual(term.current_budget, 997_000)
+    self.assertEqual(
+      await JournalEntry.objects.filter(description='Ministry Subsidy Payment').acount(), 1
+    )
+    self.assertEqual(await JournalEntry.objects.filter(description='ASEAN Subsidy').acount(), 2)
+    treasury_expenses = await account_registry.aget('treasury_expenses')
+    self.assertEqual(await aget_account_balance(treasury_expenses), Decimal('5500.50'))
+
+
 class InterestTestCase(TestCase):
   async def test_offline_interest(self):
     character = await sync_to_async(CharacterFactory)()
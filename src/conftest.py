@@ -0,0 +1,10 @@
+import pytest
+from django.test.utils import override_settings
+from amc_backend.test_runner import TEST_SETTINGS
+
+
+@pytest.fixture(autouse=True, scope='session')
+def test_settings():
+  """What TEST_RUNNER does for `manage.py test`, under pytest"""
+  with override_settings(**TEST_SETTINGS):
+    yield